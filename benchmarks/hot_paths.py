@@ -0,0 +1,198 @@
+"""
+Benchmark the hot paths of the data processing pipeline on a synthetic data set
+(see benchmarks/synthetic.py): the HILT, attitude, and OMNI loaders, the State 4
+count resolution, the pass loop, and the microburst and OMNI merges.
+
+The synthetic data set is generated once per scale in the --data_dir directory
+and the package config is pointed at it, so the real data and caches are not
+touched. Every benchmark is run once to warm up and then --repeats times. The
+run times and the environment are saved to a json file, by default
+benchmarks/results/{git commit}.json, that can be compared against the results
+of another commit with --compare.
+
+Usage:
+python3 benchmarks/hot_paths.py --scale medium
+python3 benchmarks/hot_paths.py --scale medium --compare benchmarks/results/1a2b3c4.json
+"""
+import argparse
+import json
+import os
+import pathlib
+import platform
+import shutil
+import subprocess
+import time
+from datetime import datetime, timedelta
+
+import numpy as np
+import pandas as pd
+
+import synthetic
+from sampex_microburst_indices import config
+from sampex_microburst_indices.load import cache
+from sampex_microburst_indices.load.catalog_io import binary_path
+from sampex_microburst_indices.load.omni import Omni
+from sampex_microburst_indices.load.sampex import Load_Attitude
+from sampex_microburst_indices.load.sampex import Load_HILT
+from sampex_microburst_indices.pipeline.merge_microbursts import Merge_Microbursts
+from sampex_microburst_indices.pipeline.merge_omni import Merge_OMNI
+from sampex_microburst_indices.pipeline.passes import Passes
+
+here = pathlib.Path(__file__).parent.resolve()
+passes_name = 'sampex_passes_v0.csv'
+microburst_name = 'microburst_catalog.csv'
+
+
+class Benchmark:
+    def __init__(self, name, function, setup=None) -> None:
+        """
+        A benchmark that times function(*setup()). The untimed setup function
+        runs before every run and returns the function arguments.
+        """
+        self.name = name
+        self.function = function
+        self.setup = (lambda: ()) if setup is None else setup
+        return
+
+    def run(self, repeats=3):
+        """
+        Run the benchmark once to warm up and then repeats times. Returns the
+        list of run times in seconds.
+        """
+        self.function(*self.setup())
+        run_times = []
+        for _ in range(repeats):
+            args = self.setup()
+            start_time = time.perf_counter()
+            self.function(*args)
+            run_times.append(time.perf_counter() - start_time)
+        return run_times
+
+
+def benchmarks(start_date):
+    """
+    The list of the hot path Benchmarks. The merges use the passes saved by
+    the passes_loop benchmark, or save them first if it did not run.
+    """
+    year = start_date.year
+    time_range = (start_date - timedelta(days=1), start_date + timedelta(days=1))
+
+    def load_hilt_setup():
+        return (Load_HILT(start_date),)
+
+    def save_passes():
+        passes = Passes(L_range=(4, 8))
+        passes.loop()
+        passes.save_passes(passes_name)
+        return
+
+    def merge_setup(merge_class, **kwargs):
+        if not binary_path(passes_name).exists():
+            save_passes()
+        return (merge_class(passes_name, **kwargs),)
+
+    return [
+        Benchmark('load_hilt', lambda: Load_HILT(start_date)),
+        Benchmark('resolve_counts_state4', lambda hilt: hilt.resolve_counts_state4(),
+                  setup=load_hilt_setup),
+        Benchmark('load_attitude_parse', lambda: Load_Attitude(start_date, use_cache=False)),
+        Benchmark('load_attitude_cached', lambda: Load_Attitude(start_date, use_cache=True)),
+        Benchmark('load_omni_parse', lambda: Omni(year=year, use_cache=False).load()),
+        Benchmark('load_omni_cached', lambda: Omni(time_range=time_range, use_cache=True).load()),
+        Benchmark('passes_loop', save_passes),
+        Benchmark('merge_microbursts', lambda merge: merge.merge(),
+                  setup=lambda: merge_setup(Merge_Microbursts, microburst_name=microburst_name)),
+        Benchmark('merge_omni', lambda merge: merge.merge(),
+                  setup=lambda: merge_setup(Merge_OMNI, mean_slope_windows_m=[15, 30, 60, 240]))
+    ]
+
+def use_synthetic_data(root_dir):
+    """
+    Point the package config at the synthetic data set in root_dir and clear
+    its caches and the passes saved by the last run.
+    """
+    config.SAMPEX_DIR = pathlib.Path(root_dir, 'sampex')
+    config.PROJECT_DIR = pathlib.Path(root_dir, 'package', 'sampex_microburst_indices')
+    if cache.cache_dir().exists():
+        shutil.rmtree(cache.cache_dir())
+    binary_path(passes_name).unlink(missing_ok=True)
+    return
+
+def environment():
+    """
+    The git commit and the versions of the benchmarked environment.
+    """
+    def git(*args):
+        try:
+            return subprocess.run(['git', *args], cwd=here, capture_output=True, text=True,
+                                  check=True).stdout.strip()
+        except (OSError, subprocess.CalledProcessError):
+            return None
+    status = git('status', '--porcelain', '--untracked-files=no')
+    return {
+        'commit':git('rev-parse', '--short', 'HEAD'),
+        'dirty':None if status is None else bool(status),
+        'date':datetime.now().isoformat(timespec='seconds'), 'python':platform.python_version(),
+        'numpy':np.__version__, 'pandas':pd.__version__, 'platform':platform.platform(),
+        'cpu_count':os.cpu_count()
+        }
+
+def compare(results, baseline, threshold=1.1):
+    """
+    Print the ratio of the minimum run times in results to the baseline results.
+    The benchmarks slower by more than threshold are flagged.
+    """
+    print(f'Compared to {baseline["environment"]["commit"]} ({baseline["environment"]["date"]}):')
+    if results['data'] != baseline['data']:
+        print('Warning: the synthetic data sets are different.')
+    for name, result in results['benchmarks'].items():
+        if name not in baseline['benchmarks']:
+            continue
+        ratio = result['min_s']/baseline['benchmarks'][name]['min_s']
+        flag = '  <-- slower' if ratio > threshold else ''
+        print(f'{name:>24}: {baseline["benchmarks"][name]["min_s"]:8.3f} s -> '
+              f'{result["min_s"]:8.3f} s ({ratio:.2f}x){flag}')
+    return
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Benchmark the pipeline hot paths.')
+    parser.add_argument('--scale', choices=list(synthetic.scales), default='small')
+    parser.add_argument('--n_days', type=int, default=None,
+                        help='The number of HILT days. Overwrites the scale.')
+    parser.add_argument('--data_dir', default=here / 'data',
+                        help='The synthetic data set directory.')
+    parser.add_argument('--repeats', type=int, default=3)
+    parser.add_argument('--only', nargs='+', default=None, help='Only run these benchmarks.')
+    parser.add_argument('--output', default=None,
+                        help='The results json file. Defaults to benchmarks/results/{commit}.json')
+    parser.add_argument('--compare', default=None, help='The baseline results json file.')
+    args = parser.parse_args()
+
+    start_date = datetime(2000, 6, 1)
+    scale_kwargs = {} if args.n_days is None else {'n_days':args.n_days}
+    print(f'Generating the {args.scale} synthetic data set in {args.data_dir}')
+    data = synthetic.generate(args.data_dir, scale=args.scale, start_date=start_date, **scale_kwargs)
+    use_synthetic_data(args.data_dir)
+
+    results = {'environment':environment(), 'data':data, 'repeats':args.repeats, 'benchmarks':{}}
+    for benchmark in benchmarks(start_date):
+        if (args.only is not None) and (benchmark.name not in args.only):
+            continue
+        run_times = benchmark.run(repeats=args.repeats)
+        results['benchmarks'][benchmark.name] = {
+            'run_times_s':run_times, 'min_s':min(run_times), 'median_s':float(np.median(run_times))
+            }
+        print(f'{benchmark.name:>24}: {min(run_times):8.3f} s')
+
+    if args.output is None:
+        commit = results['environment']['commit'] or 'unknown'
+        suffix = '-dirty' if results['environment']['dirty'] else ''
+        args.output = here / 'results' / f'{commit}{suffix}.json'
+    output_path = pathlib.Path(args.output)
+    output_path.parent.mkdir(parents=True, exist_ok=True)
+    output_path.write_text(json.dumps(results, indent=2))
+    print(f'Saved the results to {output_path}')
+
+    if args.compare is not None:
+        compare(results, json.loads(pathlib.Path(args.compare).read_text()))
@@ -0,0 +1,258 @@
+"""
+Generate a synthetic SAMPEX and OMNI data set for the benchmarks, since the real
+data can't be shipped with the repo. The files have the same names, layouts, and
+cadences as the real files so the loaders parse them the same way:
+
+    root_dir/sampex/hilt/State4/hhrrYYYYDOY.txt
+        The 100 ms cadence State 4 HILT days with the Time, Rate1-Rate6 columns.
+    root_dir/sampex/attitude/PSSet_6sec_YYYYDOY_YYYYDOY.txt
+        The 6 s cadence attitude files with a text header, the "BEGIN DATA" line,
+        the first row with the extra column, and the 72 whitespace separated columns.
+    root_dir/package/data/omni_min{year}.asc
+        The 1-minute High Resolution OMNI yearly files in the fixed-width HRO
+        format (see data/omni_hro_format.txt).
+    root_dir/package/data/microburst_catalog.csv
+        The microburst catalog with the dateTime, fwhm, and adj_r2 columns.
+
+The spacecraft follows a circular 82 degree inclination, 96 minute orbit in a dipole
+field, so there are four radiation belt passes per orbit. The HILT counts are
+Poisson samples of a background that peaks in the outer belt, with the catalog's
+microbursts added. The files are generated once per set of parameters, see generate().
+"""
+import json
+import pathlib
+import shutil
+from datetime import datetime, timedelta
+
+import numpy as np
+import pandas as pd
+
+# The scales of the synthetic data set. Every parameter can be overwritten in generate().
+scales = {
+    'small':{'n_days':2, 'attitude_days_per_file':7, 'microbursts_per_day':200, 'omni_full_year':False},
+    'medium':{'n_days':7, 'attitude_days_per_file':7, 'microbursts_per_day':200, 'omni_full_year':False},
+    'large':{'n_days':28, 'attitude_days_per_file':7, 'microbursts_per_day':200, 'omni_full_year':True}
+}
+
+orbit_period_s = 96*60
+inclination_deg = 82
+altitude_km = 600
+earth_radius_km = 6371
+
+# The attitude columns that the loaders use (see Load_Attitude.load_attitude).
+attitude_columns = {
+    0:'Year', 1:'Day-of-year', 2:'Sec_of_day', 6:'GEO_Radius', 7:'GEO_Long', 8:'GEO_Lat',
+    9:'Altitude', 20:'L_Shell', 22:'MLT', 42:'Mirror_Alt', 68:'Pitch', 71:'Att_Flag'
+    }
+n_attitude_columns = 72
+
+# The HRO record format (see data/omni_hro_format.txt) and its fill values.
+omni_formats = (
+    ['%4d']*2 + ['%3d']*4 + ['%4d']*3 + ['%7d']*2 + ['%6.2f', '%7d'] + ['%8.2f']*8 +
+    ['%8.1f']*4 + ['%7.2f', '%9.0f', '%6.2f', '%7.2f', '%7.2f', '%6.1f'] + ['%8.2f']*6 +
+    ['%6d']*7 + ['%7.2f', '%5.1f']
+    )
+omni_fills = (
+    [None]*4 + [99]*2 + [999]*3 + [999999]*2 + [99.99, 999999] + [9999.99]*8 +
+    [99999.9]*4 + [999.99, 9999999., 99.99, 999.99, 999.99, 999.9] + [9999.99]*6 +
+    [None]*7 + [999.99, 99.9]
+    )
+
+
+def generate(root_dir, scale='small', start_date=datetime(2000, 6, 1), seed=0, **kwargs):
+    """
+    Generate the synthetic data set in root_dir, unless it already has the same
+    parameters. The scale parameters can be overwritten with kwargs. Returns the
+    dictionary of the data set parameters.
+    """
+    root_dir = pathlib.Path(root_dir)
+    params = {**scales[scale], **kwargs, 'start_date':str(start_date), 'seed':seed}
+    manifest_path = root_dir / 'manifest.json'
+    if manifest_path.exists() and (json.loads(manifest_path.read_text()) == params):
+        return params
+
+    if root_dir.exists():
+        shutil.rmtree(root_dir)
+    rng = np.random.default_rng(seed)
+    days = [start_date + timedelta(days=i) for i in range(params['n_days'])]
+
+    data_dir = root_dir / 'package' / 'data'
+    data_dir.mkdir(parents=True)
+    (root_dir / 'package' / 'sampex_microburst_indices').mkdir(parents=True)
+    (root_dir / 'sampex' / 'hilt' / 'State4').mkdir(parents=True)
+    (root_dir / 'sampex' / 'attitude').mkdir(parents=True)
+    shutil.copy(pathlib.Path(__file__).parents[1] / 'data' / 'spin_times.csv', data_dir)
+
+    microbursts = microburst_catalog(days, params['microbursts_per_day'], rng)
+    microbursts.to_csv(data_dir / 'microburst_catalog.csv', index=False)
+    for day in days:
+        day_microbursts = microbursts[microbursts['dateTime'].dt.date == day.date()]
+        hilt_day(day, day_microbursts, rng).to_csv(
+            root_dir / 'sampex' / 'hilt' / 'State4' / f'hhrr{_yeardoy(day)}.txt',
+            sep=' ', index=False, float_format='%.1f'
+            )
+    for i in range(0, len(days), params['attitude_days_per_file']):
+        file_days = days[i:i+params['attitude_days_per_file']]
+        attitude_file(
+            root_dir / 'sampex' / 'attitude' /
+            f'PSSet_6sec_{_yeardoy(file_days[0])}_{_yeardoy(file_days[-1])}.txt', file_days, rng
+            )
+
+    # The OMNI data covers the days and the lag windows before them.
+    if params['omni_full_year']:
+        omni_start = datetime(days[0].year, 1, 1)
+        omni_end = datetime(days[-1].year+1, 1, 1)
+    else:
+        omni_start = days[0] - timedelta(days=1)
+        omni_end = days[-1] + timedelta(days=2)
+    omni_times = pd.date_range(omni_start, omni_end, freq='1min', inclusive='left')
+    for year in sorted(set(omni_times.year)):
+        omni_year(data_dir / f'omni_min{year}.asc', omni_times[omni_times.year == year], rng)
+
+    manifest_path.write_text(json.dumps(params))
+    return params
+
+def orbit(times):
+    """
+    The geographic latitude, longitude, L shell, and MLT of the orbit at the
+    datetime64 times. The dipole is aligned with the rotation axis.
+    """
+    seconds = (times - np.datetime64('2000-01-01')).astype('timedelta64[ms]').astype(float)/1E3
+    phase = 2*np.pi*seconds/orbit_period_s
+    lat = np.rad2deg(np.arcsin(np.sin(np.deg2rad(inclination_deg))*np.sin(phase)))
+    # The ascending node precesses westward relative to the Earth once per day.
+    lon = (np.rad2deg(np.arctan2(np.cos(np.deg2rad(inclination_deg))*np.sin(phase), np.cos(phase)))
+           - 360*seconds/86400) % 360
+    L = (1 + altitude_km/earth_radius_km)/np.cos(np.deg2rad(lat))**2
+    hours = (seconds % 86400)/3600
+    mlt = (hours + lon/15) % 24
+    return lat, lon, L, mlt
+
+def microburst_catalog(days, microbursts_per_day, rng):
+    """
+    The catalog of microbursts at random times in the outer belt (4 < L < 8) on days.
+    """
+    times = []
+    for day in days:
+        candidates = np.datetime64(day, 'ms') + np.arange(0, 86400_000, 100).astype('timedelta64[ms]')
+        _, _, L, _ = orbit(candidates)
+        candidates = candidates[(L > 4) & (L < 8)]
+        times.append(np.sort(rng.choice(candidates, size=microbursts_per_day, replace=False)))
+    times = np.concatenate(times) + rng.integers(0, 100, size=len(days)*microbursts_per_day
+                                                 ).astype('timedelta64[ms]')
+    return pd.DataFrame(data={
+        'dateTime':times.astype('datetime64[ns]'),
+        'fwhm':rng.uniform(0.05, 0.5, size=times.shape[0]),
+        'adj_r2':rng.uniform(0.2, 1, size=times.shape[0])
+        })
+
+def hilt_day(day, microbursts, rng, gap_fraction=0.01):
+    """
+    One day of the 100 ms cadence State 4 HILT data. Each row has five 20 ms
+    samples, in the Rate1-Rate4 and Rate6 columns, and the 100 ms Rate5 sample.
+    gap_fraction of the day is removed in one minute data gaps.
+    """
+    seconds = np.round(np.arange(0, 86400, 0.1), 1)
+    minutes = np.arange(1440)
+    gap_minutes = rng.choice(minutes, size=int(gap_fraction*minutes.shape[0]), replace=False)
+    seconds = seconds[~np.isin((seconds // 60).astype(int), gap_minutes)]
+
+    sample_times = (np.datetime64(day, 'ns') + (1E9*seconds).astype('timedelta64[ns]')
+                    )[:, np.newaxis] + (20_000_000*np.arange(5)).astype('timedelta64[ns]')
+    _, _, L, _ = orbit(sample_times.ravel())
+    background = 5 + 200*np.exp(-((L - 5)/1.5)**2)
+
+    # Add the microbursts as Gaussian peaks.
+    sample_seconds = (sample_times.ravel() - np.datetime64(day, 'ns')).astype(float)/1E9
+    peak_seconds = (microbursts['dateTime'].to_numpy() - np.datetime64(day, 'ns')).astype(float)/1E9
+    for peak_second, fwhm in zip(peak_seconds, microbursts['fwhm'].to_numpy()):
+        i, j = np.searchsorted(sample_seconds, [peak_second - 2*fwhm, peak_second + 2*fwhm])
+        sigma = fwhm/2.355
+        background[i:j] += 2000*np.exp(-(sample_seconds[i:j] - peak_second)**2/(2*sigma**2))
+
+    counts = rng.poisson(background).reshape(-1, 5)
+    hilt = pd.DataFrame(data={
+        'Time':seconds, 'Rate1':counts[:, 0], 'Rate2':counts[:, 1], 'Rate3':counts[:, 2],
+        'Rate4':counts[:, 3], 'Rate5':rng.poisson(counts.sum(axis=1)/4), 'Rate6':counts[:, 4]
+        })
+    return hilt
+
+def attitude_file(path, days, rng):
+    """
+    Write the 6 s cadence attitude file for days to path.
+    """
+    times = np.datetime64(days[0], 's') + np.arange(0, 86400*len(days), 6).astype('timedelta64[s]')
+    lat, lon, L, mlt = orbit(times)
+    day_starts = times.astype('datetime64[D]')
+    year_starts = times.astype('datetime64[Y]')
+
+    # The unused columns are random numbers so the file has a realistic size.
+    values = rng.uniform(-1, 1, size=(times.shape[0], n_attitude_columns)).round(4)
+    values[:, 0] = year_starts.astype(int) + 1970
+    values[:, 1] = (day_starts - year_starts.astype('datetime64[D]')).astype(int) + 1
+    values[:, 2] = (times - day_starts).astype(int)
+    values[:, 6] = (earth_radius_km + altitude_km)/earth_radius_km
+    values[:, 7] = lon
+    values[:, 8] = lat
+    values[:, 9] = altitude_km
+    values[:, 20] = L
+    values[:, 22] = mlt
+    values[:, 42] = rng.uniform(-100, 500, size=times.shape[0])
+    values[:, 68] = rng.uniform(0, 180, size=times.shape[0])
+    values[:, 71] = rng.choice([0, 1, 2, 3, 128], p=[0.7, 0.1, 0.1, 0.09, 0.01], size=times.shape[0])
+    attitude = pd.DataFrame(values).round(4)
+    for column in [0, 1, 2, 71]:
+        attitude[column] = attitude[column].astype(int)
+
+    with open(path, 'w') as f:
+        f.write(_attitude_header(path.name, days))
+        # The first data row has an extra column.
+        f.write(' '.join(['0']*(n_attitude_columns+1)) + '\n')
+        attitude.to_csv(f, sep=' ', header=False, index=False)
+    return
+
+def omni_year(path, times, rng):
+    """
+    Write the HRO format 1-minute OMNI data at times to path. The AE, AL, AU,
+    SYM/D, SYM/H, ASY/D, and ASY/H indices are random walks and the other
+    columns are mostly fill values.
+    """
+    n = times.shape[0]
+    values = np.array(omni_fills, dtype=float)[np.newaxis, :].repeat(n, axis=0)
+    values[:, 0] = times.year
+    values[:, 1] = times.dayofyear
+    values[:, 2] = times.hour
+    values[:, 3] = times.minute
+    measured = rng.uniform(size=n) < 0.7
+    values[measured, 13:21] = rng.normal(0, 5, size=(measured.sum(), 8)).round(2)
+
+    def random_walk(scale, low, high):
+        return np.clip(np.cumsum(rng.normal(0, scale, size=n)), low, high).round()
+    al = random_walk(10, -2000, 0)
+    au = random_walk(5, 0, 800)
+    values[:, 37] = au - al
+    values[:, 38] = al
+    values[:, 39] = au
+    values[:, 40] = random_walk(1, -50, 50)
+    values[:, 41] = random_walk(2, -400, 50)
+    values[:, 42] = np.abs(random_walk(1, -100, 100))
+    values[:, 43] = np.abs(random_walk(2, -300, 300))
+    np.savetxt(path, values, fmt=''.join(omni_formats))
+    return
+
+def _attitude_header(file_name, days):
+    """
+    The text header of the attitude files, with the column descriptions.
+    """
+    lines = [
+        f'SAMPEX PSSet_6sec attitude and orbit file {file_name}',
+        f'Start: {_yeardoy(days[0])}  End: {_yeardoy(days[-1])}  Cadence: 6 sec',
+        'Column descriptions:'
+        ]
+    for i in range(n_attitude_columns):
+        lines.append(f'{i+1:4d}  {attitude_columns.get(i, f"Parameter_{i+1}")}')
+    lines.append('BEGIN DATA')
+    return '\n'.join(lines) + '\n'
+
+def _yeardoy(day):
+    return f'{day.year}{day.timetuple().tm_yday:03d}'
@@ -0,0 +1,63 @@
+"""
+A micro-benchmark that compares the string-based attitude time parsing 
+against the vectorized sampex.yeardoy2datetime64() function on a full
+attitude file.
+
+Usage: python3 benchmarks/time_conversion.py [attitude_file_path]
+
+If the attitude file is not given, the first file in the Attitude_Index is used.
+"""
+import sys
+import time
+import pathlib
+
+import numpy as np
+import pandas as pd
+
+from sampex_microburst_indices.load import sampex
+
+
+def string_time_conversion(year, doy, seconds):
+    """
+    The string-based time conversion that sampex.yeardoy2datetime64() replaced.
+    """
+    year_doy = [f'{y}-{d}' for y, d in zip(year, doy)]
+    attitude_dates = pd.to_datetime(year_doy, format='%Y-%j')
+    return attitude_dates + pd.to_timedelta(seconds, unit='s')
+
+def time_function(function, *args, repeats=5):
+    """
+    The minimum run time of function(*args) over repeats runs.
+    """
+    run_times = []
+    for _ in range(repeats):
+        start_time = time.perf_counter()
+        result = function(*args)
+        run_times.append(time.perf_counter() - start_time)
+    return min(run_times), result
+
+
+if __name__ == '__main__':
+    if len(sys.argv) > 1:
+        attitude_path = pathlib.Path(sys.argv[1])
+    else:
+        attitude_path = sampex.Attitude_Index().files[0]
+
+    with open(attitude_path) as f:
+        for line in f:
+            if "BEGIN DATA" in line:
+                next(f)
+                break
+        attitude = pd.read_csv(f, delim_whitespace=True, usecols=[0, 1, 2], 
+                               names=['Year', 'Day-of-year', 'Sec_of_day'])
+    year, doy, seconds = [attitude[column].to_numpy() for column in attitude.columns]
+
+    string_time, string_result = time_function(string_time_conversion, year, doy, seconds)
+    vectorized_time, vectorized_result = time_function(sampex.yeardoy2datetime64, year, doy, seconds)
+    assert np.array_equal(string_result.to_numpy(), vectorized_result), (
+        'The string and vectorized time stamps are not equal.')
+
+    print(f'{attitude_path.name}: {attitude.shape[0]} rows')
+    print(f'string time conversion: {round(1E3*string_time, 2)} ms')
+    print(f'vectorized time conversion: {round(1E3*vectorized_time, 2)} ms')
+    print(f'speedup: {round(string_time/vectorized_time, 1)}x')
@@ -1,9 +1,2 @@
-import warnings
-
-try:
-    from sampex_microburst_indices import config
-except ImportError as err:
-    message = ("The sampex_microburst_indices configuration (data paths) didn't "
-               "import. Did you run 'python3 -m sampex_microburst_indices init' and "
-               "answer the prompts?")
-    warnings.warn(message)
\ No newline at end of file
+# The package import is kept light so that the worker processes only import the
+# modules they use. The data paths in config are read when they are first used.
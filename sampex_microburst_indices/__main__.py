@@ -3,6 +3,8 @@ import pathlib
 
 # Run the configuration script when the user runs 
 # python3 -m sampex_microburst_indices [init, config, or configure]
+# or the data processing pipeline when the user runs
+# python3 -m sampex_microburst_indices run [options]
 
 here = pathlib.Path(__file__).parent.resolve()
 
@@ -25,15 +27,20 @@ if (len(sys.argv) > 1) and (sys.argv[1] in ['init', 'config', 'configure']):
         raise OSError(f'The AE data directory "{HILT_DIR}" does not '
                         'exist. Exiting.')
     
-    with open(pathlib.Path(here, 'config.py'), 'w') as f:
-        f.write('import pathlib\n\n')
-        f.write(f'SAMPEX_DIR = pathlib.Path("{HILT_DIR}")\n')
-        f.write(f'AE_DIR = pathlib.Path("{AE_DIR}")\n')
-        f.write(f'PROJECT_DIR = pathlib.Path("{here}")')
+    from sampex_microburst_indices import config
+    config.write_config(SAMPEX_DIR=HILT_DIR, AE_DIR=AE_DIR, PROJECT_DIR=here)
+    print(f'Saved the configuration to {config.config_path()}')
+
+elif (len(sys.argv) > 1) and (sys.argv[1] == 'run'):
+    from sampex_microburst_indices.pipeline.pipeline import main
+    main(sys.argv[2:])
 
 else:
-    print('This is a configuration script to set up config.py file. The config '
+    print('This is a configuration script to set up the config.ini file. The config '
         'file will contain the SAMPEX/HILT data directory, the base project '
         'directory (here), and the auroral electrojet directory. To see the '
         'prompt after this package is installed, run '
-        'python3 -m sampex_microburst_indices init')
+        'python3 -m sampex_microburst_indices init. The SAMPEX_DIR, SAMPEX_AE_DIR, '
+        'and SAMPEX_PROJECT_DIR environment variables override the config file. '
+        'To run the data processing pipeline, run '
+        'python3 -m sampex_microburst_indices run')
@@ -0,0 +1,187 @@
+"""
+Batch generate the 2D histogram panels of the microburst occurrence vs. the
+geomagnetic indices for a grid of (index x MLT sector x filter) specifications.
+
+The histograms are calculated before any plotting: for each index, every
+pass is labeled by its unique pattern of (MLT sector, filter) memberships and one
+np.histogramdd call over the (pattern, x, index) values bins the passes for all
+of the panels at once. Each panel's histogram is then the sum over the patterns
+that belong to it. The panels are rendered to png files by a pool of worker
+processes with the non-interactive Agg backend.
+
+To render the default grid run:
+python3 -m sampex_microburst_indices.analysis.batch_plots --workers 4
+"""
+import argparse
+import multiprocessing
+import pathlib
+
+import numpy as np
+
+from sampex_microburst_indices import config
+from sampex_microburst_indices.analysis.catalog import get_catalog
+from sampex_microburst_indices.analysis.catalog import good_passes
+
+default_indices = ['SYM/D', 'SYM/H', 'ASY/D', 'ASY/H', 'AE', 'AU', 'AL']
+# The MLT sectors are (lower, upper) MLT ranges, or None for all MLT.
+default_mlt_sectors = {'all_MLT':None, '00_MLT_12':(0, 12), '12_MLT_24':(12, 24)}
+# The filters are tuples of (column, lower, upper) filters (see analysis/catalog.py).
+default_filters = {
+    'all_passes':good_passes,
+    'microburst_passes':(*good_passes, ('microburst_count', 0, None)),
+    'no_microburst_passes':(*good_passes, ('microburst_count', None, 1))
+}
+
+
+class Batch_Plots:
+    def __init__(self, indices=None, mlt_sectors=None, filters=None, x='microburst_prob',
+                bins=10, file_name='sampex_passes_v0.csv', mlt_column='mean_MLT',
+                save_dir=None) -> None:
+        """
+        The grid of 2D histogram panels of x vs. each index, for every MLT sector
+        and filter.
+
+        Parameters
+        ----------
+        indices: list
+            The index columns to plot on the y-axis. If None, default_indices is used.
+        mlt_sectors: dict
+            The sector names and (lower, upper) MLT ranges (None for all MLT).
+            If None, default_mlt_sectors is used.
+        filters: dict
+            The filter names and tuples of (column, lower, upper) filters. If None,
+            default_filters is used.
+        x: str
+            The column to plot on the x-axis.
+        bins: int
+            The number of x and y bins. The bins span the range of each column
+            so all panels of an index share the same bins.
+        file_name: str
+            The passes catalog file name.
+        mlt_column: str
+            The MLT column used by the MLT sectors.
+        save_dir: str or pathlib.Path
+            The directory to save the panels to. If None, the panels are saved to
+            config.PROJECT_DIR/../plots/batch/.
+        """
+        self.indices = default_indices if indices is None else indices
+        self.mlt_sectors = default_mlt_sectors if mlt_sectors is None else mlt_sectors
+        self.filters = default_filters if filters is None else filters
+        self.x = x
+        self.bins = bins
+        self.file_name = file_name
+        self.mlt_column = mlt_column
+        if save_dir is None:
+            self.save_dir = pathlib.Path(config.PROJECT_DIR, '..', 'plots', 'batch')
+        else:
+            self.save_dir = pathlib.Path(save_dir)
+        return
+
+    def specs(self):
+        """
+        The (index, MLT sector name, filter name) specifications of every panel.
+        """
+        return [(index, sector, filter_name) for index in self.indices
+                for sector in self.mlt_sectors for filter_name in self.filters]
+
+    def histograms(self):
+        """
+        Calculate the histograms of every panel. Returns a dictionary with the
+        specs() keys and the (counts, x_edges, y_edges) values.
+        """
+        catalog = get_catalog(self.file_name)
+        # The (sector, filter) panel membership of every pass.
+        panels = [(sector, filter_name) for sector in self.mlt_sectors for filter_name in self.filters]
+        membership = np.column_stack([
+            catalog.mask(*self.filters[filter_name], *self._sector_filter(sector))
+            for sector, filter_name in panels
+            ])
+        x = catalog[self.x].to_numpy(dtype=float)
+
+        histograms = {}
+        for index in self.indices:
+            y = catalog[index].to_numpy(dtype=float)
+            valid = np.isfinite(x) & np.isfinite(y) & membership.any(axis=1)
+            patterns, pattern_ids = np.unique(membership[valid], axis=0, return_inverse=True)
+            x_edges = np.histogram_bin_edges(x[valid], bins=self.bins)
+            y_edges = np.histogram_bin_edges(y[valid], bins=self.bins)
+
+            # One histogram of all passes, binned by their membership pattern.
+            pattern_counts, _ = np.histogramdd(
+                (pattern_ids.ravel(), x[valid], y[valid]),
+                bins=(np.arange(patterns.shape[0]+1)-0.5, x_edges, y_edges)
+                )
+            panel_counts = np.tensordot(patterns.T.astype(float), pattern_counts, axes=1)
+            for (sector, filter_name), counts in zip(panels, panel_counts):
+                histograms[(index, sector, filter_name)] = (counts, x_edges, y_edges)
+        return histograms
+
+    def render(self, workers=None):
+        """
+        Calculate the histograms and render every panel to a png file in a
+        pool of workers processes (all CPUs if workers is None). Returns the
+        list of the saved file paths.
+        """
+        self.save_dir.mkdir(parents=True, exist_ok=True)
+        tasks = []
+        for (index, sector, filter_name), histogram in self.histograms().items():
+            save_name = f'{index}_{sector}_{filter_name}.png'.replace('/', '_')
+            title = (f'SAMPEX-HILT | {self._sector_label(sector)} | '
+                     f'{filter_name.replace("_", " ")}')
+            tasks.append((*histogram, self.x, index, title, self.save_dir / save_name))
+
+        with multiprocessing.Pool(processes=workers) as pool:
+            save_paths = list(pool.imap_unordered(_render_panel, tasks, chunksize=4))
+        return sorted(save_paths)
+
+    def _sector_filter(self, sector):
+        """
+        The MLT sector as a tuple of filters.
+        """
+        if self.mlt_sectors[sector] is None:
+            return ()
+        return ((self.mlt_column, *self.mlt_sectors[sector]),)
+
+    def _sector_label(self, sector):
+        if self.mlt_sectors[sector] is None:
+            return 'All MLT'
+        return f'{self.mlt_sectors[sector][0]} < MLT < {self.mlt_sectors[sector][1]}'
+
+
+def _render_panel(args):
+    """
+    The multiprocessing worker that renders one panel with the Agg backend.
+    """
+    import matplotlib
+    matplotlib.use('Agg')
+    import matplotlib.colors
+    import matplotlib.pyplot as plt
+
+    counts, x_edges, y_edges, x_label, y_label, title, save_path = args
+    fig, ax = plt.subplots()
+    if counts.max() > 0:
+        # Like hist2d with a LogNorm, the empty bins are not drawn.
+        p = ax.pcolormesh(x_edges, y_edges, np.ma.masked_equal(counts, 0).T,
+                          norm=matplotlib.colors.LogNorm())
+        plt.colorbar(p, ax=ax, label='Number of radiation belt passes')
+    ax.set_xlabel(x_label)
+    ax.set_ylabel(y_label)
+    ax.set_title(title)
+    plt.tight_layout()
+    fig.savefig(save_path)
+    plt.close(fig)
+    return save_path
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Batch generate the 2D histogram panels.')
+    parser.add_argument('--indices', nargs='+', default=None)
+    parser.add_argument('--bins', type=int, default=10)
+    parser.add_argument('--workers', type=int, default=None,
+                        help='The number of rendering processes. Defaults to the number of CPUs.')
+    parser.add_argument('--save_dir', default=None)
+    args = parser.parse_args()
+
+    plots = Batch_Plots(indices=args.indices, bins=args.bins, save_dir=args.save_dir)
+    save_paths = plots.render(workers=args.workers)
+    print(f'Saved {len(save_paths)} panels to {plots.save_dir.resolve()}')
@@ -0,0 +1,192 @@
+"""
+Out-of-core binned statistics of the catalogs. A Binned_Stats object holds the
+counts, sums, and sums of squares of the value columns (e.g. microburst_prob
+and microburst_count) in an N-dimensional grid of bins over the bin columns
+(e.g. AE, SYM/H, MLT, and L). These partial aggregates are updated one chunk
+at a time and partials from different chunks or worker processes are combined
+with merge(), so the catalog never needs to fit in memory. The 1D and 2D
+occurrence maps are then the marginal() sums of one N-dimensional pass.
+
+For example, the mean microburst_prob vs. AE and MLT with 4 workers:
+
+    bins = {'AE':np.linspace(0, 1000, 21), 'mean_MLT':np.arange(0, 25)}
+    stats = stream_catalog_stats('sampex_passes_v0.csv', bins, filters=good_passes, workers=4)
+    mean_prob = stats.mean('microburst_prob')
+"""
+import multiprocessing
+
+import numpy as np
+
+from sampex_microburst_indices.analysis.catalog import filter_mask
+from sampex_microburst_indices.load.catalog_io import catalog_rows
+from sampex_microburst_indices.load.catalog_io import iter_catalog
+
+default_values = ['microburst_prob', 'microburst_count']
+
+
+class Binned_Stats:
+    def __init__(self, bins, values=None) -> None:
+        """
+        The counts, sums, and sums of squares of the values columns in the bins.
+
+        Parameters
+        ----------
+        bins: dict
+            The bin columns and their bin edges. Like np.histogram, the bins
+            include their lower edge and the last bin includes its upper edge.
+            The rows outside of the bins, or with NaN values, are not counted.
+        values: list
+            The value columns. If None, default_values is used.
+        """
+        self.bins = {column:np.asarray(edges, dtype=float) for column, edges in bins.items()}
+        self.values = default_values if values is None else list(values)
+        self.shape = tuple(edges.shape[0]-1 for edges in self.bins.values())
+        self.counts = np.zeros(self.shape, dtype=np.int64)
+        self.sums = {value:np.zeros(self.shape) for value in self.values}
+        self.sums_of_squares = {value:np.zeros(self.shape) for value in self.values}
+        return
+
+    def update(self, chunk, filters=()):
+        """
+        Add the rows of the chunk, a DataFrame or a dictionary of column arrays,
+        that pass the (column, lower, upper) filters (see analysis/catalog.py).
+        """
+        n_rows = np.asarray(chunk[next(iter(self.bins))]).shape[0]
+        keep = filter_mask(chunk, filters, n_rows)
+
+        bin_indices = []
+        for column, edges in self.bins.items():
+            values = np.asarray(chunk[column], dtype=float)
+            # The last bin includes its upper edge, like np.histogram.
+            i = np.searchsorted(edges, values, side='right') - 1
+            i[values == edges[-1]] = edges.shape[0] - 2
+            keep &= (i >= 0) & (i < edges.shape[0] - 1) & np.isfinite(values)
+            bin_indices.append(i)
+
+        values = {value:np.asarray(chunk[value], dtype=float) for value in self.values}
+        for value in self.values:
+            # A row is only counted if all of its values are finite, so the counts
+            # are shared by all values.
+            keep &= np.isfinite(values[value])
+
+        flat_index = np.ravel_multi_index([i[keep] for i in bin_indices], self.shape)
+        size = self.counts.size
+        self.counts += np.bincount(flat_index, minlength=size).reshape(self.shape)
+        for value in self.values:
+            v = values[value][keep]
+            self.sums[value] += np.bincount(flat_index, weights=v, minlength=size).reshape(self.shape)
+            self.sums_of_squares[value] += np.bincount(
+                flat_index, weights=v**2, minlength=size
+                ).reshape(self.shape)
+        return self
+
+    def merge(self, other):
+        """
+        Add the partial aggregates of other, with the same bins and values, to self.
+        """
+        if (list(self.bins) != list(other.bins)) or (self.values != other.values) or not all(
+                np.array_equal(self.bins[column], other.bins[column]) for column in self.bins):
+            raise ValueError('Only Binned_Stats with the same bins and values can be merged.')
+        self.counts += other.counts
+        for value in self.values:
+            self.sums[value] += other.sums[value]
+            self.sums_of_squares[value] += other.sums_of_squares[value]
+        return self
+
+    def marginal(self, columns):
+        """
+        A new Binned_Stats with only the columns bins. The other bin columns are
+        summed over, e.g. marginal(['AE']) is the 1D AE occurrence.
+        """
+        axes = tuple(i for i, column in enumerate(self.bins) if column not in columns)
+        marginal = Binned_Stats({column:self.bins[column] for column in self.bins
+                                 if column in columns}, values=self.values)
+        marginal.counts = self.counts.sum(axis=axes)
+        for value in self.values:
+            marginal.sums[value] = self.sums[value].sum(axis=axes)
+            marginal.sums_of_squares[value] = self.sums_of_squares[value].sum(axis=axes)
+        return marginal
+
+    def mean(self, value):
+        """
+        The mean of value in each bin. The empty bins are NaN.
+        """
+        with np.errstate(invalid='ignore', divide='ignore'):
+            return self.sums[value]/self.counts
+
+    def std(self, value):
+        """
+        The (population) standard deviation of value in each bin. The empty bins are NaN.
+        """
+        with np.errstate(invalid='ignore', divide='ignore'):
+            variance = self.sums_of_squares[value]/self.counts - self.mean(value)**2
+        # Round-off can make the variance slightly negative.
+        return np.sqrt(np.maximum(variance, 0))
+
+    def save(self, path):
+        """
+        Save the partial aggregates to the path npz file.
+        """
+        arrays = {'counts':self.counts, 'bin_columns':np.array(list(self.bins), dtype=str),
+                  'values':np.array(self.values, dtype=str)}
+        for i, edges in enumerate(self.bins.values()):
+            arrays[f'bins_{i}'] = edges
+        for i, value in enumerate(self.values):
+            arrays[f'sums_{i}'] = self.sums[value]
+            arrays[f'sums_of_squares_{i}'] = self.sums_of_squares[value]
+        np.savez(path, **arrays)
+        return
+
+    @classmethod
+    def load(cls, path):
+        """
+        Load the partial aggregates saved by save().
+        """
+        with np.load(path) as npz:
+            bins = {column:npz[f'bins_{i}'] for i, column in enumerate(npz['bin_columns'])}
+            stats = cls(bins, values=list(npz['values']))
+            stats.counts = npz['counts']
+            for i, value in enumerate(stats.values):
+                stats.sums[value] = npz[f'sums_{i}']
+                stats.sums_of_squares[value] = npz[f'sums_of_squares_{i}']
+        return stats
+
+
+def stream_catalog_stats(file_name, bins, values=None, filters=(), chunk_rows=1_000_000,
+                         workers=1):
+    """
+    Calculate the Binned_Stats of the file_name catalog in one streaming pass
+    over chunks of chunk_rows rows. If workers > 1, the chunks are split among a
+    pool of worker processes and their partials are merged.
+    """
+    stats = Binned_Stats(bins, values=values)
+    columns = list(dict.fromkeys(
+        [*stats.bins, *stats.values, *[column for column, _, _ in filters]]
+        ))
+    if workers == 1:
+        for chunk in iter_catalog(file_name, columns=columns, chunk_rows=chunk_rows):
+            stats.update(chunk, filters=filters)
+        return stats
+
+    # Split the rows into one contiguous range of whole chunks per worker.
+    n_chunks = -(-catalog_rows(file_name) // chunk_rows)
+    chunk_splits = np.linspace(0, n_chunks, min(workers, n_chunks)+1).astype(int)*chunk_rows
+    args = [(file_name, bins, values, filters, columns, chunk_rows, (start, end)) 
+            for start, end in zip(chunk_splits[:-1], chunk_splits[1:])]
+    with multiprocessing.Pool(processes=workers) as pool:
+        for partial in pool.imap_unordered(_stats_worker, args):
+            stats.merge(partial)
+    return stats
+
+def _stats_worker(args):
+    """
+    The multiprocessing worker that aggregates the chunks in its row range.
+    """
+    file_name, bins, values, filters, columns, chunk_rows, row_range = args
+    stats = Binned_Stats(bins, values=values)
+    n_rows = catalog_rows(file_name)
+    row_range = (row_range[0], min(row_range[1], n_rows))
+    for chunk in iter_catalog(file_name, columns=columns, chunk_rows=chunk_rows, 
+                              row_range=row_range):
+        stats.update(chunk, filters=filters)
+    return stats
@@ -0,0 +1,124 @@
+"""
+A shared query object for the pass and microburst catalogs. Each catalog is
+loaded once per process by get_catalog() and its columns are read from the
+binary catalog (see load/catalog_io.py) the first time they are needed. The
+filtered views are memoized by their filters, so a notebook or a batch of plots
+that reuse the same filters do not reload or refilter the catalog.
+
+A filter is a (column, lower, upper) tuple that selects the rows with
+lower < column < upper. Either bound can be None. If lower > upper, the range
+wraps around, e.g. ('mean_MLT', 21, 3) selects the 21-24 and 0-3 MLT sector.
+All of a query's filters are evaluated together in one boolean mask, e.g.
+
+    catalog = get_catalog('sampex_passes_v0.csv')
+    passes = catalog.query(*good_passes, ('mean_MLT', 0, 12), ('AE', 300, None))
+"""
+import numpy as np
+import pandas as pd
+
+from sampex_microburst_indices.load.catalog_io import binary_catalog
+from sampex_microburst_indices.load.catalog_io import catalog_columns
+from sampex_microburst_indices.load.catalog_io import load_catalog
+
+# The default filters used in the analysis scripts.
+good_passes = (('max_att_flag', None, 100), ('duration_s', None, 5*60))
+good_microbursts = (('adj_r2', 0.5, None),)
+
+_catalogs = {}
+
+
+def get_catalog(file_name='sampex_passes_v0.csv'):
+    """
+    Get the Catalog for file_name. It is loaded once per process and reloaded if
+    the catalog file changed.
+    """
+    path = binary_catalog(file_name)
+    if (file_name not in _catalogs) or (_catalogs[file_name].modified != path.stat().st_mtime_ns):
+        _catalogs[file_name] = Catalog(file_name)
+    return _catalogs[file_name]
+
+
+class Catalog:
+    def __init__(self, file_name) -> None:
+        """
+        Query the file_name catalog in the config.PROJECT_DIR/../data/ directory.
+        The columns are loaded when they are first needed.
+        """
+        self.file_name = file_name
+        self.modified = binary_catalog(file_name).stat().st_mtime_ns
+        self.columns = catalog_columns(file_name)
+        self.index = load_catalog(file_name, columns=[]).index
+        self._data = {}
+        self._masks = {}
+        self._views = {}
+        return
+
+    def query(self, *filters, columns=None):
+        """
+        Return the rows that pass all of the (column, lower, upper) filters. If
+        columns is None, all of the catalog columns are returned. The returned
+        DataFrame is shared by all queries with the same filters and columns, so
+        copy it before modifying it.
+        """
+        if columns is None:
+            columns = self.columns
+        key = (_filters_key(filters), tuple(columns))
+        if key not in self._views:
+            mask = self.mask(*filters)
+            self._load_columns(columns)
+            self._views[key] = pd.DataFrame(
+                data={column:self._data[column][mask] for column in columns},
+                index=self.index[mask], columns=columns
+                )
+        return self._views[key]
+
+    def mask(self, *filters):
+        """
+        The boolean mask of the rows that pass all of the (column, lower, upper) filters.
+        """
+        key = _filters_key(filters)
+        if key not in self._masks:
+            self._load_columns([column for column, _, _ in key])
+            self._masks[key] = filter_mask(self._data, key, self.index.shape[0])
+        return self._masks[key]
+
+    def __getitem__(self, column):
+        """
+        The values of column for all rows.
+        """
+        self._load_columns([column])
+        return pd.Series(self._data[column], index=self.index, name=column)
+
+    def _load_columns(self, columns):
+        """
+        Read the columns that are not loaded yet from the catalog file.
+        """
+        missing = [column for column in dict.fromkeys(columns) if column not in self._data]
+        if missing:
+            loaded = load_catalog(self.file_name, columns=missing)
+            self._data.update({column:loaded[column].to_numpy() for column in missing})
+        return
+
+
+def filter_mask(data, filters, n_rows):
+    """
+    The boolean mask of the n_rows rows that pass all of the (column, lower, upper) 
+    filters. data is a DataFrame or a dictionary of column arrays.
+    """
+    mask = np.ones(n_rows, dtype=bool)
+    for column, lower, upper in filters:
+        values = np.asarray(data[column])
+        if (lower is not None) and (upper is not None) and (lower > upper):
+            mask &= (values > lower) | (values < upper)
+            continue
+        if lower is not None:
+            mask &= values > lower
+        if upper is not None:
+            mask &= values < upper
+    return mask
+
+def _filters_key(filters):
+    """
+    The hashable key of the filters, independent of their order.
+    """
+    return tuple(sorted(set(tuple(f) for f in filters), key=repr))
@@ -1,18 +1,14 @@
-import pathlib
-
 import matplotlib.pyplot as plt
-import pandas as pd
 import numpy as np
 
-from sampex_microburst_indices import config
+from sampex_microburst_indices.analysis.catalog import get_catalog
+from sampex_microburst_indices.analysis.catalog import good_passes
 
 file_name = 'sampex_passes_v0.csv'
-file_path = pathlib.Path(config.PROJECT_DIR, '..', 'data', file_name)
 
 ### All good passes
-catalog = pd.read_csv(file_path)
-catalog = catalog[catalog['max_att_flag'] < 100]
-catalog = catalog[catalog['duration_s'] < 5*60]
+columns = ['AE', 'AU', 'AL']
+catalog = get_catalog(file_name).query(*good_passes, columns=columns)
 # print(catalog.describe())
 
 ### All radiation belt passes
@@ -35,7 +31,8 @@ fig1.suptitle('SAMPEX-HILT | Microburst occurrence in 4 < L < 8 | All MLT | All
 plt.tight_layout()
 
 ### Only radiation belt passes with microbursts
-microburst_passes_catalog = catalog[catalog['microburst_count'] > 0]
+microburst_passes_catalog = get_catalog(file_name).query(
+    *good_passes, ('microburst_count', 0, None), columns=columns)
 fig2, bx = plt.subplots(1, 3, figsize=(10, 5))
 
 bx[0].hist(microburst_passes_catalog['AE'], bins=50)
@@ -55,7 +52,8 @@ fig2.suptitle('SAMPEX-HILT | Microburst occurrence in 4 < L < 8 | All MLT | > 1
 plt.tight_layout()
 
 ### Only radiation belt passes without microbursts
-no_microburst_passes_catalog = catalog[catalog['microburst_count'] == 0]
+no_microburst_passes_catalog = get_catalog(file_name).query(
+    *good_passes, ('microburst_count', None, 1), columns=columns)
 fig3, cx = plt.subplots(1, 3, figsize=(10, 5))
 
 cx[0].hist(no_microburst_passes_catalog['AE'], bins=50)
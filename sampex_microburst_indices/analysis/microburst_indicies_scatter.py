@@ -1,21 +1,17 @@
-import pathlib
-
 import matplotlib.pyplot as plt
 import matplotlib.colors
-import pandas as pd
 import numpy as np
 
-from sampex_microburst_indices import config
+from sampex_microburst_indices.analysis.catalog import get_catalog
+from sampex_microburst_indices.analysis.catalog import good_passes
 
 type = 'hist'
 file_name = 'sampex_passes_v0.csv'
-file_path = pathlib.Path(config.PROJECT_DIR, '..', 'data', file_name)
 
 # Load and filter
-catalog = pd.read_csv(file_path)
 # Default filters for all passes.
-catalog = catalog[catalog['max_att_flag'] < 100]
-catalog = catalog[catalog['duration_s'] < 5*60]
+catalog = get_catalog(file_name).query(*good_passes, 
+    columns=['microburst_prob', 'SYM/D', 'SYM/H', 'ASY/D', 'ASY/H', 'AE', 'AU', 'AL'])
 
 fig2, bx = plt.subplots(2, 4, figsize=(10, 5))
 
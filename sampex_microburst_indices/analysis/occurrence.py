@@ -1,18 +1,14 @@
-import pathlib
-
 import matplotlib.pyplot as plt
-import pandas as pd
 import numpy as np
 
-from sampex_microburst_indices import config
+from sampex_microburst_indices.analysis.catalog import get_catalog
+from sampex_microburst_indices.analysis.catalog import good_passes
 
 file_name = 'sampex_passes_v0.csv'
-file_path = pathlib.Path(config.PROJECT_DIR, '..', 'data', file_name)
 
 ### All good passes
-catalog = pd.read_csv(file_path)
-catalog = catalog[catalog['max_att_flag'] < 100]
-catalog = catalog[catalog['duration_s'] < 5*60]
+columns = ['duration_s', 'microburst_count']
+catalog = get_catalog(file_name).query(*good_passes, columns=columns)
 # print(catalog.describe())
 
 fig1, ax = plt.subplots(1, 2, figsize=(10, 5))
@@ -31,9 +27,8 @@ fig1.suptitle('SAMPEX-HILT | Microburst occurrence in 4 < L < 8 | All MLT')
 plt.tight_layout()
 
 ### Morning MLT
-morning_catalog = catalog.copy()
-morning_catalog = morning_catalog[(morning_catalog['mean_MLT'] > 0) &
-                                  (morning_catalog['mean_MLT'] < 12)]
+morning_catalog = get_catalog(file_name).query(
+    *good_passes, ('mean_MLT', 0, 12), columns=columns)
 
 fig2, bx = plt.subplots(1, 2, figsize=(10, 5))
 
@@ -51,9 +46,8 @@ fig2.suptitle('SAMPEX-HILT | Microburst occurrence in 4 < L < 8 | 0 < MLT < 12')
 plt.tight_layout()
 
 ### Afternoon MLT
-afternoon_catalog = catalog.copy()
-afternoon_catalog = afternoon_catalog[(afternoon_catalog['mean_MLT'] > 12) &
-                                      (afternoon_catalog['mean_MLT'] < 24)]
+afternoon_catalog = get_catalog(file_name).query(
+    *good_passes, ('mean_MLT', 12, 24), columns=columns)
 
 fig3, cx = plt.subplots(1, 2, figsize=(10, 5))
 
@@ -2,19 +2,14 @@
 A script to explore the radiation belt pass statistics.
 """
 
-import pathlib
-
 import matplotlib.pyplot as plt
 from matplotlib.transforms import Transform
-import pandas as pd
 
-from sampex_microburst_indices import config
+from sampex_microburst_indices.analysis.catalog import get_catalog
 
 file_name = 'sampex_passes_v0.csv'
-file_path = pathlib.Path(config.PROJECT_DIR, '..', 'data', file_name)
 
-catalog = pd.read_csv(file_path)
-catalog = catalog[catalog['max_att_flag'] < 100]
+catalog = get_catalog(file_name).query(('max_att_flag', None, 100), columns=['duration_s'])
 print(catalog[['duration_s']].describe())
 
 pass_threshold_min = 5
@@ -1,16 +1,12 @@
-import pathlib
-
 import matplotlib.pyplot as plt
-import pandas as pd
 import numpy as np
 
-from sampex_microburst_indices import config
+from sampex_microburst_indices.analysis.catalog import get_catalog
+from sampex_microburst_indices.analysis.catalog import good_microbursts
 
 file_name = 'microburst_catalog.csv'
-file_path = pathlib.Path(config.PROJECT_DIR, '..', 'data', file_name)
 
-catalog = pd.read_csv(file_path)
-catalog = catalog[catalog['adj_r2'] > 0.5]
+catalog = get_catalog(file_name).query(*good_microbursts, columns=['fwhm'])
 print(np.abs(catalog[['fwhm']]).describe())
 
 print(f'Total number of microbursts: {catalog.shape[0]}')
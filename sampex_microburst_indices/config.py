@@ -0,0 +1,82 @@
+"""
+The data paths of the package, read when they are first used rather than when
+the package is imported.
+
+SAMPEX_DIR: the SAMPEX data directory with the attitude and hilt sub-directories.
+AE_DIR: the auroral electrojet data directory.
+PROJECT_DIR: the package directory. The catalogs and caches are saved in
+    PROJECT_DIR/../data/. Defaults to the directory of this file.
+
+Each path is read from, in order:
+
+    1. The SAMPEX_DIR, SAMPEX_AE_DIR, or SAMPEX_PROJECT_DIR environment variable.
+    2. The [paths] section of the config.ini file written by
+       python3 -m sampex_microburst_indices init, or of the file in the
+       SAMPEX_CONFIG environment variable.
+
+The paths can also be set directly, e.g. config.SAMPEX_DIR = pathlib.Path(...),
+which overrides the environment and the config file for this process.
+"""
+import configparser
+import os
+import pathlib
+
+here = pathlib.Path(__file__).parent.resolve()
+
+_env_vars = {
+    'SAMPEX_DIR':'SAMPEX_DIR',
+    'AE_DIR':'SAMPEX_AE_DIR',
+    'PROJECT_DIR':'SAMPEX_PROJECT_DIR'
+    }
+_defaults = {'PROJECT_DIR':here}
+
+
+def config_path():
+    """
+    The path to the config file, config.ini in the package directory unless the
+    SAMPEX_CONFIG environment variable is set.
+    """
+    return pathlib.Path(os.environ.get('SAMPEX_CONFIG', here / 'config.ini'))
+
+def write_config(**paths):
+    """
+    Write the paths, e.g. SAMPEX_DIR='/data/sampex', to the config file and
+    forget the paths read so far.
+    """
+    parser = configparser.ConfigParser()
+    parser.optionxform = str
+    parser['paths'] = {name:str(path) for name, path in paths.items()}
+    with open(config_path(), 'w') as f:
+        parser.write(f)
+    for name in _env_vars:
+        globals().pop(name, None)
+    return
+
+def _read_config():
+    """
+    The dictionary of the paths in the config file, or an empty dictionary if
+    it does not exist.
+    """
+    parser = configparser.ConfigParser()
+    parser.optionxform = str
+    parser.read(config_path())
+    if not parser.has_section('paths'):
+        return {}
+    return dict(parser['paths'])
+
+def __getattr__(name):
+    # Only called if name is not already a module attribute, so a path is read
+    # once, and a path set by the user is never read.
+    if name not in _env_vars:
+        raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+    value = os.environ.get(_env_vars[name])
+    if value is None:
+        value = _read_config().get(name, _defaults.get(name))
+    if value is None:
+        raise AttributeError(
+            f'The sampex_microburst_indices {name} path is not configured. Run '
+            f'"python3 -m sampex_microburst_indices init" and answer the prompts, '
+            f'or set the {_env_vars[name]} environment variable.'
+            )
+    globals()[name] = pathlib.Path(value)
+    return globals()[name]
@@ -0,0 +1,98 @@
+"""
+An on-disk cache for parsed data files. The cached files are saved in the
+config.PROJECT_DIR/../data/cache/ directory in the uncompressed numpy npz format
+and are keyed by the source file path, modification time, and size. Thus, a
+cached file is automatically invalidated when its source file changes.
+"""
+import contextlib
+import hashlib
+import pathlib
+import tempfile
+
+import numpy as np
+import pandas as pd
+
+from sampex_microburst_indices import config
+from sampex_microburst_indices import profiling
+
+
+def cache_dir():
+    """
+    The base cache directory.
+    """
+    return pathlib.Path(config.PROJECT_DIR, '..', 'data', 'cache')
+
+def file_fingerprint(source_path):
+    """
+    A string that uniquely identifies the source_path path, modification time, and size.
+    """
+    source_path = pathlib.Path(source_path)
+    stat = source_path.stat()
+    return f'{source_path.resolve()}|{stat.st_mtime_ns}|{stat.st_size}'
+
+def cache_path(source_path, kind):
+    """
+    The cache file path for the source_path file in the cache_dir()/kind/ directory.
+    """
+    source_path = pathlib.Path(source_path)
+    digest = hashlib.sha1(file_fingerprint(source_path).encode()).hexdigest()[:16]
+    return pathlib.Path(cache_dir(), kind, f'{source_path.name}.{digest}.npz')
+
+@contextlib.contextmanager
+def atomic_write(path, mode='wb'):
+    """
+    Open a temporary file with a unique name next to path and rename it to path
+    when the with block exits. An interrupted write does not leave a corrupt file
+    behind, and the processes that write the same file at the same time don't
+    collide: the last rename wins.
+    """
+    path = pathlib.Path(path)
+    path.parent.mkdir(parents=True, exist_ok=True)
+    f = tempfile.NamedTemporaryFile(mode, dir=path.parent, prefix=f'{path.name}.',
+                                    suffix='.tmp', delete=False)
+    try:
+        with f:
+            yield f
+        pathlib.Path(f.name).replace(path)
+    except BaseException:
+        pathlib.Path(f.name).unlink(missing_ok=True)
+        raise
+    return
+
+def save_frame(path, df):
+    """
+    Save a DataFrame with a datetime index to the path npz file. The file is
+    written with atomic_write() and any stale cache files for the same source
+    file are then removed.
+    """
+    path = pathlib.Path(path)
+    source_name = path.name.rsplit('.', 2)[0]
+
+    arrays = {f'column_{i}':df[column].to_numpy() for i, column in enumerate(df.columns)}
+    arrays['index'] = df.index.to_numpy(dtype='datetime64[ns]')
+    arrays['columns'] = np.array(df.columns, dtype=str)
+
+    with profiling.span('cache.save', rows=df.shape[0]):
+        with atomic_write(path) as f:
+            np.savez(f, **arrays)
+
+    for stale_path in path.parent.glob(f'{source_name}.*.npz'):
+        # Another writer may have removed the same stale file.
+        if stale_path.name != path.name:
+            stale_path.unlink(missing_ok=True)
+    return
+
+def load_frame(path, columns=None):
+    """
+    Load a DataFrame saved by save_frame(). If columns is not None, only those
+    columns are read from the npz file.
+    """
+    with np.load(path) as npz, profiling.span('cache.load') as span:
+        saved_columns = list(npz['columns'])
+        if columns is None:
+            columns = saved_columns
+        data = {column:npz[f'column_{saved_columns.index(column)}'] for column in columns}
+        index = pd.DatetimeIndex(npz['index'])
+        span.add(bytes_read=index.nbytes + sum(values.nbytes for values in data.values()),
+                 rows=index.shape[0])
+    return pd.DataFrame(data=data, index=index)
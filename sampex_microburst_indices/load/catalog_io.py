@@ -0,0 +1,258 @@
+"""
+Read and write the pass and microburst catalogs in the config.PROJECT_DIR/../data/
+directory. The catalogs are stored in a typed, binary, columnar format: an
+uncompressed numpy npz file with one array per column (and the index, if it is
+not the default RangeIndex). The time stamps are stored as datetime64[ns] and the
+floats are stored exactly, so there is no text parsing or loss of precision, and
+loading a subset of the columns only reads those arrays from disk. The array
+valued DataFrame.attrs, e.g. the bin edges of a binned catalog, are saved too.
+
+The catalogs are still referred to by their csv file names, e.g.
+sampex_passes_v0.csv is stored in sampex_passes_v0.npz. If only the csv file
+exists, or it is newer than the npz file, the csv file is converted to the npz
+file when the catalog is first loaded. The conversion arguments of the catalogs
+with time stamps are in catalog_csv_kwargs, so the stored schema does not depend
+on which caller converts the csv file first, and the time columns are always
+stored as datetime64[ns]. The csv files can be exported for sharing with:
+python3 -m sampex_microburst_indices.load.catalog_io sampex_passes_v0.csv
+"""
+import argparse
+import pathlib
+import zipfile
+
+import numpy as np
+import pandas as pd
+
+from sampex_microburst_indices import config
+from sampex_microburst_indices import profiling
+from sampex_microburst_indices.load import cache
+
+# The pd.read_csv arguments of the catalogs with time stamps. They take precedence
+# over the csv_kwargs passed to binary_catalog().
+catalog_csv_kwargs = {
+    'sampex_passes_v0.csv':{'parse_dates':[0, 1]},
+    'microburst_catalog.csv':{'index_col':0, 'parse_dates':True}
+}
+# The time stamp columns, and index names, that are parsed to datetime64[ns] if
+# the csv_kwargs did not parse them.
+time_columns = ('start_time', 'end_time', 'dateTime')
+
+
+def catalog_path(file_name):
+    """
+    The path to the file_name catalog csv file.
+    """
+    return pathlib.Path(config.PROJECT_DIR, '..', 'data', file_name)
+
+def binary_path(file_name):
+    """
+    The path to the file_name catalog npz file.
+    """
+    return catalog_path(file_name).with_suffix('.npz')
+
+def binary_catalog(file_name, **csv_kwargs):
+    """
+    Return the path to the npz file of the file_name catalog. The csv file is
+    converted to the npz file if the npz file does not exist or is older than
+    the csv file. The csv_kwargs are passed to pd.read_csv for the conversion,
+    e.g. parse_dates=[0, 1] or index_col=0, unless file_name is in 
+    catalog_csv_kwargs. The time_columns are then parsed if they are not already.
+    """
+    npz_path = binary_path(file_name)
+    csv_path = catalog_path(file_name).with_suffix('.csv')
+    csv_is_newer = csv_path.exists() and (
+        (not npz_path.exists()) or (csv_path.stat().st_mtime_ns > npz_path.stat().st_mtime_ns)
+        )
+    if csv_is_newer:
+        with profiling.span('catalog.csv_convert', bytes_read=csv_path.stat().st_size) as span:
+            df = pd.read_csv(csv_path, **catalog_csv_kwargs.get(file_name, csv_kwargs))
+            span.add(rows=df.shape[0])
+            df = _parse_time_columns(df)
+            _save_binary(npz_path, df)
+    elif not npz_path.exists():
+        raise FileNotFoundError(f'Neither {npz_path.resolve()} or {csv_path.resolve()} exist.')
+    return npz_path
+
+def load_catalog(file_name, columns=None, **csv_kwargs):
+    """
+    Load the file_name catalog. If columns is not None, only those columns (and
+    the index) are read. The csv_kwargs are only used if the catalog needs to be
+    converted from the csv file (see binary_catalog()).
+    """
+    path = binary_catalog(file_name, **csv_kwargs)
+    with np.load(path) as npz, profiling.span('catalog.read') as span:
+        saved_columns = list(npz['columns'])
+        if columns is None:
+            columns = saved_columns
+        missing = [column for column in columns if column not in saved_columns]
+        if missing:
+            raise KeyError(f'The {missing} columns are not in the {file_name} catalog. '
+                           f'The catalog columns are {saved_columns}.')
+        data = {column:npz[f'column_{saved_columns.index(column)}'] for column in columns}
+        if 'index' in npz.files:
+            index = pd.Index(npz['index'], name=str(npz['index_name']) or None)
+        else:
+            index = pd.RangeIndex(_n_rows(npz))
+        attrs = {name[len('attr_'):]:npz[name] for name in npz.files if name.startswith('attr_')}
+        span.add(bytes_read=index.nbytes + sum(values.nbytes for values in data.values()),
+                 rows=index.shape[0])
+    df = pd.DataFrame(data=data, index=index, columns=columns)
+    df.attrs.update(attrs)
+    return df
+
+def iter_catalog(file_name, columns=None, chunk_rows=1_000_000, row_range=None, **csv_kwargs):
+    """
+    Iterate over the file_name catalog in chunks of chunk_rows rows. Each chunk 
+    is a dictionary of the column arrays. The columns are memory-mapped from the 
+    npz file, so only one chunk of each column is read into memory at a time.
+    If row_range is not None, only the rows in the [start, end) row_range are read.
+    """
+    path = binary_catalog(file_name, **csv_kwargs)
+    saved_columns = catalog_columns(file_name)
+    if columns is None:
+        columns = saved_columns
+    arrays = {column:_memmap_member(path, f'column_{saved_columns.index(column)}') 
+              for column in columns}
+    if row_range is None:
+        row_range = (0, catalog_rows(file_name))
+    for start in range(row_range[0], row_range[1], chunk_rows):
+        end = min(start+chunk_rows, row_range[1])
+        yield {column:np.array(values[start:end]) for column, values in arrays.items()}
+
+def catalog_rows(file_name, **csv_kwargs):
+    """
+    The number of rows in the file_name catalog.
+    """
+    with np.load(binary_catalog(file_name, **csv_kwargs)) as npz:
+        return _n_rows(npz)
+
+def catalog_columns(file_name, **csv_kwargs):
+    """
+    The column names of the file_name catalog, without loading any columns.
+    """
+    with np.load(binary_catalog(file_name, **csv_kwargs)) as npz:
+        return list(npz['columns'])
+
+def save_catalog(df, file_name, export_csv=False):
+    """
+    Save the df catalog to the file_name npz file and, if export_csv=True, the
+    file_name csv file. The index is saved unless it is the default RangeIndex.
+    """
+    with profiling.span('catalog.write', rows=df.shape[0]):
+        if export_csv:
+            # The csv file is written first so it is not newer than the npz file.
+            catalog_path(file_name).parent.mkdir(parents=True, exist_ok=True)
+            df.to_csv(catalog_path(file_name).with_suffix('.csv'),
+                      index=not _default_index(df))
+        _save_binary(binary_path(file_name), df)
+    return
+
+def export_csv(file_name):
+    """
+    Export the file_name npz catalog to its csv file.
+    """
+    df = load_catalog(file_name)
+    save_catalog(df, file_name, export_csv=True)
+    return
+
+def _parse_time_columns(df):
+    """
+    Parse the time_columns, and the index if it is a time column, that are not
+    datetime64 already.
+    """
+    for column in time_columns:
+        if (column in df.columns) and (not pd.api.types.is_datetime64_any_dtype(df[column])):
+            df[column] = pd.to_datetime(df[column])
+    if (df.index.name in time_columns) and (not isinstance(df.index, pd.DatetimeIndex)):
+        df.index = pd.DatetimeIndex(pd.to_datetime(df.index), name=df.index.name)
+    return df
+
+def _n_rows(npz):
+    """
+    The number of rows in the npz catalog. The npz files saved before the n_rows
+    array was added have the length of their index or first column.
+    """
+    if 'n_rows' in npz.files:
+        return int(npz['n_rows'])
+    for name in ['index', 'column_0']:
+        if name in npz.files:
+            return npz[name].shape[0]
+    return 0
+
+def _default_index(df):
+    return isinstance(df.index, pd.RangeIndex) and (df.index.start == 0) and (
+        df.index.step == 1) and (df.index.name is None)
+
+def _save_binary(path, df):
+    """
+    Save the df columns, and the index if it is not the default, to the path npz
+    file. The file is written with cache.atomic_write() so an interrupted write
+    does not corrupt the catalog and concurrent writers don't collide.
+    """
+    arrays = {f'column_{i}':_column_array(df[column]) for i, column in enumerate(df.columns)}
+    arrays['columns'] = np.array(df.columns, dtype=str)
+    arrays['n_rows'] = np.array(df.shape[0])
+    for name, value in df.attrs.items():
+        arrays[f'attr_{name}'] = np.asarray(value)
+    if not _default_index(df):
+        arrays['index'] = _column_array(df.index)
+        arrays['index_name'] = np.array('' if df.index.name is None else str(df.index.name))
+
+    with cache.atomic_write(path) as f:
+        np.savez(f, **arrays)
+    return
+
+def _memmap_member(path, name):
+    """
+    Memory-map the name array in the path npz file. The npz files are written
+    by np.savez without compression, so each array is stored contiguously in
+    the zip file after its zip and npy headers. The unicode arrays are loaded
+    instead, since they can't be memory-mapped.
+    """
+    with zipfile.ZipFile(path) as zip_file:
+        info = zip_file.getinfo(f'{name}.npy')
+        compressed = info.compress_type != zipfile.ZIP_STORED
+    if compressed:
+        with np.load(path) as npz:
+            return npz[name]
+
+    with open(path, 'rb') as f:
+        # The local file header is 30 bytes, followed by the file name and extra field.
+        f.seek(info.header_offset)
+        local_header = f.read(30)
+        name_length = int.from_bytes(local_header[26:28], 'little')
+        extra_length = int.from_bytes(local_header[28:30], 'little')
+        f.seek(info.header_offset + 30 + name_length + extra_length)
+        version = np.lib.format.read_magic(f)
+        if version == (1, 0):
+            shape, fortran_order, dtype = np.lib.format.read_array_header_1_0(f)
+        else:
+            shape, fortran_order, dtype = np.lib.format.read_array_header_2_0(f)
+        offset = f.tell()
+    if dtype.hasobject or fortran_order or (dtype.kind == 'U'):
+        with np.load(path) as npz:
+            return npz[name]
+    if np.prod(shape) == 0:
+        return np.zeros(shape, dtype=dtype)
+    return np.memmap(path, dtype=dtype, mode='r', offset=offset, shape=shape)
+
+def _column_array(values):
+    """
+    The typed numpy array of a column. Object columns, e.g. strings, are saved
+    as fixed width unicode arrays so the npz file can be read without pickle.
+    """
+    if pd.api.types.is_datetime64_any_dtype(values):
+        return np.asarray(values, dtype='datetime64[ns]')
+    values = np.asarray(values)
+    if values.dtype == object:
+        values = values.astype(str)
+    return values
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Export the catalogs to csv files.')
+    parser.add_argument('file_names', nargs='+',
+                        help='The catalog file names, e.g. sampex_passes_v0.csv.')
+    args = parser.parse_args()
+    for file_name in args.file_names:
+        export_csv(file_name)
@@ -0,0 +1,168 @@
+"""
+A persistent catalog of the SAMPEX data files so the loaders don't need to
+recursively search config.SAMPEX_DIR every time they load a day.
+
+Each instrument's catalog is saved to cache_dir()/file_catalog/{instrument}.json
+and contains every directory's modification time and file names. When the catalog
+is refreshed, only the directories whose modification time changed are listed
+again, so a refresh costs one stat per directory. The in-process catalogs are
+reused by file_catalog() and are refreshed once if a lookup does not find a file.
+"""
+import json
+import os
+import pathlib
+import re
+
+from sampex_microburst_indices import config
+from sampex_microburst_indices import profiling
+from sampex_microburst_indices.load import cache
+
+# The filename patterns with the YEARDOY date groups for each instrument directory.
+instrument_patterns = {
+    'hilt':r'^hhrr(\d{7})',
+    'pet':r'^phrr(\d{7})',
+    'lica':r'^lhrr(\d{7})',
+    'attitude':r'^PSSet_6sec_(\d+)_(\d+)\.txt$'
+}
+
+_catalogs = {}
+
+
+def file_catalog(instrument):
+    """
+    Get the File_Catalog for instrument. It is loaded and refreshed once per process.
+    """
+    key = (instrument, str(config.SAMPEX_DIR))
+    if key not in _catalogs:
+        _catalogs[key] = File_Catalog(instrument)
+    return _catalogs[key]
+
+
+class File_Catalog:
+    def __init__(self, instrument, refresh=True) -> None:
+        """
+        The catalog of the files in the config.SAMPEX_DIR/instrument/ directory
+        that match the instrument_patterns[instrument] pattern. If refresh=True,
+        the saved catalog is incrementally refreshed.
+        """
+        if instrument not in instrument_patterns:
+            raise ValueError(f'{instrument=} is not one of {list(instrument_patterns.keys())}.')
+        self.instrument = instrument
+        self.pattern = re.compile(instrument_patterns[instrument])
+        self.root_dir = pathlib.Path(config.SAMPEX_DIR, instrument)
+        self.catalog_path = pathlib.Path(cache.cache_dir(), 'file_catalog', f'{instrument}.json')
+        self.directories = {}
+        self._load()
+        if refresh:
+            self.refresh()
+        return
+
+    def find(self, yeardoy):
+        """
+        Return the list of file paths for the yeardoy date. This is a dictionary
+        lookup. If no files are found the catalog is refreshed once and searched again.
+        """
+        yeardoy = int(yeardoy)
+        if (yeardoy not in self.days) and (not self._refreshed_after_miss):
+            self.refresh()
+            self._refreshed_after_miss = True
+        return [self.root_dir / relative_path for relative_path in self.days.get(yeardoy, [])]
+
+    def paths(self, subdirectory=None):
+        """
+        Return the sorted list of all file paths, optionally only the files in
+        subdirectory, relative to the instrument directory.
+        """
+        relative_paths = [record['path'] for record in self.records]
+        if subdirectory is not None:
+            relative_paths = [path for path in relative_paths
+                              if pathlib.PurePath(path).parts[0] == subdirectory]
+        return [self.root_dir / relative_path for relative_path in sorted(relative_paths)]
+
+    def refresh(self):
+        """
+        Walk the instrument directory and re-list the directories whose modification
+        time changed. The catalog is saved if it changed.
+        """
+        with profiling.span('file_catalog.refresh') as span:
+            self._refresh()
+            span.add(rows=len(self.records))
+        return
+
+    def _refresh(self):
+        """
+        The directory walk of refresh().
+        """
+        old_directories = self.directories
+        self.directories = {}
+        changed = False
+        stack = [''] if self.root_dir.is_dir() else []
+
+        while stack:
+            relative_dir = stack.pop()
+            directory = pathlib.Path(self.root_dir, relative_dir)
+            mtime_ns = os.stat(directory).st_mtime_ns
+
+            if (relative_dir in old_directories) and (
+                    old_directories[relative_dir]['mtime_ns'] == mtime_ns):
+                entry = old_directories[relative_dir]
+            else:
+                changed = True
+                entry = {'mtime_ns':mtime_ns, 'files':[], 'subdirectories':[]}
+                with os.scandir(directory) as it:
+                    for dir_entry in it:
+                        if dir_entry.is_dir():
+                            entry['subdirectories'].append(
+                                os.path.join(relative_dir, dir_entry.name) if relative_dir else dir_entry.name
+                                )
+                        elif self.pattern.search(dir_entry.name):
+                            entry['files'].append(dir_entry.name)
+            self.directories[relative_dir] = entry
+            stack.extend(entry['subdirectories'])
+
+        if changed or (set(old_directories) != set(self.directories)):
+            self._save()
+        self._index()
+        return
+
+    def _index(self):
+        """
+        Build the file records and the YEARDOY lookup dictionary.
+        """
+        self.records = []
+        self.days = {}
+        self._refreshed_after_miss = False
+
+        for relative_dir, entry in self.directories.items():
+            for file_name in entry['files']:
+                relative_path = os.path.join(relative_dir, file_name) if relative_dir else file_name
+                dates = [int(date) for date in self.pattern.search(file_name).groups()]
+                self.records.append({
+                    'path':relative_path, 'dates':dates,
+                    'compressed':file_name.endswith('.zip')
+                    })
+                if len(dates) == 1:
+                    self.days.setdefault(dates[0], []).append(relative_path)
+        return
+
+    def _load(self):
+        """
+        Load the saved catalog, if it exists.
+        """
+        if self.catalog_path.exists():
+            with open(self.catalog_path) as f:
+                catalog = json.load(f)
+            if catalog['root_dir'] == str(self.root_dir):
+                self.directories = catalog['directories']
+        self._index()
+        return
+
+    def _save(self):
+        """
+        Save the catalog. It is written with cache.atomic_write() so an
+        interrupted write does not corrupt the catalog, and the processes that
+        refresh the catalog at the same time don't collide.
+        """
+        with cache.atomic_write(self.catalog_path, mode='w') as f:
+            json.dump({'root_dir':str(self.root_dir), 'directories':self.directories}, f)
+        return
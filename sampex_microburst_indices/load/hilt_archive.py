@@ -0,0 +1,183 @@
+"""
+A memory-mapped archive of the State4 HILT counts resolved to 20 ms. The archive
+is built once from the HILT text files and then any time range is queried with
+binary searches over the memory-mapped time stamps, without parsing any text.
+
+The archive directory contains
+    counts.dat: The int32 counts.
+    times.dat: The datetime64[ns] time stamps, in increasing order.
+    index.npz: The per-day offset index with the YEARDOY, start and end
+               (exclusive) sample indices, and start and end times of each day.
+
+To build the archive run: python3 -m sampex_microburst_indices.load.hilt_archive
+"""
+import os
+import pathlib
+import re
+import tempfile
+
+import numpy as np
+import progressbar
+
+from sampex_microburst_indices import config
+from sampex_microburst_indices.load.file_catalog import file_catalog
+from sampex_microburst_indices.load.sampex import Load_HILT
+from sampex_microburst_indices.load.sampex import yeardoy2date
+
+
+class HILT_Archive:
+    def __init__(self, archive_dir=None) -> None:
+        """
+        The memory-mapped 20 ms HILT archive. If archive_dir is None, the
+        archive is in the config.PROJECT_DIR/../data/hilt_archive/ directory.
+        """
+        if archive_dir is None:
+            self.archive_dir = pathlib.Path(config.PROJECT_DIR, '..', 'data', 'hilt_archive')
+        else:
+            self.archive_dir = pathlib.Path(archive_dir)
+        self.counts_path = pathlib.Path(self.archive_dir, 'counts.dat')
+        self.times_path = pathlib.Path(self.archive_dir, 'times.dat')
+        self.index_path = pathlib.Path(self.archive_dir, 'index.npz')
+        return
+
+    def build(self, dates=None):
+        """
+        Resolve the State4 HILT counts for every day in dates, or every HILT file
+        in the config.SAMPEX_DIR/hilt/State4/ directory if dates is None, and
+        write them to the archive. The days with out of order time stamps, or
+        that overlap the previous day, are skipped.
+
+        The counts, times, and index are written to temporary files and renamed
+        into place together at the end, so an interrupted or failed build leaves
+        the previous archive as it was.
+        """
+        if dates is None:
+            dates = self._get_hilt_file_dates()
+        dates = sorted(dates)
+        self.archive_dir.mkdir(parents=True, exist_ok=True)
+
+        tmp_paths = {path:self._tmp_path(path)
+                     for path in [self.counts_path, self.times_path, self.index_path]}
+        try:
+            self._build(dates, tmp_paths[self.counts_path], tmp_paths[self.times_path],
+                        tmp_paths[self.index_path])
+        except BaseException:
+            for tmp_path in tmp_paths.values():
+                tmp_path.unlink(missing_ok=True)
+            raise
+        # The data files are renamed first. If the renames are interrupted, open()
+        # finds that the data files don't match the index.
+        for path, tmp_path in tmp_paths.items():
+            tmp_path.replace(path)
+        return
+
+    def _build(self, dates, counts_path, times_path, index_path):
+        """
+        Write the counts, times, and index of the dates to the paths.
+        """
+        index = {key:[] for key in ['yeardoy', 'start_index', 'end_index', 'start_time', 'end_time']}
+        n = 0
+        last_time = np.datetime64('NaT', 'ns')
+
+        with open(counts_path, 'wb') as counts_file, open(times_path, 'wb') as times_file:
+            for date in progressbar.progressbar(dates, redirect_stdout=True):
+                try:
+                    hilt = Load_HILT(date)
+                except RuntimeError as err:
+                    if 'The SAMPEX HILT data is not in order' in str(err):
+                        continue
+                    else:
+                        raise
+                counts, times = hilt.resolve_counts_state4(as_dataframe=False)
+                if counts.shape[0] == 0:
+                    continue
+                if times[0] <= last_time:
+                    print(f'Skipping {hilt.load_date_str} since its HILT times overlap the '
+                          f'previous day.')
+                    continue
+                counts_file.write(counts.astype(np.int32).tobytes())
+                times_file.write(times.astype('datetime64[ns]').tobytes())
+
+                index['yeardoy'].append(int(hilt.load_date_str))
+                index['start_index'].append(n)
+                index['end_index'].append(n + counts.shape[0])
+                index['start_time'].append(times[0])
+                index['end_time'].append(times[-1])
+                n += counts.shape[0]
+                last_time = times[-1]
+
+        with open(index_path, 'wb') as f:
+            np.savez(f,
+                yeardoy=np.array(index['yeardoy'], dtype=np.int64),
+                start_index=np.array(index['start_index'], dtype=np.int64),
+                end_index=np.array(index['end_index'], dtype=np.int64),
+                start_time=np.array(index['start_time'], dtype='datetime64[ns]'),
+                end_time=np.array(index['end_time'], dtype='datetime64[ns]')
+                )
+        return
+
+    def open(self):
+        """
+        Memory-map the archive. This is called by query() if needed.
+        """
+        with np.load(self.index_path) as index:
+            self.index = {key:index[key] for key in index.files}
+        n = int(self.index['end_index'][-1]) if self.index['end_index'].shape[0] else 0
+        for path, itemsize in [(self.counts_path, 4), (self.times_path, 8)]:
+            if (not path.exists()) or (path.stat().st_size != n*itemsize):
+                raise ValueError(f'The {path.name} file does not match the HILT archive index '
+                                 f'in {self.archive_dir}. Rebuild the archive.')
+        if n == 0:
+            self.counts = np.zeros(0, dtype=np.int32)
+            self.times = np.zeros(0, dtype='datetime64[ns]')
+        else:
+            self.counts = np.memmap(self.counts_path, dtype=np.int32, mode='r', shape=(n,))
+            self.times = np.memmap(self.times_path, dtype='datetime64[ns]', mode='r', shape=(n,))
+        return
+
+    def query(self, start, end):
+        """
+        Return the counts and times in the [start, end] time range. These are
+        read-only views of the memory-mapped archive, so no data is copied.
+        """
+        if not hasattr(self, 'index'):
+            self.open()
+        start = np.datetime64(start, 'ns')
+        end = np.datetime64(end, 'ns')
+
+        # Find the first and last days that overlap the time range with the
+        # per-day index, and then search for the start and end indices in those days.
+        start_day = np.searchsorted(self.index['end_time'], start, side='left')
+        end_day = np.searchsorted(self.index['start_time'], end, side='right') - 1
+        if (start_day >= self.index['yeardoy'].shape[0]) or (end_day < start_day):
+            return self.counts[:0], self.times[:0]
+
+        first = self.index['start_index'][start_day]
+        last = self.index['end_index'][end_day]
+        start_index = first + np.searchsorted(self.times[first:last], start, side='left')
+        end_index = first + np.searchsorted(self.times[first:last], end, side='right')
+        return self.counts[start_index:end_index], self.times[start_index:end_index]
+
+    def _tmp_path(self, path):
+        """
+        A new, uniquely named, temporary file for path in the archive directory.
+        """
+        fd, tmp_path = tempfile.mkstemp(dir=self.archive_dir, prefix=f'{path.name}.', suffix='.tmp')
+        os.close(fd)
+        return pathlib.Path(tmp_path)
+
+    def _get_hilt_file_dates(self):
+        """
+        Use the file catalog to find and parse the dates of all HILT files matching 
+        'hhrr*.txt*' in the config.SAMPEX_DIR/hilt/State4/ directory.
+        """
+        hilt_file_paths = [
+            path for path in file_catalog('hilt').paths('State4') if '.txt' in path.name
+            ]
+        date_strings = {re.search(r'\d+', t.name).group() for t in hilt_file_paths}
+        return [yeardoy2date(t) for t in sorted(date_strings)]
+
+
+if __name__ == '__main__':
+    archive = HILT_Archive()
+    archive.build()
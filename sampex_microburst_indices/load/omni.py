@@ -5,20 +5,48 @@ website
 import pathlib
 import time
 
+import numpy as np
 import pandas as pd
 
 from sampex_microburst_indices import config
+from sampex_microburst_indices import profiling
+from sampex_microburst_indices.load import cache
 
 omni_columns = {
     0:'Year', 1:'Day', 2:'Hour', 3:'Minute',
     37:'AE', 38:'AL', 39:'AU', 40:'SYM/D', 41:'SYM/H',
     42:'ASY/D', 43:'ASY/H'
     }
+_time_columns = ['Year', 'Day', 'Hour', 'Minute']
 
 class Omni:
-    def __init__(self, year=None, time_range=None) -> None:
+    def __init__(self, year=None, time_range=None, columns=None, use_cache=True) -> None:
+        """
+        Load the OMNI data for a year or a time range. If use_cache=True, the 
+        parsed yearly files are cached in the binary npz format (see load/cache.py)
+        so the text files are parsed once.
+
+        Parameters
+        ----------
+        year: int
+            The year to load.
+        time_range: list
+            The start and end times to load. The end time is inclusive. Only the 
+            yearly files that overlap the time_range are opened.
+        columns: list
+            The OMNI columns to load. If None, all of the index columns in 
+            omni_columns are loaded.
+        use_cache: bool
+            Load the data from, and save it to, the npz cache.
+        """
         self.year=year
         self.time_range = time_range
+        if columns is None:
+            self.columns = [column for column in omni_columns.values() 
+                            if column not in _time_columns]
+        else:
+            self.columns = columns
+        self.use_cache = use_cache
         return
 
     def load(self, verbose=False):
@@ -28,43 +56,138 @@ class Omni:
         if self.year is not None:
             self.data = self._load_year(verbose=verbose)
         elif self.time_range is not None:
-            self.data = pd.DataFrame(columns=omni_columns)
-            raise NotImplementedError
+            self.data = self._load_time_range(verbose=verbose)
         else:
             raise ValueError('Neither year or time_range is passed.')
         return self.data
 
-    def _load_year(self, verbose=False):
+    def _load_time_range(self, verbose=False):
+        """
+        Load the OMNI data in self.time_range, stitched across the yearly files. 
+        The years are loaded one at a time and only the time_range slice of each 
+        year is kept until it is copied into the preallocated output arrays. The 
+        years without an OMNI file (e.g. the year before the first mission year 
+        that a lag window reaches into) are skipped, so their times are missing 
+        from the output.
+        """
+        start_time, end_time = [np.datetime64(pd.Timestamp(t), 'ns') for t in self.time_range]
+        if end_time < start_time:
+            raise ValueError(f'The time_range start, {self.time_range[0]}, is after the '
+                             f'end, {self.time_range[1]}.')
+        years = range(pd.Timestamp(start_time).year, pd.Timestamp(end_time).year+1)
+
+        # Load each year and keep only its slice of the time_range.
+        year_slices = []
+        for year in years:
+            if len(find_omni_files(year)) == 0:
+                continue
+            year_data = self._load_year(verbose=verbose, year=year, columns=self.columns)
+            year_times = year_data.index.to_numpy()
+            start_index = np.searchsorted(year_times, start_time, side='left')
+            end_index = np.searchsorted(year_times, end_time, side='right')
+            year_slice = (
+                year_times[start_index:end_index], 
+                [year_data[column].to_numpy()[start_index:end_index] for column in self.columns]
+                )
+            if end_index - start_index < year_times.shape[0]:
+                # Copy partial years so the rest of the year is not held in memory.
+                year_slice = (year_slice[0].copy(), [values.copy() for values in year_slice[1]])
+            year_slices.append(year_slice)
+            del(year_data)
+        if len(year_slices) == 0:
+            data_dir = pathlib.Path(config.PROJECT_DIR, '..', 'data')
+            raise FileNotFoundError(f'No OMNI files found in {data_dir.resolve()} for the '
+                                    f'{self.time_range[0]} to {self.time_range[1]} time range.')
+
+        # Copy the slices into the contiguous output arrays.
+        n = sum(times.shape[0] for times, _ in year_slices)
+        times = np.empty(n, dtype='datetime64[ns]')
+        data = {column:np.empty(n, dtype=np.result_type(*[values[i] for _, values in year_slices]))
+                for i, column in enumerate(self.columns)}
+        offset = 0
+        for year_times, year_values in year_slices:
+            times[offset:offset+year_times.shape[0]] = year_times
+            for column, values in zip(self.columns, year_values):
+                data[column][offset:offset+year_times.shape[0]] = values
+            offset += year_times.shape[0]
+        return pd.DataFrame(data=data, index=pd.DatetimeIndex(times), copy=False)
+
+    def _load_year(self, verbose=False, year=None, columns=None):
         """
-        Load a year of OMNI data
+        Load a year of OMNI data. If year is None, self.year is loaded. If columns
+        is None, all of the omni_columns are loaded.
         """
+        if year is None:
+            year = self.year
         # Find the appropriate file.
         start_time = time.time()
         data_dir = pathlib.Path(config.PROJECT_DIR, '..', 'data')
-        omni_file_paths = sorted(data_dir.rglob(f'omni*{self.year}*'))
+        omni_file_paths = find_omni_files(year)
         assert len(omni_file_paths) == 1, (
-            f'{len(omni_file_paths)} OMNI files found in {data_dir.resolve()} matching "omni*{self.year}*".'
+            f'{len(omni_file_paths)} OMNI files found in {data_dir.resolve()} matching "omni*{year}*".'
             )
-        # Load the OMNI csv file and parse the time stamps.
-        omni_data = pd.read_csv(omni_file_paths[0], delim_whitespace=True, 
-                                names=omni_columns.values(), usecols=omni_columns.keys())
+        if self.use_cache:
+            cache_path = cache.cache_path(omni_file_paths[0], 'omni')
+            if cache_path.exists():
+                omni_data = cache.load_frame(cache_path, columns=columns)
+                if verbose:
+                    print(f'OMNI cache load time: {round(time.time()-start_time, 3)}')
+                return omni_data
+
+        # Load the OMNI csv file and parse the time stamps. The cache always 
+        # contains all of the columns.
+        if (columns is None) or self.use_cache:
+            usecols = omni_columns
+        else:
+            usecols = {key:column for key, column in omni_columns.items() 
+                       if (column in columns) or (column in _time_columns)}
+        with profiling.span('omni.parse', bytes_read=omni_file_paths[0].stat().st_size) as span:
+            omni_data = pd.read_csv(omni_file_paths[0], delim_whitespace=True, 
+                                    names=usecols.values(), usecols=usecols.keys())
+            span.add(rows=omni_data.shape[0])
         time2 = time.time()
-        omni_data = self._parse_time(omni_data) 
+        with profiling.span('omni.time_conversion', rows=omni_data.shape[0]):
+            omni_data = self._parse_time(omni_data) 
         if verbose:                            
             print(f'OMNI load time: {round(time2-start_time)} | parse time: {round(time.time()-time2)}')   
+        if self.use_cache:
+            cache.save_frame(cache_path, omni_data)
+        if columns is not None:
+            omni_data = omni_data[columns]
         return omni_data
 
     def _parse_time(self, omni_data):
         """
         Parses the year, day, hour, and minute columns into a dateTime object.
         """
-        # Merge the columns into strings so that pd.to_datetime can parse it.
-        year_doy = [f'{year}-{doy} {hour}:{minute}' for year, doy, hour, minute in 
-                    omni_data[['Year', 'Day', 'Hour', 'Minute']].values]
-        omni_data.index = pd.to_datetime(year_doy, format='%Y-%j %H:%M')
+        # Build the time stamps with datetime64 arithmetic: the start of the year 
+        # plus the day, hour, and minute offsets.
+        years = (omni_data['Year'].to_numpy() - 1970).astype('datetime64[Y]')
+        minutes = (
+            (omni_data['Day'].to_numpy() - 1)*24*60 + 
+            omni_data['Hour'].to_numpy()*60 + 
+            omni_data['Minute'].to_numpy()
+            ).astype('timedelta64[m]')
+        omni_data.index = pd.DatetimeIndex(
+            (years.astype('datetime64[m]') + minutes).astype('datetime64[ns]')
+            )
 
-        omni_data.drop(columns=['Year', 'Day', 'Hour', 'Minute'], inplace=True)
+        omni_data.drop(columns=_time_columns, inplace=True)
         return omni_data
 
+def find_omni_files(year=None):
+    """
+    Find the yearly OMNI files matching "omni*{year}*" in the config.PROJECT_DIR/../data/
+    directory (excluding the cache). If year is None, all yearly files are returned.
+    """
+    if year is None:
+        year = '[0-9][0-9][0-9][0-9]'
+    data_dir = pathlib.Path(config.PROJECT_DIR, '..', 'data')
+    with profiling.span('omni.file_lookup'):
+        return sorted(
+            path for path in data_dir.rglob(f'omni*{year}*') 
+            if cache.cache_dir().resolve() not in path.resolve().parents
+            )
+
 if __name__ == '__main__':
     omni = Omni(year=2000).load()
\ No newline at end of file
@@ -1,14 +1,25 @@
 # This program loads the HILT data and parses it into a nice format
 import argparse
+import bisect
+import contextlib
+import itertools
 import pathlib
 import zipfile
-import re
 from datetime import datetime, date
 
 import pandas as pd
 import numpy as np
 
 from sampex_microburst_indices import config
+from sampex_microburst_indices import profiling
+from sampex_microburst_indices.load import cache
+from sampex_microburst_indices.load.file_catalog import file_catalog
+
+# The compact dtypes of the HILT columns.
+hilt_dtypes = {
+    'Time':np.float64, 'Rate1':np.int32, 'Rate2':np.int32, 'Rate3':np.int32, 
+    'Rate4':np.int32, 'Rate5':np.int32, 'Rate6':np.int32
+    }
 
 
 class Load_HILT:
@@ -26,22 +37,11 @@ class Load_HILT:
         self.load_date_str = date2yeardoy(self.load_date)
         self.verbose = verbose
 
-        # Get the filename and search for it. If multiple or no
-        # unique files are found this will raise an assertion error.
-        file_name_glob = f'hhrr{self.load_date_str}*'
-        matched_files = list(
-            pathlib.Path(config.SAMPEX_DIR, 'hilt').rglob(file_name_glob)
-            )
-        # 1 if there is just one file, and 2 if there is a file.txt and 
-        # file.txt.zip files.
-        assert len(matched_files) in [1, 2], (f'{len(matched_files)} matched HILT files found.'
-                                        f'\nSearch string: {file_name_glob}'
-                                        f'\nSearch directory: {pathlib.Path(config.SAMPEX_DIR, "hilt")}'
-                                        f'\nmatched files: {matched_files}')
-        self.file_path = matched_files[0]
+        # Get the filename and search for it.
+        self.file_path = find_hilt_file(self.load_date_str)
 
         # Load the zipped data and extract if a zip file was found.
-        if self.file_path.suffix == 'zip':
+        if self.file_path.suffix == '.zip':
             self.read_zip(self.file_path, extract=extract)
         else:
             self.read_csv(self.file_path)
@@ -75,7 +75,9 @@ class Load_HILT:
         """
         if self.verbose:
             print(f'Loading SAMPEX HILT data from {self.load_date.date()} from {path.name}')
-        self.hilt = pd.read_csv(path, sep=' ')
+        with profiling.span('hilt.parse', bytes_read=self.file_path.stat().st_size) as span:
+            self.hilt = pd.read_csv(path, sep=' ')
+            span.add(rows=self.hilt.shape[0])
         return
 
     def parse_time(self, time_index=True):
@@ -88,37 +90,107 @@ class Load_HILT:
         if np.any(np_time[1:] < np_time[:-1]):
             raise RuntimeError(f'The SAMPEX HILT data is not in order for {self.load_date_str}.')
         # Convert seconds of day to a datetime object.
-        day_seconds_obj = pd.to_timedelta(self.hilt['Time'], unit='s')
-        self.hilt['Time'] = pd.Timestamp(self.load_date.date()) + day_seconds_obj
-        if time_index:
-            self.hilt.index = self.hilt['Time']
-            del(self.hilt['Time'])
+        with profiling.span('hilt.time_conversion', rows=np_time.shape[0]):
+            self.hilt['Time'] = date_seconds2datetime64(self.load_date, np_time)
+            if time_index:
+                self.hilt.index = self.hilt['Time']
+                del(self.hilt['Time'])
         return
 
-    def resolve_counts_state4(self):
+    def resolve_counts_state4(self, as_dataframe=True):
         """ 
         This function resolves the HILT counts to 20 ms resolution assuming 
         the data is in state4. The counts represent the sum from the 4 SSDs.
-        Data saved in self.hilt_resolved
+        The integer counts and datetime64[ns] times are saved in self.counts 
+        and self.times. If as_dataframe=True, the data is also saved in the 
+        self.hilt_resolved DataFrame.
         """ 
-        resolution_ms = 20E-3
-        # Resolve the counts using numpy (most efficient way with 
-        # static memory allocation)
-        self.counts = np.nan*np.zeros(5*self.hilt.shape[0], dtype=int)
-        for i in [0, 1, 2, 3]:
-            self.counts[i::5] = self.hilt[f'Rate{i+1}']
-        # This line is different because rate5 is 100 ms SSD4 data.
-        self.counts[4::5] = self.hilt['Rate6'] 
-
-        # Resolve the time array.
-        self.times = np.nan*np.zeros(5*self.hilt.shape[0], dtype=object)
-        for i in [0, 1, 2, 3, 4]:
-            self.times[i::5] = self.hilt.index + pd.to_timedelta(resolution_ms*i, unit='s')
-
-        self.hilt_resolved = pd.DataFrame(data={'counts':self.counts}, index=self.times)
+        resolution_ns = 20_000_000
+        with profiling.span('hilt.resolve_state4', rows=5*self.hilt.shape[0]):
+            # Each row has four 20 ms samples in Rate1-Rate4, and the fifth 
+            # sample in Rate6 (Rate5 is the 100 ms SSD4 data). Thus the row-major
+            # flattened rates are in time order.
+            self.counts = self.hilt[['Rate1', 'Rate2', 'Rate3', 'Rate4', 'Rate6']].to_numpy().ravel()
+
+            # Resolve the time array.
+            offsets = (resolution_ns*np.arange(5)).astype('timedelta64[ns]')
+            row_times = self.hilt.index.to_numpy(dtype='datetime64[ns]')
+            self.times = (row_times[:, np.newaxis] + offsets).ravel()
+
+            if as_dataframe:
+                self.hilt_resolved = pd.DataFrame(data={'counts':self.counts}, index=self.times)
         return self.counts, self.times
 
 
+class Stream_HILT:
+    def __init__(self, load_date, chunk_rows=100_000, columns=None, verbose=False):
+        """
+        Stream the HILT data given a date in chunks of chunk_rows rows, so the 
+        whole day is never in memory. The zipped files are decompressed as they 
+        are read. The columns are parsed with the compact dtypes in hilt_dtypes.
+        If columns is not None, only the Time and those columns are read.
+        """
+        self.load_date = load_date
+        self.load_date_str = date2yeardoy(self.load_date)
+        self.chunk_rows = chunk_rows
+        self.verbose = verbose
+        if columns is None:
+            self.columns = list(hilt_dtypes.keys())
+        else:
+            self.columns = ['Time'] + [column for column in columns if column != 'Time']
+        self.file_path = find_hilt_file(self.load_date_str)
+        return
+
+    def chunks(self):
+        """
+        Yield dictionaries of the column arrays for every chunk. The Time array 
+        is converted to datetime64[ns].
+        """
+        if self.verbose:
+            print(f'Streaming SAMPEX HILT data from {self.load_date.date()} from {self.file_path.name}')
+        last_seconds = -np.inf
+
+        with _open_hilt_file(self.file_path) as f:
+            reader = pd.read_csv(f, sep=' ', usecols=self.columns, chunksize=self.chunk_rows,
+                                dtype={column:hilt_dtypes[column] for column in self.columns})
+            while True:
+                # The span can't be open across the yield, so the chunks are read explicitly.
+                with profiling.span('hilt.parse') as span:
+                    start_position = f.tell()
+                    chunk = next(reader, None)
+                    span.add(bytes_read=f.tell()-start_position, 
+                             rows=0 if chunk is None else chunk.shape[0])
+                if chunk is None:
+                    break
+                chunk_arrays = {column:chunk[column].to_numpy() for column in self.columns}
+                seconds = chunk_arrays['Time']
+                if (seconds.shape[0] > 0) and (
+                        np.any(seconds[1:] < seconds[:-1]) or (seconds[0] < last_seconds)
+                        ):
+                    raise RuntimeError(f'The SAMPEX HILT data is not in order for {self.load_date_str}.')
+                if seconds.shape[0] > 0:
+                    last_seconds = seconds[-1]
+                with profiling.span('hilt.time_conversion', rows=seconds.shape[0]):
+                    chunk_arrays['Time'] = date_seconds2datetime64(self.load_date, seconds)
+                yield chunk_arrays
+        return
+
+    def resolved_chunks(self):
+        """
+        Yield the (counts, times) arrays for every chunk, resolved to 20 ms 
+        assuming the data is in state4 (see Load_HILT.resolve_counts_state4).
+        """
+        resolution_ns = 20_000_000
+        offsets = (resolution_ns*np.arange(5)).astype('timedelta64[ns]')
+        rate_columns = ['Rate1', 'Rate2', 'Rate3', 'Rate4', 'Rate6']
+
+        for chunk_arrays in self.chunks():
+            counts = np.stack([chunk_arrays[column] for column in rate_columns], axis=1).ravel()
+            times = (chunk_arrays['Time'][:, np.newaxis] + offsets).ravel()
+            yield counts, times
+        return
+
+
 class Load_PET:
     def __init__(self, load_date, verbose=False) -> None:
         self.load_date = load_date
@@ -145,8 +217,7 @@ class Load_PET:
         if np.any(np_time[1:] < np_time[:-1]):
             raise RuntimeError(f'The SAMPEX PET data is not in order for {self.load_date_str}.')
         # Convert seconds of day to a datetime object.
-        day_seconds_obj = pd.to_timedelta(self.data['Time'], unit='s')
-        self.data['Time'] = pd.Timestamp(self.load_date.date()) + day_seconds_obj
+        self.data['Time'] = date_seconds2datetime64(self.load_date, np_time)
         if time_index:
             self.data.index = self.data['Time']
             del(self.data['Time'])
@@ -154,16 +225,11 @@ class Load_PET:
 
     def _find_file(self, day):
         """
-        Recursively searches the config.SAMPEX_DIR/pet/ directory for the file.
+        Finds the file in the config.SAMPEX_DIR/pet/ directory using the file catalog.
         """
-        file_name_glob = f'phrr{self.load_date_str}*'
-        matched_files = list(
-            pathlib.Path(config.SAMPEX_DIR, 'pet').rglob(file_name_glob)
-            )
-        # 1 if there is just one file, and 2 if there is a file.txt and 
-        # file.txt.zip files.
+        matched_files = file_catalog('pet').find(self.load_date_str)
         assert len(matched_files)==1, (f'{len(matched_files)} matched PET files found.'
-                                        f'\nSearch string: {file_name_glob}'
+                                        f'\nSearch YEARDOY: {self.load_date_str}'
                                         f'\nSearch directory: {pathlib.Path(config.SAMPEX_DIR, "pet")}'
                                         f'\nmatched files: {matched_files}')
         return matched_files[0]
@@ -195,8 +261,7 @@ class Load_LICA:
         if np.any(np_time[1:] < np_time[:-1]):
             raise RuntimeError(f'The SAMPEX LICA data is not in order for {self.load_date_str}.')
         # Convert seconds of day to a datetime object.
-        day_seconds_obj = pd.to_timedelta(self.data['Time'], unit='s')
-        self.data['Time'] = pd.Timestamp(self.load_date.date()) + day_seconds_obj
+        self.data['Time'] = date_seconds2datetime64(self.load_date, np_time)
         if time_index:
             self.data.index = self.data['Time']
             del(self.data['Time'])
@@ -204,31 +269,29 @@ class Load_LICA:
 
     def _find_file(self, day):
         """
-        Recursively searches the config.SAMPEX_DIR/pet/ directory for the file.
+        Finds the file in the config.SAMPEX_DIR/lica/ directory using the file catalog.
         """
-        file_name_glob = f'lhrr{self.load_date_str}*'
-        matched_files = list(
-            pathlib.Path(config.SAMPEX_DIR, 'lica').rglob(file_name_glob)
-            )
-        # 1 if there is just one file, and 2 if there is a file.txt and 
-        # file.txt.zip files.
+        matched_files = file_catalog('lica').find(self.load_date_str)
         assert len(matched_files)==1, (f'{len(matched_files)} matched LICA files found.'
-                                        f'\nSearch string: {file_name_glob}'
+                                        f'\nSearch YEARDOY: {self.load_date_str}'
                                         f'\nSearch directory: {pathlib.Path(config.SAMPEX_DIR, "lica")}'
                                         f'\nmatched files: {matched_files}')
         return matched_files[0]
 
 
 class Load_Attitude:
-    def __init__(self, load_date, verbose=False):
+    def __init__(self, load_date, verbose=False, use_cache=True):
         """ 
         This class loads the appropriate SAMEX attitude file, 
         parses the complex header and converts the time 
-        columns into datetime objects
+        columns into datetime objects. If use_cache=True, the parsed 
+        default columns are cached in the binary npz format (see 
+        load/cache.py) so each attitude file is parsed once.
         """
         self.load_date = load_date
         self.load_date_str = date2yeardoy(load_date)
         self.verbose = verbose
+        self.use_cache = use_cache
 
         # Find the appropriate attitude file.
         self.find_matching_attitude_file()
@@ -239,18 +302,11 @@ class Load_Attitude:
 
     def find_matching_attitude_file(self):
         """ 
-        Uses pathlib.rglob to find the attitude file that contains 
+        Uses the Attitude_Index to find the attitude file that contains 
         the DOY from self.load_date
         """
-        attitude_files = sorted(list(pathlib.Path(config.SAMPEX_DIR, 'attitude').rglob('PSSet_6sec_*_*.txt')))
-        start_end_dates = [re.findall(r'\d+', str(f.name))[1:] for f in attitude_files]
-        
-        current_date_int = int(self.load_date_str)
-        self.attitude_file = None
-
-        for f, (start_date, end_date) in zip(attitude_files, start_end_dates):
-            if (int(start_date) <= current_date_int) and (int(end_date) >= current_date_int):
-                self.attitude_file = f
+        with profiling.span('attitude.file_lookup'):
+            self.attitude_file = attitude_index().find(self.load_date_str)
         if self.attitude_file is None:
             raise ValueError(f'A matched file not found in {pathlib.Path(config.SAMPEX_DIR, "attitude")} '
                              f'for YEARDOY={self.load_date_str}')
@@ -269,6 +325,15 @@ class Load_Attitude:
         if self.verbose:
             print(f'Loading SAMPEX attitude data from {self.load_date.date()} from'
                 f' {self.attitude_file.name}')
+        use_cache = self.use_cache and (columns == 'default')
+        if use_cache:
+            cache_path = cache.cache_path(self.attitude_file, 'attitude')
+            if cache_path.exists():
+                self.attitude = cache.load_frame(cache_path)
+                if remove_old_time_cols:
+                    self.attitude.drop(['Year', 'Day-of-year', 'Sec_of_day'], axis=1, inplace=True)
+                return
+
         # A default set of hard-coded list of columns to load
         if columns=='default':
             columns = {
@@ -277,7 +342,8 @@ class Load_Attitude:
                 22:'MLT', 42:'Mirror_Alt', 68:'Pitch', 71:'Att_Flag'
             }
         # Open the attitude file stream
-        with open(self.attitude_file) as f:
+        with open(self.attitude_file) as f, profiling.span(
+                'attitude.parse', bytes_read=self.attitude_file.stat().st_size) as span:
             # Skip the long header until the "BEGIN DATA" line 
             self._skip_header(f)
             # Save the rest to a file using columns specified by the columns.keys() with the 
@@ -285,7 +351,12 @@ class Load_Attitude:
             self.attitude = pd.read_csv(f, delim_whitespace=True,
                                         names=columns.values(), 
                                         usecols=columns.keys())
-        self._parse_attitude_datetime(remove_old_time_cols)
+            span.add(rows=self.attitude.shape[0])
+        self._parse_attitude_datetime(remove_old_time_cols=False)
+        if use_cache:
+            cache.save_frame(cache_path, self.attitude)
+        if remove_old_time_cols:
+            self.attitude.drop(['Year', 'Day-of-year', 'Sec_of_day'], axis=1, inplace=True)
         return
 
     def _skip_header(self, f):
@@ -307,19 +378,156 @@ class Load_Attitude:
         Parse the attitude year, DOY, and second of day columns 
         into datetime objects. 
         """
-        # Parse the dates by first making YYYY-DOY strings.
-        year_doy = [f'{year}-{doy}' for year, doy in 
-                    self.attitude[['Year', 'Day-of-year']].values]
-        # Convert to date objects
-        attitude_dates=pd.to_datetime(year_doy, format='%Y-%j')
-        # Now add the seconds of day to complete the date and time.
-        self.attitude.index = attitude_dates + pd.to_timedelta(self.attitude['Sec_of_day'], unit='s')
+        with profiling.span('attitude.time_conversion', rows=self.attitude.shape[0]):
+            self.attitude.index = pd.DatetimeIndex(yeardoy2datetime64(
+                self.attitude['Year'].to_numpy(), 
+                self.attitude['Day-of-year'].to_numpy(),
+                self.attitude['Sec_of_day'].to_numpy()
+                ))
         # Optionally remove duplicate columns to conserve memory.
         if remove_old_time_cols:
             self.attitude.drop(['Year', 'Day-of-year', 'Sec_of_day'], axis=1, inplace=True)
         return
 
 
+def find_hilt_file(load_date_str):
+    """
+    Find the HILT file for the load_date_str YEARDOY date. If multiple or no
+    unique files are found this will raise an assertion error. If both the 
+    text and zipped files exist, the text file is returned.
+    """
+    with profiling.span('hilt.file_lookup'):
+        matched_files = file_catalog('hilt').find(load_date_str)
+    # 1 if there is just one file, and 2 if there is a file.txt and 
+    # file.txt.zip files.
+    assert len(matched_files) in [1, 2], (f'{len(matched_files)} matched HILT files found.'
+                                    f'\nSearch YEARDOY: {load_date_str}'
+                                    f'\nSearch directory: {pathlib.Path(config.SAMPEX_DIR, "hilt")}'
+                                    f'\nmatched files: {matched_files}')
+    return sorted(matched_files, key=lambda f: f.suffix == '.zip')[0]
+
+@contextlib.contextmanager
+def _open_hilt_file(file_path):
+    """
+    Open the HILT text file, or the text file inside the zip file, as a binary stream.
+    """
+    if file_path.suffix != '.zip':
+        with open(file_path, 'rb') as f:
+            yield f
+    else:
+        with zipfile.ZipFile(file_path, 'r') as zip_ref, zip_ref.open(file_path.stem) as f:
+            yield f
+
+def attitude_file_ranges():
+    """
+    Uses the file catalog to find all of the attitude files and returns a sorted 
+    list of (path, start_yeardoy, end_yeardoy) tuples parsed from the 
+    "PSSet_6sec_YEARDOY_YEARDOY.txt" filenames.
+    """
+    catalog = file_catalog('attitude')
+    return sorted((pathlib.Path(catalog.root_dir, record['path']), *record['dates']) 
+                  for record in catalog.records)
+
+def attitude_index():
+    """
+    Get the Attitude_Index. It is built once per process and config.SAMPEX_DIR.
+    """
+    key = str(config.SAMPEX_DIR)
+    if key not in _attitude_indices:
+        _attitude_indices[key] = Attitude_Index()
+    return _attitude_indices[key]
+
+_attitude_indices = {}
+
+
+class Attitude_Index:
+    def __init__(self, refresh=False):
+        """
+        An index of the attitude files and the YEARDOY ranges that they cover, 
+        built from the persistent attitude file catalog. If refresh=True, the 
+        catalog is refreshed first. The file lookup is a binary search over the 
+        sorted file start dates. Use attitude_index() to reuse the index.
+        """
+        if refresh:
+            file_catalog('attitude').refresh()
+        self._build()
+        self._refreshed_after_miss = False
+        return
+
+    def find(self, yeardoy):
+        """
+        Find the attitude file that contains the yeardoy date. If multiple files 
+        overlap, the matching file with the latest start date is returned. 
+        Returns None if no file matches. If no file matches, the catalog is
+        refreshed once and searched again, so the new attitude files are found.
+        """
+        attitude_file = self._find(int(yeardoy))
+        if (attitude_file is None) and (not self._refreshed_after_miss):
+            file_catalog('attitude').refresh()
+            self._build()
+            self._refreshed_after_miss = True
+            attitude_file = self._find(int(yeardoy))
+        return attitude_file
+
+    def _build(self):
+        """
+        Build the sorted file date ranges from the attitude file catalog.
+        """
+        file_ranges = attitude_file_ranges()
+        self.files = [f for f, _, _ in file_ranges]
+        self.start_dates = [start_date for _, start_date, _ in file_ranges]
+        self.end_dates = [end_date for _, _, end_date in file_ranges]
+        self._sort()
+        return
+
+    def _find(self, yeardoy):
+        """
+        The binary search of find().
+        """
+        # The last file that starts on or before yeardoy
+        i = bisect.bisect_right(self.start_dates, yeardoy) - 1
+        if (i < 0) or (self.max_end_dates[i] < yeardoy):
+            return None
+        # Walk back to the last file that also ends on or after yeardoy. The 
+        # running max of the end dates guarantees that one exists.
+        while self.end_dates[i] < yeardoy:
+            i -= 1
+        return self.files[i]
+
+    def _sort(self):
+        """
+        Sort the files by their (start, end) dates and calculate the running
+        maximum of the end dates.
+        """
+        order = sorted(range(len(self.files)), 
+                       key=lambda i: (self.start_dates[i], self.end_dates[i], str(self.files[i])))
+        self.files = [self.files[i] for i in order]
+        self.start_dates = [self.start_dates[i] for i in order]
+        self.end_dates = [self.end_dates[i] for i in order]
+        self.max_end_dates = list(itertools.accumulate(self.end_dates, max))
+        return
+
+
+def yeardoy2datetime64(year, doy, seconds=0):
+    """
+    Converts the integer year, day of year, and seconds of day arrays (or 
+    scalars) into a datetime64[ns] array using numpy arithmetic. This avoids 
+    building and parsing a string for every time stamp.
+    """
+    year_start = (np.asarray(year, dtype=np.int64) - 1970).astype('datetime64[Y]')
+    day_start = (year_start.astype('datetime64[D]') + 
+                (np.asarray(doy, dtype=np.int64) - 1).astype('timedelta64[D]'))
+    nanoseconds = np.round(np.asarray(seconds, dtype=np.float64)*1E9).astype(np.int64)
+    return day_start.astype('datetime64[ns]') + nanoseconds.astype('timedelta64[ns]')
+
+def date_seconds2datetime64(day, seconds):
+    """
+    Converts the seconds of day array from the day date into a 
+    datetime64[ns] array.
+    """
+    yeardoy = date2yeardoy(day)
+    return yeardoy2datetime64(int(yeardoy[:4]), int(yeardoy[4:]), seconds)
+
 def date2yeardoy(day):
     """ 
     Converts a date in a string, datetime.datetime or a pd.Timestamp format into a
@@ -0,0 +1,116 @@
+"""
+Build the feature matrix of the microburst occurrence model from the merged
+pass catalog (see pipeline/merge_omni.py). The features are the in-pass means
+of the OMNI indices and MLT, and the mean index slopes in the lag windows before
+each pass (the {col}_{lag}_m_lag columns). The target is the fraction of the
+pass with microbursts, microburst_prob.
+
+The feature matrices are cached in the config.PROJECT_DIR/../data/cache/features/
+directory, keyed by the catalog fingerprint and the feature parameters, so they
+are built once per catalog version.
+"""
+import pathlib
+import re
+
+import numpy as np
+
+from sampex_microburst_indices.analysis.catalog import filter_mask
+from sampex_microburst_indices.analysis.catalog import good_passes
+from sampex_microburst_indices.load import cache
+from sampex_microburst_indices.load.catalog_io import binary_catalog
+from sampex_microburst_indices.load.catalog_io import catalog_columns
+from sampex_microburst_indices.load.catalog_io import load_catalog
+from sampex_microburst_indices.pipeline.checkpoints import hash_key
+
+default_mean_columns = ['AE', 'AL', 'AU', 'SYM/D', 'SYM/H', 'ASY/D', 'ASY/H', 'mean_MLT']
+
+
+class Feature_Matrix:
+    def __init__(self, file_name='sampex_passes_v0.csv', mean_columns=None, lags=None,
+                target='microburst_prob', filters=good_passes, use_cache=True) -> None:
+        """
+        The float32 feature matrix, X, and target vector, y, of the file_name catalog.
+
+        Parameters
+        ----------
+        file_name: str
+            The merged pass catalog file name.
+        mean_columns: list
+            The in-pass mean columns. If None, default_mean_columns is used.
+        lags: list
+            The lag windows, in minutes, of the {col}_{lag}_m_lag slope columns.
+            If None, all of the lag slope columns of the mean_columns in the
+            catalog are used.
+        target: str
+            The target column.
+        filters: tuple
+            The (column, lower, upper) filters of the passes (see analysis/catalog.py).
+        use_cache: bool
+            Load the matrix from, and save it to, the cache.
+        """
+        self.file_name = file_name
+        self.mean_columns = default_mean_columns if mean_columns is None else mean_columns
+        self.lags = lags
+        self.target = target
+        self.filters = tuple(filters)
+        self.use_cache = use_cache
+        return
+
+    def build(self):
+        """
+        Load the feature matrix from the cache or build it from the catalog.
+        The passes with a non-finite feature or target are dropped. Returns
+        the (X, y) tuple.
+        """
+        catalog_path = binary_catalog(self.file_name)
+        self.feature_names = self._feature_names(catalog_columns(self.file_name))
+        key = hash_key(cache.file_fingerprint(catalog_path), self.feature_names,
+                       self.target, self.filters)
+        cache_path = pathlib.Path(cache.cache_dir(), 'features', f'{key}.npz')
+
+        if self.use_cache and cache_path.exists():
+            with np.load(cache_path) as npz:
+                self.X, self.y, self.rows = npz['X'], npz['y'], npz['rows']
+            return self.X, self.y
+
+        columns = list(dict.fromkeys(
+            [*self.feature_names, self.target, *[column for column, _, _ in self.filters]]
+            ))
+        catalog = load_catalog(self.file_name, columns=columns)
+        X = np.empty((catalog.shape[0], len(self.feature_names)), dtype=np.float32)
+        for i, feature_name in enumerate(self.feature_names):
+            X[:, i] = catalog[feature_name].to_numpy(dtype=np.float32)
+        y = catalog[self.target].to_numpy(dtype=np.float32)
+
+        keep = filter_mask(catalog, self.filters, catalog.shape[0])
+        keep &= np.isfinite(X).all(axis=1) & np.isfinite(y)
+        self.rows = np.where(keep)[0]
+        self.X = np.ascontiguousarray(X[keep])
+        self.y = y[keep]
+
+        if self.use_cache:
+            with cache.atomic_write(cache_path) as f:
+                np.savez(f, X=self.X, y=self.y, rows=self.rows)
+        return self.X, self.y
+
+    def _feature_names(self, columns):
+        """
+        The mean_columns followed by their lag slope columns, sorted by lag.
+        """
+        missing = [column for column in self.mean_columns if column not in columns]
+        if missing:
+            raise ValueError(f'The {missing} columns are not in the {self.file_name} catalog.')
+
+        lag_columns = {}
+        for column in self.mean_columns:
+            for c in columns:
+                match = re.fullmatch(rf'{re.escape(column)}_(\d+)_m_lag', c)
+                if match and ((self.lags is None) or (int(match.group(1)) in self.lags)):
+                    lag_columns[c] = int(match.group(1))
+
+        if self.lags is not None:
+            missing = set(self.lags) - set(lag_columns.values())
+            if missing:
+                raise ValueError(f'The {sorted(missing)} minute lag columns are not in the '
+                                 f'{self.file_name} catalog.')
+        return [*self.mean_columns, *sorted(lag_columns, key=lag_columns.get)]
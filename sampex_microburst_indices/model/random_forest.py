@@ -0,0 +1,102 @@
+"""
+A random forest model of the microburst occurrence in each radiation belt pass,
+given the geomagnetic indices during and before the pass. This is step 3 of the
+README. The forest is trained on all cores and the feature importance is the
+permutation importance on the test passes, which is also calculated in parallel.
+
+To train the model run:
+python3 -m sampex_microburst_indices.model.random_forest --n_estimators 500
+"""
+import argparse
+import time
+
+import pandas as pd
+from sklearn.ensemble import RandomForestRegressor
+from sklearn.inspection import permutation_importance
+from sklearn.model_selection import train_test_split
+
+from sampex_microburst_indices.model.features import Feature_Matrix
+
+
+class Microburst_Forest:
+    def __init__(self, features=None, test_size=0.25, n_jobs=-1, random_state=0,
+                **forest_kwargs) -> None:
+        """
+        The random forest regression of the Feature_Matrix target.
+
+        Parameters
+        ----------
+        features: Feature_Matrix
+            The features. If None, the default Feature_Matrix() is used.
+        test_size: float
+            The fraction of the passes held out to test the model and calculate
+            the permutation importance.
+        n_jobs: int
+            The number of processes used to train the forest and calculate the
+            permutation importance. -1 uses all cores.
+        random_state: int
+            The random seed of the train/test split, forest, and permutations.
+        forest_kwargs: dict
+            The sklearn.ensemble.RandomForestRegressor hyperparameters, e.g.
+            n_estimators or max_depth.
+        """
+        self.features = Feature_Matrix() if features is None else features
+        self.test_size = test_size
+        self.n_jobs = n_jobs
+        self.random_state = random_state
+        self.forest_kwargs = forest_kwargs
+        return
+
+    def train(self):
+        """
+        Split the passes into the train and test sets and train the forest.
+        Returns the test set R^2 score.
+        """
+        X, y = self.features.build()
+        self.X_train, self.X_test, self.y_train, self.y_test = train_test_split(
+            X, y, test_size=self.test_size, random_state=self.random_state
+            )
+        self.forest = RandomForestRegressor(
+            n_jobs=self.n_jobs, random_state=self.random_state, **self.forest_kwargs
+            )
+        start_time = time.time()
+        self.forest.fit(self.X_train, self.y_train)
+        self.train_time_s = time.time() - start_time
+        self.score = self.forest.score(self.X_test, self.y_test)
+        return self.score
+
+    def importance(self, n_repeats=10):
+        """
+        The permutation importance of every feature on the test passes, sorted
+        from the most to the least important.
+        """
+        result = permutation_importance(
+            self.forest, self.X_test, self.y_test, n_repeats=n_repeats,
+            n_jobs=self.n_jobs, random_state=self.random_state
+            )
+        importance = pd.DataFrame(data={
+            'feature':self.features.feature_names,
+            'importance_mean':result.importances_mean,
+            'importance_std':result.importances_std
+            })
+        return importance.sort_values('importance_mean', ascending=False, ignore_index=True)
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Train the microburst random forest model.')
+    parser.add_argument('--file_name', default='sampex_passes_v0.csv')
+    parser.add_argument('--lags', type=int, nargs='*', default=None,
+                        help='The lag windows, in minutes. Defaults to all lags in the catalog.')
+    parser.add_argument('--n_estimators', type=int, default=100)
+    parser.add_argument('--max_depth', type=int, default=None)
+    parser.add_argument('--n_jobs', type=int, default=-1)
+    args = parser.parse_args()
+
+    model = Microburst_Forest(
+        features=Feature_Matrix(file_name=args.file_name, lags=args.lags), n_jobs=args.n_jobs,
+        n_estimators=args.n_estimators, max_depth=args.max_depth
+        )
+    score = model.train()
+    print(f'Trained on {model.X_train.shape[0]} passes in {round(model.train_time_s, 1)} s. '
+          f'Test R^2={round(score, 3)}')
+    print(model.importance())
@@ -0,0 +1,184 @@
+"""
+A parallel sweep of the random forest model over a grid of L ranges, OMNI lag
+window sets, and forest hyperparameters. The jobs run on a process pool in
+three stages so that the shared upstream work runs once:
+
+    1. The passes and microburst merge, once per L range.
+    2. The OMNI merge and the feature matrix, once per (L range, lag set).
+    3. The forest training, once per grid point.
+
+The pipeline stage outputs (see pipeline/pipeline.py) and feature matrices (see
+model/features.py) are cached, so rerunning or extending a sweep only runs the
+new upstream work. The results and timings of every grid point are saved to a
+single table, config.PROJECT_DIR/../data/sweep/sweep_results.csv by default.
+
+To run a sweep:
+python3 -m sampex_microburst_indices.model.sweep --L_ranges 4 8 3 7 --lag_sets 15,60 15,30,60,240
+"""
+import argparse
+import itertools
+import multiprocessing
+import time
+
+import pandas as pd
+
+from sampex_microburst_indices.analysis.catalog import good_passes
+from sampex_microburst_indices.load.catalog_io import binary_path
+from sampex_microburst_indices.load.catalog_io import save_catalog
+from sampex_microburst_indices.model.features import Feature_Matrix
+from sampex_microburst_indices.model.random_forest import Microburst_Forest
+from sampex_microburst_indices.pipeline.pipeline import build_pipeline
+
+
+class Sweep:
+    def __init__(self, L_ranges=((4, 8),), lag_sets=((15, 30, 60, 240),), forest_grid=None,
+                filters=good_passes, workers=None, forest_n_jobs=1,
+                save_name='sweep/sweep_results.csv') -> None:
+        """
+        The sweep over the L_ranges x lag_sets x forest_grid grid.
+
+        Parameters
+        ----------
+        L_ranges: list
+            The Passes L_range values.
+        lag_sets: list
+            The Merge_OMNI mean_slope_windows_m lag sets, in minutes.
+        forest_grid: dict
+            The RandomForestRegressor hyperparameters and the list of values to
+            try, e.g. {'n_estimators':[100, 500], 'max_depth':[None, 10]}. If
+            None, the default forest is trained.
+        filters: tuple
+            The (column, lower, upper) filters of the passes (see analysis/catalog.py).
+        workers: int
+            The number of worker processes. If None, all CPUs are used.
+        forest_n_jobs: int
+            The n_jobs of each forest. Since the grid points are already trained
+            in parallel, the default is 1.
+        save_name: str
+            The results table file name in the config.PROJECT_DIR/../data/ directory.
+        """
+        self.L_ranges = [tuple(sorted(L_range)) for L_range in L_ranges]
+        self.lag_sets = [tuple(lags) for lags in lag_sets]
+        self.forest_grid = {} if forest_grid is None else forest_grid
+        self.filters = tuple(filters)
+        self.workers = workers
+        self.forest_n_jobs = forest_n_jobs
+        self.save_name = save_name
+        return
+
+    def forest_params(self):
+        """
+        The list of the forest hyperparameter dictionaries in the forest_grid.
+        """
+        names = list(self.forest_grid)
+        return [dict(zip(names, values)) for values in
+                itertools.product(*[self.forest_grid[name] for name in names])]
+
+    def run(self):
+        """
+        Run the sweep and save the results table. Returns the results DataFrame.
+        """
+        catalog_args = list(itertools.product(self.L_ranges, self.lag_sets))
+
+        with multiprocessing.Pool(processes=self.workers) as pool:
+            upstream_times = dict(zip(
+                self.L_ranges, pool.map(_upstream_worker, self.L_ranges)
+                ))
+            catalogs = dict(zip(catalog_args, pool.map(
+                _catalog_worker, [(*args, self.filters) for args in catalog_args]
+                )))
+
+            jobs = [
+                (catalogs[(L_range, lags)][0], L_range, lags, self.filters, params,
+                 self.forest_n_jobs)
+                for (L_range, lags), params in itertools.product(catalog_args, self.forest_params())
+                ]
+            results = list(pool.imap_unordered(_forest_worker, jobs))
+
+        self.results = pd.DataFrame(results)
+        self.results['upstream_time_s'] = [upstream_times[L_range] for L_range in self.results['L_range']]
+        self.results['catalog_time_s'] = [
+            catalogs[(L_range, lags)][1] for L_range, lags in
+            zip(self.results['L_range'], self.results['lags'])
+            ]
+        self.results = self.results.sort_values('score', ascending=False, ignore_index=True)
+        self._save()
+        return self.results
+
+    def _save(self):
+        """
+        Save the results table. The L_range, lags, and params columns are saved
+        as strings.
+        """
+        results = self.results.copy()
+        for column in ['L_range', 'lags', 'params']:
+            results[column] = results[column].astype(str)
+        save_catalog(results, self.save_name, export_csv=True)
+        return
+
+
+def _upstream_worker(L_range):
+    """
+    Run, or load from the cache, the passes and microbursts stages of L_range.
+    Returns the run time in seconds.
+    """
+    start_time = time.time()
+    build_pipeline(L_range=L_range, prune_cache=False).run(target='microbursts')
+    return time.time() - start_time
+
+def _catalog_worker(args):
+    """
+    Run the OMNI stage of the (L_range, lags) catalog, save the catalog, and
+    build its feature matrix. Returns the catalog file name and the run time in
+    seconds. The catalog file name contains the pipeline key, so an unchanged
+    catalog is not saved again and its cached feature matrix stays valid.
+    """
+    L_range, lags, filters = args
+    start_time = time.time()
+    pipeline = build_pipeline(L_range=L_range, mean_slope_windows_m=list(lags), prune_cache=False)
+    passes = pipeline.run(target='omni')
+    file_name = f'sweep/passes_{pipeline.keys["omni"]}.csv'
+    if not binary_path(file_name).exists():
+        save_catalog(passes, file_name)
+    Feature_Matrix(file_name=file_name, lags=list(lags), filters=filters).build()
+    return file_name, time.time() - start_time
+
+def _forest_worker(args):
+    """
+    Train the forest of one grid point and return its results.
+    """
+    file_name, L_range, lags, filters, params, n_jobs = args
+    start_time = time.time()
+    model = Microburst_Forest(
+        features=Feature_Matrix(file_name=file_name, lags=list(lags), filters=filters),
+        n_jobs=n_jobs, **params
+        )
+    score = model.train()
+    return {
+        'L_range':L_range, 'lags':lags, 'params':params, 'catalog':file_name,
+        'n_features':model.X_train.shape[1], 'n_train':model.X_train.shape[0],
+        'n_test':model.X_test.shape[0], 'score':score, 'train_time_s':model.train_time_s,
+        'job_time_s':time.time() - start_time
+        }
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Sweep the random forest model parameters.')
+    parser.add_argument('--L_ranges', type=float, nargs='+', default=[4, 8],
+                        help='The flattened L ranges, e.g. 4 8 3 7 for (4, 8) and (3, 7).')
+    parser.add_argument('--lag_sets', nargs='+', default=['15,30,60,240'],
+                        help='The comma separated lag sets in minutes, e.g. 15,60 15,30,60.')
+    parser.add_argument('--n_estimators', type=int, nargs='+', default=[100])
+    parser.add_argument('--max_depth', type=int, nargs='+', default=None)
+    parser.add_argument('--workers', type=int, default=None)
+    args = parser.parse_args()
+
+    forest_grid = {'n_estimators':args.n_estimators}
+    if args.max_depth is not None:
+        forest_grid['max_depth'] = args.max_depth
+    sweep = Sweep(
+        L_ranges=list(zip(args.L_ranges[::2], args.L_ranges[1::2])),
+        lag_sets=[[int(lag) for lag in lags.split(',') if lag] for lags in args.lag_sets],
+        forest_grid=forest_grid, workers=args.workers
+        )
+    print(sweep.run())
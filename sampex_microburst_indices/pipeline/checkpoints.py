@@ -0,0 +1,146 @@
+"""
+Checkpoint stores for the incremental pipeline. The pass checkpoints save the
+passes of each HILT day and the merge checkpoints save the merged columns of each
+pass, so an interrupted or updated run only recomputes the days and passes
+whose inputs changed. The checkpoints are saved in the
+config.PROJECT_DIR/../data/cache/checkpoints/ directory.
+"""
+import hashlib
+import pathlib
+
+import numpy as np
+import pandas as pd
+
+from sampex_microburst_indices.load import cache
+from sampex_microburst_indices.load.sampex import attitude_index
+from sampex_microburst_indices.load.sampex import date2yeardoy
+from sampex_microburst_indices.load.sampex import find_hilt_file
+
+
+def checkpoint_dir():
+    """
+    The base checkpoint directory.
+    """
+    return pathlib.Path(cache.cache_dir(), 'checkpoints')
+
+def hash_key(*key_parts):
+    """
+    A short hash of the string representations of the key_parts.
+    """
+    return hashlib.sha1('|'.join(str(part) for part in key_parts).encode()).hexdigest()[:16]
+
+def save_pickle(path, obj):
+    """
+    Pickle obj to path with cache.atomic_write(), so an interrupted write does
+    not leave a corrupt checkpoint behind and concurrent writers don't collide.
+    """
+    with cache.atomic_write(path) as f:
+        pd.to_pickle(obj, f)
+    return
+
+
+class Pass_Checkpoints:
+    def __init__(self, L_range, gap_threshold_s, sub_pass_bins=None) -> None:
+        """
+        The per-day pass checkpoints for the L_range, gap_threshold_s, and 
+        sub_pass_bins parameters. Each day's checkpoint is valid while the 
+        fingerprints of its HILT and attitude files are unchanged. The fingerprints
+        are calculated once per date by each instance.
+        """
+        name = f'L_{L_range[0]}_{L_range[1]}_gap_{gap_threshold_s}_s'
+        if sub_pass_bins is not None:
+            # The pass_index part invalidates the sub-passes saved without that column.
+            name += '_sub_passes_' + hash_key(
+                'pass_index', *[(column, list(edges)) for column, edges in sub_pass_bins.items()]
+                )
+        self.directory = pathlib.Path(checkpoint_dir(), 'passes', name)
+        self._fingerprints = {}
+        return
+
+    def fingerprint(self, date):
+        """
+        The fingerprint of the HILT and attitude input files for date.
+        """
+        if date not in self._fingerprints:
+            self._fingerprints[date] = self._fingerprint(date)
+        return self._fingerprints[date]
+
+    def _fingerprint(self, date):
+        yeardoy = date2yeardoy(date)
+        attitude_file = attitude_index().find(yeardoy)
+        if attitude_file is None:
+            attitude_fingerprint = None
+        else:
+            attitude_fingerprint = cache.file_fingerprint(attitude_file)
+        return f'{cache.file_fingerprint(find_hilt_file(yeardoy))}|{attitude_fingerprint}'
+
+    def load(self, date):
+        """
+        Load the checkpoint for date. Returns a (valid, passes, sub_passes) tuple 
+        where valid is False if the checkpoint does not exist or is stale. passes
+        is None for days without passes and sub_passes is None if they were not
+        calculated.
+        """
+        path = self._path(date)
+        if not path.exists():
+            return False, None, None
+        checkpoint = pd.read_pickle(path)
+        if checkpoint['fingerprint'] != self.fingerprint(date):
+            return False, None, None
+        return True, checkpoint['passes'], checkpoint.get('sub_passes')
+
+    def save(self, date, passes, sub_passes=None):
+        """
+        Save the passes (None if there are none) and sub_passes for date.
+        """
+        save_pickle(self._path(date), {
+            'fingerprint':self.fingerprint(date), 'passes':passes, 'sub_passes':sub_passes
+            })
+        return
+
+    def _path(self, date):
+        return pathlib.Path(self.directory, f'{date2yeardoy(date)}.pkl')
+
+
+class Merge_Checkpoint:
+    def __init__(self, name, *key_parts) -> None:
+        """
+        The merged columns of every pass, keyed by the pass start_time and end_time.
+        The checkpoint is only valid for the same key_parts, e.g. the merge
+        parameters and the input file fingerprints.
+        """
+        self.path = pathlib.Path(checkpoint_dir(), 'merge', f'{name}.pkl')
+        self.key = hash_key(*key_parts)
+        return
+
+    def apply(self, passes, columns):
+        """
+        Copy the checkpointed columns onto the passes with the same start_time
+        and end_time. Returns a boolean array of the passes that still need to be
+        merged.
+        """
+        if not self.path.exists():
+            return np.ones(passes.shape[0], dtype=bool)
+        checkpoint = pd.read_pickle(self.path)
+        if (checkpoint['key'] != self.key) or (set(columns) - set(checkpoint['merged'].columns)):
+            return np.ones(passes.shape[0], dtype=bool)
+
+        merged = checkpoint['merged']
+        indexer = pd.MultiIndex.from_arrays(
+            [merged['start_time'], merged['end_time']]
+            ).get_indexer(
+            pd.MultiIndex.from_arrays([passes['start_time'], passes['end_time']])
+            )
+        found = indexer >= 0
+        for column in columns:
+            # Assign column by column so the column dtypes are preserved.
+            passes.loc[found, column] = merged[column].to_numpy()[indexer[found]]
+        return ~found
+
+    def save(self, passes, columns):
+        """
+        Save the start_time, end_time, and merged columns of the passes.
+        """
+        merged = passes[['start_time', 'end_time', *columns]].reset_index(drop=True)
+        save_pickle(self.path, {'key':self.key, 'merged':merged})
+        return
@@ -1,21 +1,31 @@
-import pathlib
-
 import numpy as np
-import pandas as pd
-import progressbar
 # import matplotlib.pyplot as plt  # For debugging
 
-from sampex_microburst_indices import config
+from sampex_microburst_indices import profiling
+from sampex_microburst_indices.load import cache
+from sampex_microburst_indices.load.catalog_io import binary_catalog
+from sampex_microburst_indices.load.catalog_io import load_catalog
+from sampex_microburst_indices.load.catalog_io import save_catalog
+from sampex_microburst_indices.pipeline.checkpoints import Merge_Checkpoint
 
 
 class Merge_Microbursts:
-    def __init__(self, passes_name, microburst_name) -> None:
+    def __init__(self, passes_name, microburst_name, incremental=False, passes=None) -> None:
         """
-        Merge the passes and microburst datasets.
+        Merge the passes and microburst datasets. If incremental=True, the merged
+        columns are saved to a checkpoint (see pipeline/checkpoints.py) and only 
+        the passes that are not in the checkpoint are merged, as long as the 
+        microburst catalog has not changed. If the passes DataFrame is passed, 
+        it is copied instead of loading the passes_name csv file.
         """
         self.passes_name = passes_name
         self.microburst_name = microburst_name
-        self._load_passes()
+        self.incremental = incremental
+        self.merge_columns = ['microburst_count', 'total_microburst_time', 'microburst_prob']
+        if passes is None:
+            self._load_passes()
+        else:
+            self.passes = passes.copy()
         self._load_microbursts()
         self._remove_long_microbursts(1)
         return
@@ -24,52 +34,120 @@ class Merge_Microbursts:
         """
         Count and merge the number of microbursts in self.microburst_name catalog
         with the catalog of radiation belt passes in self.passes_name.
+
+        The microburst times are sorted once and every pass window, 
+        (start_time, end_time], is found with np.searchsorted. The microburst 
+        counts and total durations are then differences of the window bounds 
+        and of the cumulative sum of |fwhm|.
         """
-        self.passes[['microburst_count', 'total_microburst_time', 'microburst_prob']] = np.nan
-
-        for i, row in progressbar.progressbar(self.passes.iterrows(), max_value=self.passes.shape[0]):
-            microburst_df = self.microbursts[
-                (self.microbursts.index > row['start_time']) &
-                (self.microbursts.index <= row['end_time']) 
-                ]
-            self.passes.loc[i, 'microburst_count'] = microburst_df.shape[0]
-            total_microburst_time = np.sum(np.abs(microburst_df['fwhm']))
-            self.passes.loc[i, 'total_microburst_time'] = total_microburst_time
-            self.passes.loc[i, 'microburst_prob'] = total_microburst_time/row['duration_s'] 
-            pass
+        self.passes[self.merge_columns] = np.nan
+        if self.incremental:
+            checkpoint = Merge_Checkpoint(
+                f'microbursts_{self.passes_name}', 
+                cache.file_fingerprint(self._microbursts_path()), self.long_microburst_threshold
+                )
+            unmerged = checkpoint.apply(self.passes, self.merge_columns)
+        else:
+            unmerged = np.ones(self.passes.shape[0], dtype=bool)
+        with profiling.span('microbursts.merge', rows=unmerged.sum()):
+            self._merge_passes(unmerged)
+        self.passes['microburst_count'] = self.passes['microburst_count'].astype(int)
+
+        if self.incremental:
+            checkpoint.save(self.passes, self.merge_columns)
+        return
+
+    def _merge_passes(self, pass_mask):
+        """
+        Merge the microbursts onto the passes selected by the pass_mask boolean array.
+        """
+        microbursts = self.microbursts.sort_index()
+        microburst_times = microbursts.index.to_numpy()
+        cumulative_fwhm = np.concatenate(([0], np.cumsum(np.abs(microbursts['fwhm'].to_numpy()))))
+        passes = self.passes.loc[pass_mask]
+
+        start_indices = np.searchsorted(microburst_times, 
+            passes['start_time'].to_numpy(), side='right')
+        end_indices = np.searchsorted(microburst_times, 
+            passes['end_time'].to_numpy(), side='right')
+
+        total_microburst_time = cumulative_fwhm[end_indices] - cumulative_fwhm[start_indices]
+        self.passes.loc[pass_mask, 'microburst_count'] = end_indices - start_indices
+        self.passes.loc[pass_mask, 'total_microburst_time'] = total_microburst_time
+        self.passes.loc[pass_mask, 'microburst_prob'] = (
+            total_microburst_time/passes['duration_s'].to_numpy()
+            )
         return
 
-    def save(self, file_name=None):
+    def merge_sub_passes(self):
         """
-        Saves the self.passes DataFrame to a csv file.
+        Count and merge the microbursts onto the sub-pass segments (see 
+        Passes.sub_pass_values()) in the self.passes_name catalog. Each microburst
+        is joined to the last segment that starts before it with np.searchsorted,
+        and it is counted if it is before the segment end_time, so like merge(), 
+        the segments are (start_time, end_time] windows. The counts and total 
+        durations of every segment are then calculated with np.bincount. Like 
+        merge(), the microburst_prob is the total microburst time divided by the
+        segment's exposure_s. The segments don't need to be sorted.
+        """
+        with profiling.span('microbursts.merge_sub_passes', rows=self.passes.shape[0]):
+            microbursts = self.microbursts.sort_index()
+            microburst_times = microbursts.index.to_numpy()
+            fwhm = np.abs(microbursts['fwhm'].to_numpy())
+            # The segments in start_time order.
+            order = np.argsort(self.passes['start_time'].to_numpy(), kind='stable')
+            start_times = self.passes['start_time'].to_numpy()[order]
+            end_times = self.passes['end_time'].to_numpy()[order]
+
+            segments = np.searchsorted(start_times, microburst_times, side='left') - 1
+            in_segment = (segments >= 0)
+            in_segment[in_segment] = microburst_times[in_segment] <= end_times[segments[in_segment]]
+            segments = order[segments[in_segment]]
+
+            n = self.passes.shape[0]
+            self.passes['microburst_count'] = np.bincount(segments, minlength=n)
+            self.passes['total_microburst_time'] = np.bincount(
+                segments, weights=fwhm[in_segment], minlength=n
+                ).astype(np.float32)
+            with np.errstate(invalid='ignore', divide='ignore'):
+                self.passes['microburst_prob'] = (
+                    self.passes['total_microburst_time']/self.passes['exposure_s']
+                    ).astype(np.float32)
+        return
+
+    def save(self, file_name=None, export_csv=False):
+        """
+        Saves the self.passes catalog (see load/catalog_io.py). If export_csv=True, 
+        the csv file is also saved.
         """
         if file_name is None:
             file_name = self.passes_name
-
-        save_path = pathlib.Path(config.PROJECT_DIR, '..', 'data', file_name)
-        self.passes.to_csv(save_path, index=False)
+        save_catalog(self.passes, file_name, export_csv=export_csv)
         return
 
     def _load_passes(self):
         """
-        Load the passes csv file and parse the start_time and end_time time stamps.
+        Load the passes catalog (see load/catalog_io.py).
         """
-        load_path = pathlib.Path(config.PROJECT_DIR, '..', 'data', self.passes_name)
-        self.passes = pd.read_csv(load_path, parse_dates=[0,1])
+        self.passes = load_catalog(self.passes_name, parse_dates=[0,1])
         return self.passes
 
     def _load_microbursts(self):
         """
-        Load the microburst csv file and parse the start_time and end_time time stamps.
+        Load the microburst catalog (see load/catalog_io.py) with the time stamp index.
         """
-        load_path = pathlib.Path(config.PROJECT_DIR, '..', 'data', self.microburst_name)
-        self.microbursts = pd.read_csv(load_path, index_col=0, parse_dates=True)
+        self.microbursts = load_catalog(self.microburst_name, columns=['fwhm'], 
+                                        index_col=0, parse_dates=True)
         return self.microbursts
 
+    def _microbursts_path(self):
+        return binary_catalog(self.microburst_name, index_col=0, parse_dates=True)
+
     def _remove_long_microbursts(self, threshold):
         """
         Filter out long duration microbursts defined by a minimum threshold, in seconds.
         """
+        self.long_microburst_threshold = threshold
         self.microbursts = self.microbursts[
             np.abs(self.microbursts['fwhm']) < threshold
         ]
@@ -1,15 +1,17 @@
-import pathlib
-from datetime import datetime, timedelta
-
 import numpy as np
 import pandas as pd
 import progressbar
 
-from sampex_microburst_indices import config
+from sampex_microburst_indices import profiling
+from sampex_microburst_indices.load import cache
 from sampex_microburst_indices.load import omni
+from sampex_microburst_indices.load.catalog_io import load_catalog
+from sampex_microburst_indices.load.catalog_io import save_catalog
+from sampex_microburst_indices.pipeline.checkpoints import Merge_Checkpoint
 
 class Merge_OMNI:
-    def __init__(self, passes_name, omni_columns=None, mean_slope_windows_m=None) -> None:
+    def __init__(self, passes_name, omni_columns=None, mean_slope_windows_m=None, 
+                incremental=False, passes=None) -> None:
         """
         Merges the OMNI data onto the radiation belt passes dataset.
 
@@ -22,65 +24,174 @@ class Merge_OMNI:
             omni_columns = ['AE', 'AL', 'AU', 'SYM/D', 'SYM/H', 'ASY/D', 'ASY/H']
         mean_slope_windows_m: list
             The time lags, in minutes, to calculate the mean slope for each column in omni_columns, 
-            prior to each radiation belt pass start_time. 
+            prior to each radiation belt pass start_time. The mean slope, in units/minute, is 
+            saved in the {col}_{lag}_m_lag columns and the mean in the {col}_{lag}_m_lag_mean 
+            columns.
+        incremental: bool
+            If True, the merged columns are saved to a checkpoint (see pipeline/checkpoints.py)
+            and only the passes that are not in the checkpoint are merged, as long as the
+            OMNI files, omni_columns, and mean_slope_windows_m have not changed.
+        passes: pd.DataFrame
+            The passes to merge onto. If None, the passes are loaded from the 
+            passes_name csv file.
         """
         self.passes_name = passes_name
+        self.incremental = incremental
         if omni_columns is None:
             self.omni_columns = ['AE', 'AL', 'AU', 'SYM/D', 'SYM/H', 'ASY/D', 'ASY/H']
         else:
             self.omni_columns = omni_columns
 
-        self._load_passes()
+        if passes is None:
+            self._load_passes()
+        else:
+            self.passes = passes.copy()
         self.passes[self.omni_columns] = np.nan
 
         if mean_slope_windows_m is not None:
             self.mean_slope_windows_m = mean_slope_windows_m
+        else:
+            self.mean_slope_windows_m = []
 
-            for slope_lag in self.mean_slope_windows_m:
-                for omni_column in self.omni_columns:
-                    self.passes[f'{omni_column}_{slope_lag}_m_lag'] = np.nan
+        self.merge_columns = list(self.omni_columns)
+        for slope_lag in self.mean_slope_windows_m:
+            for omni_column in self.omni_columns:
+                self.passes[f'{omni_column}_{slope_lag}_m_lag'] = np.nan
+                self.passes[f'{omni_column}_{slope_lag}_m_lag_mean'] = np.nan
+                self.merge_columns.extend(
+                    [f'{omni_column}_{slope_lag}_m_lag', f'{omni_column}_{slope_lag}_m_lag_mean']
+                    )
         return
 
     def _load_passes(self):
         """
-        Load the passes csv file and parse the start_time and end_time time stamps.
+        Load the passes catalog (see load/catalog_io.py).
         """
-        load_path = pathlib.Path(config.PROJECT_DIR, '..', 'data', self.passes_name)
-        self.passes = pd.read_csv(load_path, parse_dates=[0,1])
+        self.passes = load_catalog(self.passes_name, parse_dates=[0,1])
         return self.passes
 
     def merge(self):
         """
-        Loop over every radiation belt pass and append the mean indice values for
-        all self.omni_columns.
+        Append the mean indice values for all self.omni_columns during every radiation 
+        belt pass, and the mean and mean slope of the indices in the 
+        self.mean_slope_windows_m windows prior to each pass.
+
+        The passes are grouped by year and the OMNI data is loaded once per year, 
+        for the time range spanned by that year's passes and their lag windows (so 
+        lag windows can cross into the previous year). The windows are found with 
+        np.searchsorted and the means and slopes are calculated for all passes at 
+        once using the cumulative sums of the OMNI data.
         """
-        current_year = datetime.min
-
-        for i, row in progressbar.progressbar(self.passes.iterrows(), 
-                                            max_value=self.passes.shape[0]):
-            # Only load data when looping over a new year (new OMNI file).
-            if row['start_time'].year != current_year:
-                self.current_omni = omni.Omni(year=row['start_time'].year).load() 
-                current_year = row['start_time'].year
-
-            omni_during_pass = self.current_omni.loc[row['start_time']:row['end_time']]
-            if omni_during_pass.shape[0] == 0:
-                raise ValueError('Sliced OMNI data with size 0.\n{row}')
-            self.passes.loc[i, self.omni_columns] = omni_during_pass[self.omni_columns].mean()
+        if self.incremental:
+            checkpoint = Merge_Checkpoint(
+                f'omni_{self.passes_name}', self.omni_columns, self.mean_slope_windows_m,
+                *[cache.file_fingerprint(path) for path in omni.find_omni_files()]
+                )
+            unmerged_indices = np.where(checkpoint.apply(self.passes, self.merge_columns))[0]
+        else:
+            unmerged_indices = np.arange(self.passes.shape[0])
+
+        years = self.passes['start_time'].iloc[unmerged_indices].dt.year.to_numpy()
+        max_lag = pd.Timedelta(minutes=max(self.mean_slope_windows_m, default=0))
+
+        for year in progressbar.progressbar(np.unique(years)):
+            pass_indices = unmerged_indices[years == year]
+            time_range = (
+                self.passes['start_time'].iloc[pass_indices].min() - max_lag,
+                self.passes['end_time'].iloc[pass_indices].max()
+                )
+            self.current_omni = omni.Omni(time_range=time_range, columns=self.omni_columns).load()
+            with profiling.span('omni.merge_year', rows=pass_indices.shape[0]):
+                self._merge_year(self.passes.index[pass_indices], self.current_omni)
+
+        if self.incremental:
+            checkpoint.save(self.passes, self.merge_columns)
         return
 
-    def save(self, file_name=None):
+    def _merge_year(self, pass_index, omni_data):
         """
-        Saves the self.passes DataFrame to a csv file.
+        Merge the omni_data onto the passes in the pass_index rows.
+        """
+        omni_times = omni_data.index.to_numpy()
+        omni_values = omni_data[self.omni_columns].to_numpy(dtype=float)
+        start_times = self.passes.loc[pass_index, 'start_time'].to_numpy()
+        end_times = self.passes.loc[pass_index, 'end_time'].to_numpy()
+
+        # The in-pass means include both the start_time and end_time, 
+        # just like a label slice.
+        lower = np.searchsorted(omni_times, start_times, side='left')
+        upper = np.searchsorted(omni_times, end_times, side='right')
+        if np.any(upper == lower):
+            empty_passes = self.passes.loc[pass_index[upper == lower]]
+            raise ValueError(f'Sliced OMNI data with size 0 for {empty_passes.shape[0]} '
+                             f'passes.\n{empty_passes.iloc[0]}')
+        
+        cumulative_sums, cumulative_counts = _cumulative_sums(omni_values)
+        self.passes.loc[pass_index, self.omni_columns] = _window_means(
+            cumulative_sums, cumulative_counts, lower, upper
+            )
+        if len(self.mean_slope_windows_m) == 0:
+            return
+
+        # The slopes are calculated from the 1-minute differences between 
+        # consecutive OMNI samples, so gaps in the data are accounted for.
+        dt_minutes = np.diff(omni_times).astype('timedelta64[s]').astype(float)/60
+        slopes = np.diff(omni_values, axis=0)/dt_minutes[:, np.newaxis]
+        cumulative_slope_sums, cumulative_slope_counts = _cumulative_sums(slopes)
+
+        for slope_lag in self.mean_slope_windows_m:
+            lag_lower = np.searchsorted(omni_times, 
+                start_times - np.timedelta64(int(slope_lag*60), 's'), side='left')
+            lag_upper = np.searchsorted(omni_times, start_times, side='left')
+            slope_columns = [f'{omni_column}_{slope_lag}_m_lag' 
+                            for omni_column in self.omni_columns]
+            mean_columns = [f'{omni_column}_{slope_lag}_m_lag_mean' 
+                            for omni_column in self.omni_columns]
+            self.passes.loc[pass_index, mean_columns] = _window_means(
+                cumulative_sums, cumulative_counts, lag_lower, lag_upper
+                )
+            # A difference is in the window only if both samples are.
+            self.passes.loc[pass_index, slope_columns] = _window_means(
+                cumulative_slope_sums, cumulative_slope_counts, 
+                lag_lower, np.maximum(lag_upper-1, lag_lower)
+                )
+        return
+
+    def save(self, file_name=None, export_csv=False):
+        """
+        Saves the self.passes catalog (see load/catalog_io.py). If export_csv=True, 
+        the csv file is also saved.
         """
         if file_name is None:
             file_name = self.passes_name
-
-        save_path = pathlib.Path(config.PROJECT_DIR, '..', 'data', file_name)
-        self.passes.to_csv(save_path, index=False)
+        save_catalog(self.passes, file_name, export_csv=export_csv)
         return
 
 
+def _cumulative_sums(values):
+    """
+    The cumulative sums and counts of the finite values along the first axis, 
+    with a leading row of zeros. The sum of values[i:j] is then 
+    cumulative_sums[j] - cumulative_sums[i].
+    """
+    finite = np.isfinite(values)
+    cumulative_sums = np.zeros((values.shape[0]+1, values.shape[1]))
+    cumulative_counts = np.zeros((values.shape[0]+1, values.shape[1]), dtype=int)
+    np.cumsum(np.where(finite, values, 0), axis=0, out=cumulative_sums[1:])
+    np.cumsum(finite, axis=0, out=cumulative_counts[1:])
+    return cumulative_sums, cumulative_counts
+
+def _window_means(cumulative_sums, cumulative_counts, lower, upper):
+    """
+    The mean of the finite values in the [lower, upper) windows. Windows 
+    without finite values are NaN.
+    """
+    sums = cumulative_sums[upper] - cumulative_sums[lower]
+    counts = cumulative_counts[upper] - cumulative_counts[lower]
+    with np.errstate(invalid='ignore', divide='ignore'):
+        return np.where(counts > 0, sums/counts, np.nan)
+
+
 if __name__ == '__main__':
     passes_name = 'sampex_passes_v0.csv'
     mean_slope_windows_m = [15, 30, 60, 4*60]
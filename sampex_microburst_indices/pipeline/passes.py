@@ -1,4 +1,6 @@
 from os import name
+import argparse
+import multiprocessing
 import pathlib
 import re
 import itertools  # For debugging
@@ -7,12 +9,18 @@ from datetime import datetime
 import numpy as np
 import pandas as pd
 import progressbar
-import matplotlib.pyplot as plt  # For debugging
 
 from sampex_microburst_indices.load.sampex import Load_HILT
+from sampex_microburst_indices.load.sampex import Stream_HILT
 from sampex_microburst_indices.load.sampex import Load_Attitude
 from sampex_microburst_indices.load.sampex import yeardoy2date
+from sampex_microburst_indices.load.sampex import date2yeardoy
+from sampex_microburst_indices.load.sampex import attitude_index
+from sampex_microburst_indices.load.file_catalog import file_catalog
+from sampex_microburst_indices.load.catalog_io import save_catalog
+from sampex_microburst_indices.pipeline.checkpoints import Pass_Checkpoints
 from sampex_microburst_indices import config
+from sampex_microburst_indices import profiling
 
 
 class Passes:
@@ -20,101 +28,275 @@ class Passes:
     Loop over every State 4 HILT data file and calculate all radiation belt passes.
     A radiation belt pass is defined by L-shells as the L_range kwarg.
     """
-    def __init__(self, L_range=(4, 8)) -> None:
+    def __init__(self, L_range=(4, 8), gap_threshold_s=5*60, chunk_rows=None, 
+                incremental=False, sub_pass_bins=None) -> None:
+        """
+        A new pass starts after a gap in the L_range samples longer than gap_threshold_s.
+        If chunk_rows is not None, the HILT files are streamed in chunks of 
+        chunk_rows rows and only the samples in L_range are kept in memory.
+        If incremental=True, the passes of each day are saved to a checkpoint
+        (see pipeline/checkpoints.py) and the days whose HILT and attitude files
+        have not changed since their checkpoint was saved are not recalculated.
+        If sub_pass_bins is not None, e.g. {'L_Shell':np.arange(4, 8.1, 0.5), 
+        'MLT':np.arange(0, 25)}, the sub-pass segments of each pass in those 
+        bins are also calculated in the same loop (see sub_pass_values()).
+        """
         self.L_range = sorted(L_range)
+        self.gap_threshold_s = gap_threshold_s
+        self.chunk_rows = chunk_rows
+        self.incremental = incremental
+        self.sub_pass_bins = sub_pass_bins
+        if self.incremental:
+            self.checkpoints = Pass_Checkpoints(self.L_range, self.gap_threshold_s, 
+                                                sub_pass_bins=self.sub_pass_bins)
+        self._attitude_dates = [datetime.min]
         self.columns = ['start_time', 'end_time', 'duration_s', 'mean_MLT', 'min_MLT', 'max_MLT', 'max_att_flag']
         self.passes = pd.DataFrame(data=np.zeros((0, len(self.columns))), columns=self.columns)
+        if self.sub_pass_bins is not None:
+            self.sub_passes = self.sub_pass_values(
+                pd.DataFrame(columns=list(self.sub_pass_bins), index=pd.DatetimeIndex([])), [], []
+                )
         return
 
-    def loop(self):
+    def loop(self, workers=1):
         """
         Loads every HILT file, load and append the corresponding attitude,
-        filter by L_range, and save the passes.
+        filter by L_range, and save the passes. If workers > 1, the HILT 
+        days are grouped by attitude file and the groups are processed by 
+        a pool of worker processes.
         """
         self._get_hilt_file_dates()
-        attitude_dates = [datetime.min]
-
-        for date in progressbar.progressbar(self.hilt_dates, redirect_stdout=True):
-            # The following if statement is to be consistant with the 
-            # microburst dataset created using the 
-            # sampex_microburst_widths/microburst_id/identify_microbursts.py
-            # module.
-            if self.in_spin_time(date) or date.year == 1996:
-                continue
-            try:
+        self.hilt_dates = self._filter_dates(self.hilt_dates)
+
+        if self.incremental:
+            # Only loop over the days without a valid checkpoint.
+            checkpoints = [self.checkpoints.load(date) for date in self.hilt_dates]
+            dates = [date for date, (valid, _, _) in zip(self.hilt_dates, checkpoints) if not valid]
+        else:
+            dates = self.hilt_dates
+
+        if workers > 1:
+            self._loop_parallel(dates, workers)
+        else:
+            self._loop_days(dates, progress=True)
+
+        if self.incremental:
+            # Combine the checkpointed and new passes in date order.
+            self.passes = self.passes.iloc[:0]
+            if self.sub_pass_bins is not None:
+                self.sub_passes = self.sub_passes.iloc[:0]
+            # Reuse the valid checkpoints and only load the days that were just saved.
+            day_passes = [
+                checkpoint[1:] if checkpoint[0] else self.checkpoints.load(date)[1:]
+                for date, checkpoint in zip(self.hilt_dates, checkpoints)
+                ]
+            self._concat_passes(day_passes)
+        return
+
+    def _loop_parallel(self, dates, workers):
+        """
+        Split the dates by attitude file and process every group in a 
+        multiprocessing.Pool. Each group shares an attitude file, so it is 
+        parsed once per group instead of once per day. The groups are
+        ordered by date so the passes are in the same order as the serial loop.
+        """
+        date_groups = self._group_dates_by_attitude_file(dates)
+        passes_kwargs = {
+            'L_range':self.L_range, 'gap_threshold_s':self.gap_threshold_s, 
+            'chunk_rows':self.chunk_rows, 'incremental':self.incremental,
+            'sub_pass_bins':self.sub_pass_bins
+            }
+        args = [(passes_kwargs, group) for group in date_groups]
+
+        with multiprocessing.Pool(processes=workers) as pool:
+            group_passes = list(progressbar.progressbar(
+                pool.imap(_loop_worker, args), max_value=len(args)
+                ))
+        return self._concat_passes(group_passes)
+
+    def _group_dates_by_attitude_file(self, dates):
+        """
+        Group the dates by the attitude file that contains them. Dates without 
+        an attitude file are dropped since the serial loop skips them anyway.
+        """
+        groups = {}
+
+        for date in dates:
+            matched_file = attitude_index().find(date2yeardoy(date))
+            if matched_file is not None:
+                groups.setdefault(matched_file, []).append(date)
+        return list(groups.values())
+
+    def _loop_days(self, dates, progress=False):
+        """
+        The pass loop over a list of dates. The passes are appended to self.passes
+        and the sub-passes to self.sub_passes. Returns the (passes, sub_passes)
+        tuple, where sub_passes is None if sub_pass_bins is None.
+        """
+        day_passes = []
+
+        if progress:
+            dates = progressbar.progressbar(dates, redirect_stdout=True)
+
+        for date in dates:
+            with profiling.span('passes.day'):
+                pass_values, sub_pass_values = self._day_passes(date)
+            if self.incremental:
+                self.checkpoints.save(date, pass_values, sub_pass_values)
+            day_passes.append((pass_values, sub_pass_values))
+
+        # Concatenate the passes from all days at once. 
+        self._concat_passes(day_passes)
+        return self.passes, getattr(self, 'sub_passes', None)
+
+    def _day_passes(self, date):
+        """
+        Calculate the passes, and the sub-passes if sub_pass_bins is not None, for 
+        one day. Returns the (passes, sub_passes) tuple. The passes are None if 
+        the day is skipped and the sub_passes are None if they are not calculated.
+        """
+        try:
+            if self.chunk_rows is None:
                 self.hilt = Load_HILT(date)
-            except RuntimeError as err:
-                if 'The SAMPEX HILT data is not in order' in str(err):
-                    continue
+            else:
+                self.hilt = Stream_HILT(date, chunk_rows=self.chunk_rows, columns=[])
+        except RuntimeError as err:
+            if 'The SAMPEX HILT data is not in order' in str(err):
+                return None, None
+            else:
+                raise
+
+        if date.date() not in self._attitude_dates:
+            # Loading the attitude will load date and future dates in that file.
+            # Thus, we don't need to load the attitude data in very iteration.
+            try:
+                self.attitude = Load_Attitude(date)
+            except ValueError as err:
+                if 'A matched file not found in' in str(err):
+                    return None, None # Last few days of HILT don't have attitude data.
                 else:
                     raise
+            self._attitude_dates = set(self.attitude.attitude.index.date)
 
-            if date.date() not in attitude_dates:
-                # Loading the attitude will load date and future dates in that file.
-                # Thus, we don't need to load the attitude data in very iteration.
-                try:
-                    self.attitude = Load_Attitude(date)
-                except ValueError as err:
-                    if 'A matched file not found in' in str(err):
-                        continue # Last few days of HILT don't have attitude data.
-                    else:
-                        raise
-                attitude_dates = set(self.attitude.attitude.index.date)
-
-                if date.date() not in attitude_dates:
-                    # If this check fails again, it means that date is missing from the 
-                    # corresponding attitude data.
-                    continue
-                
+            if date.date() not in self._attitude_dates:
+                # If this check fails again, it means that date is missing from the 
+                # corresponding attitude data.
+                return None, None
             
+        if self.chunk_rows is None:
             self.merge_hilt_attitude()
+        else:
+            try:
+                self.merge_hilt_attitude_chunked()
+            except RuntimeError as err:
+                if 'The SAMPEX HILT data is not in order' in str(err):
+                    return None, None
+                else:
+                    raise
 
-            self.hilt.hilt[self.hilt.hilt['L_Shell'] < 1] = np.nan
-            self.hilt.hilt = self.hilt.hilt.dropna(subset=['L_Shell'])
+        self.hilt.hilt[self.hilt.hilt['L_Shell'] < 1] = np.nan
+        self.hilt.hilt = self.hilt.hilt.dropna(subset=['L_Shell'])
 
-            filtered_hilt, start_indices, end_indices = self.pass_times()
+        filtered_hilt, start_indices, end_indices = self.pass_times()
 
-            if filtered_hilt.shape[0] == 0:
-                continue
+        if filtered_hilt.shape[0] == 0:
+            return None, None
 
-            # This averts a crash when no attitude data is avaliable for that date.
-            # For some reason some attitude files do not cover all of the dates in the
-            # filename. For example PSSet_6sec_2004343_2005003.txt has dates 2004343
-            # (Dec 8th) through 2004365 (Dec 31st). Since this code tries to load
-            # and merge the nonexistant attitude data from Jan 1st, 2005, the L_Shells
-            # are all NaNs.
-            # if np.all(np.isnan(self.hilt.hilt['L_Shell'])) or np.any(self.hilt.hilt['L_Shell']<1):
-            #     continue
+        # This averts a crash when no attitude data is avaliable for that date.
+        # For some reason some attitude files do not cover all of the dates in the
+        # filename. For example PSSet_6sec_2004343_2005003.txt has dates 2004343
+        # (Dec 8th) through 2004365 (Dec 31st). Since this code tries to load
+        # and merge the nonexistant attitude data from Jan 1st, 2005, the L_Shells
+        # are all NaNs.
+        # if np.all(np.isnan(self.hilt.hilt['L_Shell'])) or np.any(self.hilt.hilt['L_Shell']<1):
+        #     continue
 
+        with profiling.span('passes.pass_values') as span:
             pass_values = self.pass_values(filtered_hilt, start_indices, end_indices)
-            self.passes = pd.concat([self.passes, pass_values])
-            self.passes.reset_index(inplace=True, drop=True)
-            pass
-        return
+            span.add(rows=pass_values.shape[0])
+        if self.sub_pass_bins is None:
+            return pass_values, None
+        with profiling.span('passes.sub_passes') as span:
+            sub_pass_values = self.sub_pass_values(filtered_hilt, start_indices, end_indices)
+            span.add(rows=sub_pass_values.shape[0])
+        return pass_values, sub_pass_values
+
+    def _concat_passes(self, passes_list):
+        """
+        Concatenate the list of (passes, sub_passes) tuples onto self.passes and
+        self.sub_passes. The None and empty DataFrames are skipped so they don't 
+        change the column dtypes. The sub_passes pass_index of each tuple is 
+        relative to its passes, so it is offset by the number of passes before them.
+        """
+        with profiling.span('passes.concat') as span:
+            if self.sub_pass_bins is not None:
+                offset = self.passes.shape[0]
+                sub_passes_list = []
+                for passes, sub_passes in passes_list:
+                    if sub_passes is not None:
+                        sub_passes_list.append(sub_passes.assign(
+                            pass_index=(sub_passes['pass_index'] + offset).astype(np.int32)
+                            ))
+                    if passes is not None:
+                        offset += passes.shape[0]
+                self.sub_passes = _concat_non_empty([self.sub_passes, *sub_passes_list])
+            self.passes = _concat_non_empty([self.passes, *[passes for passes, _ in passes_list]])
+            span.add(rows=self.passes.shape[0])
+        return self.passes
 
     def merge_hilt_attitude(self):
         """
         Uses pd.merge_asof to merge the attitude data onto the HILT data.
         """
-        self.hilt.hilt = pd.merge_asof(self.hilt.hilt, self.attitude.attitude, 
-                                left_index=True, right_index=True, 
-                                tolerance=pd.Timedelta(seconds=10),
-                                direction='nearest')
+        with profiling.span('passes.attitude_merge', rows=self.hilt.hilt.shape[0]):
+            self.hilt.hilt = pd.merge_asof(self.hilt.hilt, self.attitude.attitude, 
+                                    left_index=True, right_index=True, 
+                                    tolerance=pd.Timedelta(seconds=10),
+                                    direction='nearest')
+        return
+
+    def merge_hilt_attitude_chunked(self):
+        """
+        Stream the HILT data and use pd.merge_asof to merge the attitude data onto 
+        each chunk. Only the samples in L_range are kept so the memory use is bounded
+        by the chunk size and the time spent in the radiation belt.
+        """
+        filtered_chunks = []
+        for chunk_arrays in self.hilt.chunks():
+            with profiling.span('passes.attitude_merge', rows=chunk_arrays['Time'].shape[0]):
+                chunk = pd.DataFrame(index=pd.DatetimeIndex(chunk_arrays['Time'], name='Time'))
+                chunk = pd.merge_asof(chunk, self.attitude.attitude, 
+                                    left_index=True, right_index=True, 
+                                    tolerance=pd.Timedelta(seconds=10),
+                                    direction='nearest')
+                filtered_chunks.append(chunk[
+                    (chunk['L_Shell'] >= self.L_range[0]) &
+                    (chunk['L_Shell'] <= self.L_range[1])
+                    ])
+        if len(filtered_chunks) == 0:
+            self.hilt.hilt = pd.DataFrame(columns=self.attitude.attitude.columns, 
+                                        index=pd.DatetimeIndex([], name='Time'))
+        else:
+            self.hilt.hilt = pd.concat(filtered_chunks)
         return
 
-    def pass_times(self, gap_threshold_s=5*60):
+    def pass_times(self, gap_threshold_s=None):
         """
         Calculate radiation belt passes by filtering by the L_Shell variable.
+        If gap_threshold_s is None, self.gap_threshold_s is used.
         """
-        filtered_hilt = self.hilt.hilt[
-            (self.hilt.hilt['L_Shell'] >= self.L_range[0]) &
-            (self.hilt.hilt['L_Shell'] <= self.L_range[1])
-            ]
-        # Identify all of the start and end intervals.
-        dt = (filtered_hilt.index[1:] - filtered_hilt.index[:-1]).total_seconds()
-        gaps = np.where(dt > gap_threshold_s)[0]
-        start_indices = np.concatenate(([0], gaps+1))
-        end_indices = np.concatenate((gaps, [filtered_hilt.shape[0]-1] ))
+        if gap_threshold_s is None:
+            gap_threshold_s = self.gap_threshold_s
+        with profiling.span('passes.segment', rows=self.hilt.hilt.shape[0]):
+            filtered_hilt = self.hilt.hilt[
+                (self.hilt.hilt['L_Shell'] >= self.L_range[0]) &
+                (self.hilt.hilt['L_Shell'] <= self.L_range[1])
+                ]
+            # Identify all of the start and end intervals.
+            dt = (filtered_hilt.index[1:] - filtered_hilt.index[:-1]).total_seconds()
+            gaps = np.where(dt > gap_threshold_s)[0]
+            start_indices = np.concatenate(([0], gaps+1))
+            end_indices = np.concatenate((gaps, [filtered_hilt.shape[0]-1] ))
         return filtered_hilt, start_indices, end_indices
 
 
@@ -122,35 +304,46 @@ class Passes:
         """
         Given the start and end indices of a HILT dataframe, calculate the start and
         end times, duration, mean MLT and maximum attitude flag for each radiation
-        belt pass.
+        belt pass. The statistics of all passes are calculated at once with the 
+        numpy reduceat methods over the [start_index, end_index) segments.
         """
-        pass_values = pd.DataFrame(data={col:np.array([], dtype=object)
-            for col in self.columns})
+        times = hilt_df.index.to_numpy()
+        start_indices, end_indices, duration_s = self._long_passes(times, start_indices, end_indices)
+
+        if start_indices.shape[0] == 0:
+            return pd.DataFrame(data={col:np.array([], dtype=object) for col in self.columns})
+
+        # Reduce over the interleaved [start_0, end_0, start_1, end_1, ...] indices
+        # and keep every other value, the [start_i, end_i) segments. The fmin and fmax 
+        # functions, and the finite value counts, ignore NaNs just like pandas.
+        segment_indices = np.column_stack((start_indices, end_indices)).ravel()
+        mlt = hilt_df['MLT'].to_numpy(dtype=float)
+        finite_mlt = np.isfinite(mlt)
+        mlt_sums = np.add.reduceat(np.where(finite_mlt, mlt, 0), segment_indices)[::2]
+        mlt_counts = np.add.reduceat(finite_mlt, segment_indices)[::2]
+        with np.errstate(invalid='ignore', divide='ignore'):
+            mean_mlt = np.where(mlt_counts > 0, mlt_sums/mlt_counts, np.nan)
+
+        pass_values = pd.DataFrame(data={
+            'start_time':times[start_indices], 'end_time':times[end_indices], 
+            'duration_s':duration_s,
+            'mean_MLT':mean_mlt,
+            'min_MLT':np.fmin.reduceat(mlt, segment_indices)[::2],
+            'max_MLT':np.fmax.reduceat(mlt, segment_indices)[::2],
+            'max_att_flag':np.fmax.reduceat(hilt_df['Att_Flag'].to_numpy(), segment_indices)[::2]
+            })
 
         if debug:
+            # Not imported at the top so that the worker processes don't import matplotlib.
+            import matplotlib.pyplot as plt
+
             colors = ['r', 'g', 'b']
             color_cycler = itertools.cycle(colors)
             ax = plt.subplot()
 
-        for i, (start_index, end_index) in enumerate(zip(start_indices, end_indices)):            
-            start_time = hilt_df.index[start_index]
-            end_time = hilt_df.index[end_index]
-            duration_s = (end_time-start_time).total_seconds()
-
-            if duration_s < 60:
-                continue
-
-            df = pd.DataFrame(index=[0],
-                data={'start_time':start_time, 'end_time':end_time, 'duration_s':duration_s,
-                'mean_MLT':hilt_df["MLT"][start_index:end_index].mean(),
-                'min_MLT':hilt_df["MLT"][start_index:end_index].min(),
-                'max_MLT':hilt_df["MLT"][start_index:end_index].max(),
-                'max_att_flag':hilt_df["Att_Flag"][start_index:end_index].max()}
-                )
-            pass_values = pd.concat([pass_values, df])
-
-
-            if debug:
+            for start_index, end_index, duration in zip(start_indices, end_indices, duration_s):
+                start_time = hilt_df.index[start_index]
+                end_time = hilt_df.index[end_index]
                 ax.scatter(hilt_df.index[start_index:end_index], 
                             hilt_df.L_Shell[start_index:end_index],
                             c=next(color_cycler))
@@ -158,30 +351,105 @@ class Passes:
                 print(f'Pass: {start_time}-{end_time} |',
                     f'L={round(hilt_df["L_Shell"][start_index], 1)}-{round(hilt_df.loc[end_time, "L_Shell"],1)} |',
                     f'MLT={round(hilt_df["MLT"][start_index], 1)}-{round(hilt_df.loc[end_time, "MLT"],1)} |',
-                    f'duration={round(duration_s/60)}'
+                    f'duration={round(duration/60)}'
                     )
-
-            # TODO: Add a minimum allowable pass time duration (1 minute)?
-        if debug:
             plt.show()
         return pass_values
 
-    def save_passes(self, file_name):
+    def sub_pass_values(self, hilt_df, start_indices, end_indices):
+        """
+        Split each pass into the segments of consecutive samples in the same
+        self.sub_pass_bins cell, e.g. the same L_Shell and MLT bins. Each segment 
+        lasts from its first sample to the first sample after it, so the exposure_s
+        of the segments adds up to the pass duration_s. The segments with samples 
+        outside of the bins are dropped.
+
+        Returns a DataFrame with the segment start_time, end_time, pass_index
+        (int32, the row of the segment's pass in the passes), exposure_s (float32), 
+        and the {column}_bin (int16) bin indices of each sub_pass_bins column.
+        """
+        times = hilt_df.index.to_numpy()
+        start_indices, end_indices, _ = self._long_passes(times, start_indices, end_indices)
+
+        # The sample indices in every pass's [start_index, end_index) range.
+        lengths = end_indices - start_indices
+        pass_ids = np.repeat(np.arange(lengths.shape[0]), lengths)
+        rows = np.arange(lengths.sum()) + np.repeat(start_indices - np.cumsum(lengths) + lengths, lengths)
+
+        # The bin indices of every sample. Like np.histogram, the last bin includes its upper edge.
+        bin_indices = {}
+        in_bins = np.ones(rows.shape[0], dtype=bool)
+        for column, edges in self.sub_pass_bins.items():
+            values = hilt_df[column].to_numpy(dtype=float)[rows]
+            i = np.searchsorted(edges, values, side='right') - 1
+            i[values == edges[-1]] = len(edges) - 2
+            in_bins &= (i >= 0) & (i < len(edges) - 1)
+            bin_indices[column] = i
+        bin_indices = {column:np.where(in_bins, i, -1) for column, i in bin_indices.items()}
+
+        # A new segment starts at the start of each pass and when any bin changes.
+        new_segment = np.ones(rows.shape[0], dtype=bool)
+        new_segment[1:] = pass_ids[1:] != pass_ids[:-1]
+        for i in bin_indices.values():
+            new_segment[1:] |= i[1:] != i[:-1]
+        segment_starts = np.where(new_segment)[0]
+        segment_ends = np.append(segment_starts[1:], rows.shape[0]) - 1
+
+        keep = in_bins[segment_starts]
+        segment_start_times = times[rows[segment_starts[keep]]]
+        segment_end_times = times[rows[segment_ends[keep]] + 1]
+        sub_passes = pd.DataFrame(data={
+            'start_time':segment_start_times, 'end_time':segment_end_times,
+            'pass_index':pass_ids[segment_starts[keep]].astype(np.int32),
+            'exposure_s':((segment_end_times - segment_start_times)/np.timedelta64(1, 's')).astype(np.float32),
+            **{f'{column}_bin':i[segment_starts[keep]].astype(np.int16) 
+               for column, i in bin_indices.items()}
+            })
+        return sub_passes
+
+    def _long_passes(self, times, start_indices, end_indices):
+        """
+        Keep the passes that last at least a minute. Returns the start_indices, 
+        end_indices, and the duration in seconds of the long passes.
+        """
+        start_indices = np.asarray(start_indices, dtype=int)
+        end_indices = np.asarray(end_indices, dtype=int)
+        # Truncate to microseconds, like pd.Timedelta.total_seconds().
+        duration_s = (
+            (times[end_indices] - times[start_indices]).astype('timedelta64[us]')/np.timedelta64(1, 's')
+            )
+        # TODO: Add a minimum allowable pass time duration (1 minute)?
+        long_passes = duration_s >= 60
+        return start_indices[long_passes], end_indices[long_passes], duration_s[long_passes]
+
+    def save_sub_passes(self, file_name, export_csv=False):
         """
-        Saves the csv of the pass times to the config.PROJECT_DIR/../data/ directory.
+        Saves the sub-pass catalog, with the sub_pass_bins edges in its attrs, to 
+        the config.PROJECT_DIR/../data/ directory (see load/catalog_io.py).
         """
-        save_path = pathlib.Path(config.PROJECT_DIR, '..', 'data', file_name)
-        self.passes.to_csv(save_path, index=False)
+        sub_passes = self.sub_passes.copy()
+        sub_passes.attrs = {f'{column}_edges':np.asarray(edges) 
+                            for column, edges in self.sub_pass_bins.items()}
+        save_catalog(sub_passes, file_name, export_csv=export_csv)
+        return
+
+    def save_passes(self, file_name, export_csv=False):
+        """
+        Saves the pass times catalog to the config.PROJECT_DIR/../data/ directory
+        (see load/catalog_io.py). If export_csv=True, the csv file is also saved.
+        """
+        save_catalog(self.passes, file_name, export_csv=export_csv)
         return
 
 
     def _get_hilt_file_paths(self):
         """
-        Search for and return all HILT files matching 'hhrr*.txt*' in the 
+        Use the file catalog to find all HILT files matching 'hhrr*.txt*' in the 
         config.SAMPEX_DIR/hilt/State4/ directory.
         """
-        hilt_file_paths_gen = pathlib.Path(config.SAMPEX_DIR, 'hilt', 'State4').rglob('hhrr*.txt*')
-        self.hilt_file_paths = sorted(hilt_file_paths_gen)
+        self.hilt_file_paths = [
+            path for path in file_catalog('hilt').paths('State4') if '.txt' in path.name
+            ]
         if len(self.hilt_file_paths) == 0:
             raise FileNotFoundError(f'No HILT files found in {config.SAMPEX_DIR}.')
         return self.hilt_file_paths
@@ -197,39 +465,102 @@ class Passes:
         self.hilt_dates = [yeardoy2date(t) for t in date_strings]
         return self.hilt_dates
 
+    def _filter_dates(self, dates):
+        """
+        Remove the dates in the spin times and in 1996. This is to be consistant
+        with the microburst dataset created using the 
+        sampex_microburst_widths/microburst_id/identify_microbursts.py
+        module.
+        """
+        dates = np.array(dates, dtype='datetime64[ns]')
+        years = dates.astype('datetime64[Y]').astype(int) + 1970
+        keep = ~self.in_spin_time(dates) & (years != 1996)
+        return [pd.Timestamp(date).to_pydatetime() for date in dates[keep]]
+
     def _load_spin_times(self):
         """
         Load the spin_times.csv file that was used in the sampex_microburst_widths project.
         This is purely for consistency with the microburst dataset.
         """
         spin_times_path = pathlib.Path(config.PROJECT_DIR, '..', 'data', 'spin_times.csv')
-        self.spin_times = pd.read_csv(spin_times_path, parse_dates=[0,1])
+        self.spin_times = Spin_Times(spin_times_path)
         return
 
     def in_spin_time(self, date):
         """
-        Check if date is contained between any of the start and end dates in spin_times.csv.
+        Check if date, or an array of dates, is contained between any of the start 
+        and end dates in spin_times.csv.
         """
         if not hasattr(self, 'spin_times'):
             self._load_spin_times()
-        
-        start_diff = np.array(
-            [(date - start).total_seconds() for start in self.spin_times.loc[:, 'start']]
-            )
-        end_diff = np.array(
-            [(date - end).total_seconds() for end in self.spin_times.loc[:, 'end']]
-            )
-        in_between = np.where((start_diff >=0) & (end_diff <= 0))[0]
+        return self.spin_times.contains(date)
 
-        if len(in_between) == 0:
-            return False
-        elif len(in_between) == 1:
-            return True
-        else:
-            raise ValueError('Not supposed to get here.')
+
+class Spin_Times:
+    def __init__(self, spin_times_path):
+        """
+        A sorted interval index of the spin times in the spin_times_path csv file. 
+        The intervals are sorted by their start times, and the running maximum of 
+        the end times handles any overlapping intervals.
+        """
+        spin_times = pd.read_csv(spin_times_path, parse_dates=[0,1])
+        spin_times = spin_times.sort_values('start')
+        self.start_times = spin_times['start'].to_numpy(dtype='datetime64[ns]')
+        self.max_end_times = np.maximum.accumulate(spin_times['end'].to_numpy(dtype='datetime64[ns]'))
+        return
+
+    def contains(self, dates):
+        """
+        Check if the dates are in any of the spin time intervals, including the
+        start and end times. Returns a bool if dates is a scalar, otherwise an array.
+        """
+        scalar = np.ndim(dates) == 0
+        dates = np.atleast_1d(np.array(dates, dtype='datetime64[ns]'))
+        # The last interval that starts on or before each date.
+        i = np.searchsorted(self.start_times, dates, side='right') - 1
+        in_spin_time = (i >= 0) & (dates <= self.max_end_times[np.maximum(i, 0)])
+        if scalar:
+            return bool(in_spin_time[0])
+        return in_spin_time
+
+
+def _loop_worker(args):
+    """
+    The multiprocessing worker that calculates the passes for a group of dates.
+    """
+    passes_kwargs, dates = args
+    return Passes(**passes_kwargs)._loop_days(dates)
+
+def _concat_non_empty(dfs):
+    """
+    Concatenate the DataFrames that are not None or empty. If they are all 
+    empty, the first DataFrame is returned.
+    """
+    non_empty = [df for df in dfs if (df is not None) and (df.shape[0] > 0)]
+    if len(non_empty) == 0:
+        return dfs[0]
+    return pd.concat(non_empty).reset_index(drop=True)
 
 
 if __name__ == '__main__':
-    p = Passes()
-    p.loop()
-    p.save_passes('sampex_passes_v0.csv')
\ No newline at end of file
+    parser = argparse.ArgumentParser(description='Calculate the SAMPEX radiation belt passes.')
+    parser.add_argument('--workers', type=int, default=1, 
+                        help='The number of worker processes.')
+    parser.add_argument('--chunk_rows', type=int, default=None, 
+                        help='Stream the HILT files in chunks of this many rows.')
+    parser.add_argument('--incremental', action='store_true', 
+                        help='Only recalculate the days whose input files changed.')
+    parser.add_argument('--sub_passes', action='store_true', 
+                        help='Also save the sub-pass segments in 0.5 L and 1 MLT bins.')
+    args = parser.parse_args()
+
+    if args.sub_passes:
+        sub_pass_bins = {'L_Shell':np.arange(4, 8.1, 0.5), 'MLT':np.arange(0, 25)}
+    else:
+        sub_pass_bins = None
+    p = Passes(chunk_rows=args.chunk_rows, incremental=args.incremental, 
+               sub_pass_bins=sub_pass_bins)
+    p.loop(workers=args.workers)
+    p.save_passes('sampex_passes_v0.csv')
+    if args.sub_passes:
+        p.save_sub_passes('sampex_sub_passes_v0.csv')
\ No newline at end of file
@@ -1,25 +1,308 @@
 """
-A script that shows you how to run the data processing pipeline.
+The data processing pipeline. The three stages,
+    1. passes: Calculate the start and end times for all radiation belt passes,
+    2. microbursts: Merge the microburst counts and durations onto the passes,
+    3. omni: Merge the OMNI indices onto the passes,
+are modeled as a dependency graph. Each stage's output is cached in the
+config.PROJECT_DIR/../data/cache/pipeline/ directory and is keyed by a hash of
+the stage's parameters, input file fingerprints, and the keys of the stages it
+depends on. Thus, a stage is only rerun if its inputs or parameters changed. The
+DataFrames are passed between the stages in memory and only the final output is
+saved to the passes catalog (see load/catalog_io.py).
+
+To run the pipeline: python3 -m sampex_microburst_indices run
+To also profile it (see profiling.py): python3 -m sampex_microburst_indices run --profile --trace trace.json
 """
+import argparse
+import pathlib
+import sys
+import time
+
+import numpy as np
+import pandas as pd
+
+from sampex_microburst_indices import config
+from sampex_microburst_indices import profiling
+from sampex_microburst_indices.load import cache
+from sampex_microburst_indices.load import omni
+from sampex_microburst_indices.load.file_catalog import file_catalog
+from sampex_microburst_indices.load.catalog_io import binary_catalog
+from sampex_microburst_indices.load.catalog_io import save_catalog
+from sampex_microburst_indices.pipeline.checkpoints import hash_key
+from sampex_microburst_indices.pipeline.checkpoints import save_pickle
+from sampex_microburst_indices.pipeline.passes import Passes
+from sampex_microburst_indices.pipeline.merge_microbursts import Merge_Microbursts
+from sampex_microburst_indices.pipeline.merge_omni import Merge_OMNI
+
+
+class Stage:
+    def __init__(self, name, function, dependencies=(), params=None, options=None,
+                inputs=None) -> None:
+        """
+        A pipeline stage.
+
+        Parameters
+        ----------
+        name: str
+            The stage name.
+        function: callable
+            Called as function(*dependency_outputs, **params, **options) and
+            returns the stage's output DataFrame.
+        dependencies: list
+            The names of the stages whose outputs are passed to function.
+        params: dict
+            The parameters that change the stage's output. They are part of the cache key.
+        options: dict
+            The parameters that do not change the output, e.g. the number of workers.
+        inputs: callable
+            Returns the list of the stage's input file paths. Their fingerprints
+            are part of the cache key.
+        """
+        self.name = name
+        self.function = function
+        self.dependencies = list(dependencies)
+        self.params = {} if params is None else params
+        self.options = {} if options is None else options
+        self.inputs = inputs
+        return
+
+    def key(self, dependency_keys):
+        """
+        The hash of the stage's parameters, input file fingerprints, and dependency keys.
+        """
+        input_fingerprints = [] if self.inputs is None else [
+            cache.file_fingerprint(path) for path in self.inputs()
+            ]
+        return hash_key(self.name, sorted(self.params.items()), input_fingerprints,
+                        dependency_keys)
+
+
+class Pipeline:
+    def __init__(self, use_cache=True, prune_cache=True) -> None:
+        """
+        A dependency graph of Stages. If use_cache=True, the valid cached stage
+        outputs are loaded instead of rerunning the stages. If prune_cache=True,
+        a stage's older cached outputs are removed when its new output is cached,
+        otherwise the outputs for every set of parameters are kept, e.g. for a
+        parameter sweep.
+        """
+        self.use_cache = use_cache
+        self.prune_cache = prune_cache
+        self.stages = {}
+        self.report = []
+        return
+
+    def add(self, stage):
+        """
+        Add a stage. Its dependencies must already be in the pipeline.
+        """
+        missing = [name for name in stage.dependencies if name not in self.stages]
+        if missing:
+            raise ValueError(f'The {stage.name} stage depends on the {missing} stages '
+                             f'that are not in the pipeline.')
+        self.stages[stage.name] = stage
+        return stage
+
+    def run(self, target=None):
+        """
+        Run the target stage, or the last stage if target is None, and the stages
+        it depends on. Returns the target stage's output DataFrame.
+        """
+        if target is None:
+            target = list(self.stages)[-1]
+        self.report = []
+        self.outputs = {}
+        self.keys = {}
+        for name in self._order(target):
+            self._run_stage(self.stages[name])
+        return self.outputs[target]
+
+    def print_report(self):
+        """
+        Print the per-stage run time and the increase in the peak memory of this
+        process and of its worker processes.
+        """
+        print(f'{"stage":<15}{"status":<10}{"time [s]":>10}{"peak memory increase [MB]":>28}'
+              f'{"workers [MB]":>15}')
+        for row in self.report:
+            print(f'{row["stage"]:<15}{row["status"]:<10}{row["time_s"]:>10.2f}'
+                  f'{row["peak_memory_increase_mb"]:>28.1f}{row["worker_peak_memory_increase_mb"]:>15.1f}')
+        return
+
+    def _order(self, target):
+        """
+        The stages that target depends on, and target, in dependency order.
+        """
+        order = []
+        def visit(name):
+            if name in order:
+                return
+            for dependency in self.stages[name].dependencies:
+                visit(dependency)
+            order.append(name)
+        visit(target)
+        return order
+
+    def _run_stage(self, stage):
+        """
+        Load the stage's output from the cache if it is valid, otherwise run the
+        stage and cache its output. The peak memory increase is how much the
+        stage raised the maximum resident set size of this process, so it is 0 if
+        the stage stayed below the peak of an earlier stage. The worker increase
+        is the same for the largest worker process that finished in the stage.
+        """
+        start_time = time.time()
+        start_memory = _peak_memory_mb()
+        with profiling.span(f'pipeline.{stage.name}') as span:
+            key = stage.key([self.keys[name] for name in stage.dependencies])
+            cache_path = pathlib.Path(cache.cache_dir(), 'pipeline', f'{stage.name}.{key}.pkl')
+
+            if self.use_cache and cache_path.exists():
+                output = pd.read_pickle(cache_path)
+                status = 'cached'
+            else:
+                output = stage.function(
+                    *[self.outputs[name] for name in stage.dependencies],
+                    **stage.params, **stage.options
+                    )
+                status = 'run'
+                if self.use_cache and self.prune_cache:
+                    for stale_path in cache_path.parent.glob(f'{stage.name}.*.pkl'):
+                        stale_path.unlink()
+                if self.use_cache:
+                    save_pickle(cache_path, output)
+            span.add(rows=output.shape[0])
+
+        self.outputs[stage.name] = output
+        self.keys[stage.name] = key
+        end_memory = _peak_memory_mb()
+        self.report.append({
+            'stage':stage.name, 'status':status, 'time_s':time.time()-start_time,
+            'peak_memory_increase_mb':end_memory[0] - start_memory[0],
+            'worker_peak_memory_increase_mb':end_memory[1] - start_memory[1]
+            })
+        return output
+
+
+def _peak_memory_mb():
+    """
+    The maximum resident set sizes, in MB, of this process and of its largest
+    finished child process. ru_maxrss is in kilobytes on Linux and in bytes on
+    macOS. The resource module is Unix only, so they are NaN on Windows.
+    """
+    try:
+        import resource
+    except ImportError:
+        return np.nan, np.nan
+    scale = 1E6 if sys.platform == 'darwin' else 1E3
+    return tuple(resource.getrusage(who).ru_maxrss/scale
+                 for who in [resource.RUSAGE_SELF, resource.RUSAGE_CHILDREN])
+
+def _normalize_L_range(L_range):
+    """
+    The sorted L_range with the whole numbers as ints, so (4.0, 8.0) from the 
+    command line and the default (4, 8) have the same stage keys and checkpoints.
+    """
+    return tuple(int(L) if float(L).is_integer() else float(L) for L in sorted(L_range))
+
+def _run_passes(L_range, gap_threshold_s, workers=1, chunk_rows=None):
+    p = Passes(L_range=L_range, gap_threshold_s=gap_threshold_s, chunk_rows=chunk_rows)
+    p.loop(workers=workers)
+    return p.passes
+
+def _run_microbursts(passes, passes_name, microburst_name):
+    m = Merge_Microbursts(passes_name, microburst_name, passes=passes)
+    m.merge()
+    return m.passes
+
+def _run_omni(passes, passes_name, omni_columns, mean_slope_windows_m):
+    m = Merge_OMNI(passes_name, omni_columns=omni_columns,
+                   mean_slope_windows_m=mean_slope_windows_m, passes=passes)
+    m.merge()
+    return m.passes
+
+def _passes_inputs():
+    """
+    The HILT, attitude, and spin time files that the passes depend on.
+    """
+    return [
+        *[path for path in file_catalog('hilt').paths('State4') if '.txt' in path.name],
+        *file_catalog('attitude').paths(),
+        pathlib.Path(config.PROJECT_DIR, '..', 'data', 'spin_times.csv')
+        ]
+
+def build_pipeline(passes_name='sampex_passes_v0.csv', microburst_name='microburst_catalog.csv',
+                   L_range=(4, 8), gap_threshold_s=5*60, omni_columns=None,
+                   mean_slope_windows_m=None, workers=1, chunk_rows=None, use_cache=True,
+                   prune_cache=True):
+    """
+    Build the passes -> microbursts -> omni pipeline.
+    """
+    pipeline = Pipeline(use_cache=use_cache, prune_cache=prune_cache)
+    pipeline.add(Stage(
+        'passes', _run_passes,
+        params={'L_range':_normalize_L_range(L_range), 'gap_threshold_s':gap_threshold_s},
+        options={'workers':workers, 'chunk_rows':chunk_rows},
+        inputs=_passes_inputs
+        ))
+    pipeline.add(Stage(
+        'microbursts', _run_microbursts, dependencies=['passes'],
+        params={'passes_name':passes_name, 'microburst_name':microburst_name},
+        inputs=lambda: [binary_catalog(microburst_name, index_col=0, parse_dates=True)]
+        ))
+    pipeline.add(Stage(
+        'omni', _run_omni, dependencies=['microbursts'],
+        params={'passes_name':passes_name, 'omni_columns':omni_columns,
+                'mean_slope_windows_m':mean_slope_windows_m},
+        inputs=omni.find_omni_files
+        ))
+    return pipeline
 
-import passes
-import merge_microbursts
-import merge_omni
+def main(argv=None):
+    parser = argparse.ArgumentParser(
+        prog='python3 -m sampex_microburst_indices run',
+        description='Run the SAMPEX microburst indices data processing pipeline.'
+        )
+    parser.add_argument('--passes_name', default='sampex_passes_v0.csv',
+                        help='The output catalog file name in the data/ directory.')
+    parser.add_argument('--microburst_name', default='microburst_catalog.csv',
+                        help='The microburst catalog file name in the data/ directory.')
+    parser.add_argument('--L_range', type=float, nargs=2, default=(4, 8))
+    parser.add_argument('--mean_slope_windows_m', type=int, nargs='*', default=None,
+                        help='The OMNI lag windows, in minutes.')
+    parser.add_argument('--target', choices=['passes', 'microbursts', 'omni'], default='omni',
+                        help='The last stage to run.')
+    parser.add_argument('--workers', type=int, default=1,
+                        help='The number of processes to calculate the passes.')
+    parser.add_argument('--chunk_rows', type=int, default=None,
+                        help='Stream the HILT files in chunks of this many rows.')
+    parser.add_argument('--no_cache', action='store_true',
+                        help="Rerun every stage and don't cache the stage outputs.")
+    parser.add_argument('--csv', action='store_true',
+                        help='Also export the output catalog to a csv file.')
+    parser.add_argument('--profile', action='store_true',
+                        help='Print the time, bytes read, and rows of the instrumented spans.')
+    parser.add_argument('--trace', default=None,
+                        help='Save the instrumented spans to this Chrome trace JSON file.')
+    args = parser.parse_args(argv)
 
-passes_name = 'sampex_passes_v0.csv'
-microburst_name = 'microburst_catalog.csv'
+    if args.profile or (args.trace is not None):
+        profiling.enable()
 
-# Step 1: Calculate the start and end times for all radiation belt passes.
-p = passes.Passes()
-p.loop()
-p.save_passes(passes_name)
+    pipeline = build_pipeline(
+        passes_name=args.passes_name, microburst_name=args.microburst_name,
+        L_range=args.L_range, mean_slope_windows_m=args.mean_slope_windows_m,
+        workers=args.workers, chunk_rows=args.chunk_rows, use_cache=not args.no_cache
+        )
+    passes = pipeline.run(target=args.target)
+    save_catalog(passes, args.passes_name, export_csv=args.csv)
+    pipeline.print_report()
+    if args.profile:
+        print(profiling.report().to_string())
+    if args.trace is not None:
+        profiling.save_trace(args.trace)
+    return
 
-# Step 2: Merge microbursts 
-m = merge_microbursts.Merge_Microbursts(passes_name, microburst_name)
-m.merge()
-m.save()
 
-# Step3: Merge the indices.
-m = merge_omni.Merge_OMNI(passes_name)
-m.merge()
-m.save()
\ No newline at end of file
+if __name__ == '__main__':
+    main()
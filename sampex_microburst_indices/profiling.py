@@ -0,0 +1,227 @@
+"""
+A lightweight instrumentation layer that records the wall time, bytes read, and
+rows produced by named spans of the loaders and the pipeline, e.g. the HILT file
+lookup, parse, and time conversion, the attitude merge, the pass segmenting, and
+the catalog writes.
+
+The instrumentation is off by default. Then span() returns a shared no-op span,
+so an instrumented block costs one function call. To profile a run:
+
+    from sampex_microburst_indices import profiling
+    profiling.enable()
+    ...
+    print(profiling.report())           # The time, bytes, and rows per span name.
+    profiling.save_trace('trace.json')  # Open in chrome://tracing or ui.perfetto.dev.
+
+or run the pipeline with the --profile and --trace options (see pipeline/pipeline.py).
+The spans recorded by multiprocessing workers are spooled to files in a temporary
+directory and are collected by records(). Setting the SAMPEX_PROFILE_DIR
+environment variable to a directory also enables the instrumentation in that
+process and spools the spans to that directory.
+"""
+import atexit
+import json
+import multiprocessing
+import os
+import pathlib
+import shutil
+import tempfile
+import threading
+import time
+
+import pandas as pd
+
+_enabled = False
+_spool_dir = None
+_records = []
+_stack = []
+_lock = threading.Lock()
+
+
+class _Span:
+    __slots__ = ('name', 'bytes_read', 'rows', 'start_ns', 'child_ns')
+
+    def __init__(self, name, bytes_read=0, rows=0) -> None:
+        self.name = name
+        self.bytes_read = int(bytes_read)
+        self.rows = int(rows)
+        self.child_ns = 0
+        return
+
+    def add(self, bytes_read=0, rows=0):
+        """
+        Add to the bytes read and rows produced by the span.
+        """
+        self.bytes_read += int(bytes_read)
+        self.rows += int(rows)
+        return
+
+    def __enter__(self):
+        _stack.append(self)
+        self.start_ns = time.perf_counter_ns()
+        return self
+
+    def __exit__(self, *exc_info):
+        duration_ns = time.perf_counter_ns() - self.start_ns
+        _stack.pop()
+        if _stack:
+            _stack[-1].child_ns += duration_ns
+        record = {
+            'name':self.name, 'start_ns':self.start_ns, 'duration_ns':duration_ns,
+            'self_ns':duration_ns - self.child_ns, 'bytes_read':self.bytes_read,
+            'rows':self.rows, 'depth':len(_stack), 'pid':os.getpid(),
+            'tid':threading.get_ident()
+            }
+        with _lock:
+            _records.append(record)
+        if (not _stack) and (multiprocessing.parent_process() is not None):
+            # The worker processes can be terminated without running any exit
+            # handlers, so they spool their spans after every top level span.
+            _spool()
+        return False
+
+
+class _Null_Span:
+    __slots__ = ()
+
+    def add(self, bytes_read=0, rows=0):
+        return
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        return False
+
+_null_span = _Null_Span()
+
+
+def span(name, bytes_read=0, rows=0):
+    """
+    The context manager that records the name span. The bytes read and rows
+    produced can be passed here, or added with the span's add() method.
+    """
+    if not _enabled:
+        return _null_span
+    return _Span(name, bytes_read=bytes_read, rows=rows)
+
+def enabled():
+    """
+    True if the instrumentation is enabled.
+    """
+    return _enabled
+
+def enable(spool_dir=None):
+    """
+    Enable the instrumentation and clear the recorded spans. The spans of the
+    worker processes are spooled to spool_dir or, if spool_dir is None, to a new
+    temporary directory that is removed when the process exits.
+    """
+    global _enabled, _spool_dir
+    if spool_dir is None:
+        _spool_dir = pathlib.Path(tempfile.mkdtemp(prefix='sampex_profile_'))
+        atexit.register(shutil.rmtree, _spool_dir, ignore_errors=True)
+    else:
+        _spool_dir = pathlib.Path(spool_dir)
+        _spool_dir.mkdir(parents=True, exist_ok=True)
+    # The environment variable enables the instrumentation in the spawned workers.
+    os.environ['SAMPEX_PROFILE_DIR'] = str(_spool_dir)
+    _enabled = True
+    clear()
+    return
+
+def disable():
+    """
+    Disable the instrumentation. The recorded spans are kept.
+    """
+    global _enabled
+    _enabled = False
+    os.environ.pop('SAMPEX_PROFILE_DIR', None)
+    return
+
+def clear():
+    """
+    Remove the recorded and spooled spans.
+    """
+    with _lock:
+        _records.clear()
+    if _spool_dir is not None:
+        for path in _spool_dir.glob('spans.*.jsonl'):
+            path.unlink()
+    return
+
+def records():
+    """
+    The list of the span records of this process and its worker processes.
+    """
+    spooled = []
+    if _spool_dir is not None:
+        for path in sorted(_spool_dir.glob('spans.*.jsonl')):
+            with open(path) as f:
+                spooled.extend(json.loads(line) for line in f)
+    with _lock:
+        return spooled + list(_records)
+
+def report():
+    """
+    The DataFrame of the span count, total and self wall times, bytes read, and
+    rows produced per span name, sorted by the total self time. The self time
+    excludes the time in the nested spans, so the self times add up to the
+    instrumented time. The worker process times are added, so they can exceed
+    the wall time of a parallel run.
+    """
+    columns = ['count', 'total_s', 'self_s', 'mean_s', 'max_s', 'bytes_read', 'rows']
+    spans = pd.DataFrame(records())
+    if spans.shape[0] == 0:
+        return pd.DataFrame(columns=columns)
+    grouped = spans.groupby('name')
+    summary = pd.DataFrame({
+        'count':grouped.size(),
+        'total_s':grouped['duration_ns'].sum()/1E9,
+        'self_s':grouped['self_ns'].sum()/1E9,
+        'mean_s':grouped['duration_ns'].mean()/1E9,
+        'max_s':grouped['duration_ns'].max()/1E9,
+        'bytes_read':grouped['bytes_read'].sum(),
+        'rows':grouped['rows'].sum()
+        })
+    return summary.sort_values('self_s', ascending=False)[columns]
+
+def save_trace(path):
+    """
+    Save the spans to path in the Chrome trace event JSON format, which can
+    be opened in chrome://tracing or https://ui.perfetto.dev.
+    """
+    events = [{
+        'name':record['name'], 'ph':'X', 'ts':record['start_ns']/1E3,
+        'dur':record['duration_ns']/1E3, 'pid':record['pid'], 'tid':record['tid'],
+        'args':{'bytes_read':record['bytes_read'], 'rows':record['rows']}
+        } for record in records()]
+    with open(path, 'w') as f:
+        json.dump({'traceEvents':events, 'displayTimeUnit':'ms'}, f)
+    return
+
+def _spool():
+    """
+    Append the recorded spans of this process to its spool file.
+    """
+    with _lock:
+        spans = list(_records)
+        _records.clear()
+    with open(pathlib.Path(_spool_dir, f'spans.{os.getpid()}.jsonl'), 'a') as f:
+        for record in spans:
+            f.write(json.dumps(record) + '\n')
+    return
+
+def _reset_after_fork():
+    """
+    Forget the open and recorded spans of the parent in a forked worker.
+    """
+    _stack.clear()
+    _records.clear()
+    return
+
+
+os.register_at_fork(after_in_child=_reset_after_fork)
+if os.environ.get('SAMPEX_PROFILE_DIR'):
+    _spool_dir = pathlib.Path(os.environ['SAMPEX_PROFILE_DIR'])
+    _enabled = True
@@ -0,0 +1,28 @@
+import pathlib
+import sys
+
+import pytest
+
+from sampex_microburst_indices import config
+from sampex_microburst_indices.load import file_catalog
+from sampex_microburst_indices.load import sampex
+
+# The synthetic data set generator lives with the benchmarks.
+sys.path.insert(0, str(pathlib.Path(__file__).parents[1] / 'benchmarks'))
+
+
+@pytest.fixture
+def project_dir(tmp_path, monkeypatch):
+    """
+    Point the package config at an empty tmp_path/package/ tree with the
+    tmp_path/sampex/ data directory, so the tests don't touch the real data and
+    caches. Returns the tmp_path.
+    """
+    monkeypatch.setattr(config, 'SAMPEX_DIR', tmp_path / 'sampex', raising=False)
+    monkeypatch.setattr(config, 'PROJECT_DIR', tmp_path / 'package' / 'sampex_microburst_indices',
+                        raising=False)
+    (tmp_path / 'package' / 'data').mkdir(parents=True)
+    (tmp_path / 'package' / 'sampex_microburst_indices').mkdir()
+    monkeypatch.setattr(file_catalog, '_catalogs', {})
+    monkeypatch.setattr(sampex, '_attitude_indices', {})
+    return tmp_path
@@ -0,0 +1,51 @@
+import numpy as np
+import pandas as pd
+
+from sampex_microburst_indices.load.catalog_io import catalog_path
+from sampex_microburst_indices.load.catalog_io import catalog_rows
+from sampex_microburst_indices.load.catalog_io import load_catalog
+from sampex_microburst_indices.load.catalog_io import save_catalog
+
+
+def write_passes_csv(file_name):
+    passes = pd.DataFrame(data={
+        'start_time':pd.to_datetime(['2000-06-01T01:00', '2000-06-01T02:30']),
+        'end_time':pd.to_datetime(['2000-06-01T01:10', '2000-06-01T02:45']),
+        'microburst_count':[3, 0]
+        })
+    passes.to_csv(catalog_path(file_name), index=False)
+    return passes
+
+
+def test_csv_conversion_parses_times_without_kwargs(project_dir):
+    # The first caller does not pass parse_dates, e.g. an analysis script.
+    passes = write_passes_csv('sampex_passes_v0.csv')
+    load_catalog('sampex_passes_v0.csv', columns=['microburst_count'])
+    pd.testing.assert_frame_equal(load_catalog('sampex_passes_v0.csv', parse_dates=[0, 1]), passes)
+
+def test_csv_conversion_parses_time_columns(project_dir):
+    passes = write_passes_csv('other_passes.csv')
+    pd.testing.assert_frame_equal(load_catalog('other_passes.csv'), passes)
+
+def test_microburst_catalog_time_index(project_dir):
+    microbursts = pd.DataFrame(
+        data={'fwhm':[0.1, 0.2]},
+        index=pd.DatetimeIndex(['2000-06-01T01:01', '2000-06-01T01:02'], name='dateTime')
+        )
+    microbursts.to_csv(catalog_path('microburst_catalog.csv'))
+    pd.testing.assert_frame_equal(load_catalog('microburst_catalog.csv'), microbursts)
+
+def test_catalog_without_n_rows(project_dir):
+    # The catalogs saved before the n_rows array was added.
+    passes = write_passes_csv('sampex_passes_v0.csv')
+    path = catalog_path('sampex_passes_v0.csv').with_suffix('.npz')
+    np.savez(path, columns=np.array(passes.columns, dtype=str),
+             **{f'column_{i}':passes[column].to_numpy() for i, column in enumerate(passes.columns)})
+    assert catalog_rows('sampex_passes_v0.csv') == 2
+    pd.testing.assert_frame_equal(load_catalog('sampex_passes_v0.csv'), passes)
+
+def test_export_csv_to_new_directory(project_dir):
+    passes = write_passes_csv('sampex_passes_v0.csv')
+    save_catalog(passes, 'new_dir/passes.csv', export_csv=True)
+    assert catalog_path('new_dir/passes.csv').exists()
+    pd.testing.assert_frame_equal(load_catalog('new_dir/passes.csv'), passes)
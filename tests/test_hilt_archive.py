@@ -0,0 +1,50 @@
+from datetime import datetime
+
+import numpy as np
+import pytest
+
+import synthetic
+from sampex_microburst_indices.load import hilt_archive
+from sampex_microburst_indices.load.hilt_archive import HILT_Archive
+from sampex_microburst_indices.load.sampex import Load_HILT
+
+dates = [datetime(2000, 6, 1), datetime(2000, 6, 2)]
+
+
+@pytest.fixture
+def archive(project_dir):
+    synthetic.generate(project_dir, n_days=2, microbursts_per_day=10, start_date=dates[0])
+    return HILT_Archive(archive_dir=project_dir / 'hilt_archive')
+
+
+def test_overlapping_days_are_skipped(archive):
+    archive.build(dates=[dates[0], dates[0], dates[1]])
+    archive.open()
+    assert list(archive.index['yeardoy']) == [2000153, 2000154]
+
+    counts, times = Load_HILT(dates[1]).resolve_counts_state4(as_dataframe=False)
+    archive_counts, archive_times = archive.query(times[0], times[-1])
+    np.testing.assert_array_equal(archive_counts, counts)
+    np.testing.assert_array_equal(archive_times, times)
+    assert sorted(path.name for path in archive.archive_dir.iterdir()) == [
+        'counts.dat', 'index.npz', 'times.dat']
+
+def test_failed_build_keeps_the_archive(archive, monkeypatch):
+    archive.build(dates=dates[:1])
+    def failed_load(date):
+        raise OSError('The HILT file is not readable.')
+    monkeypatch.setattr(hilt_archive, 'Load_HILT', failed_load)
+    with pytest.raises(OSError):
+        archive.build(dates=dates)
+
+    assert sorted(path.name for path in archive.archive_dir.iterdir()) == [
+        'counts.dat', 'index.npz', 'times.dat']
+    archive.open()
+    assert list(archive.index['yeardoy']) == [2000153]
+
+def test_mismatched_index(archive):
+    archive.build(dates=dates)
+    with open(archive.counts_path, 'ab') as f:
+        f.write(np.zeros(10, dtype=np.int32).tobytes())
+    with pytest.raises(ValueError):
+        archive.open()
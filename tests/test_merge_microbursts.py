@@ -0,0 +1,48 @@
+from datetime import datetime
+
+import numpy as np
+import pandas as pd
+
+import synthetic
+from sampex_microburst_indices.pipeline.merge_microbursts import Merge_Microbursts
+from sampex_microburst_indices.pipeline.passes import Passes
+
+
+def loop_merge(passes, microbursts):
+    """
+    The microbursts merged one pass at a time, like Merge_Microbursts.merge did 
+    before it was vectorized.
+    """
+    passes = passes.copy()
+    passes[['microburst_count', 'total_microburst_time', 'microburst_prob']] = np.nan
+    for i, row in passes.iterrows():
+        microburst_df = microbursts[
+            (microbursts.index > row['start_time']) &
+            (microbursts.index <= row['end_time']) 
+            ]
+        passes.loc[i, 'microburst_count'] = microburst_df.shape[0]
+        total_microburst_time = np.sum(np.abs(microburst_df['fwhm']))
+        passes.loc[i, 'total_microburst_time'] = total_microburst_time
+        passes.loc[i, 'microburst_prob'] = total_microburst_time/row['duration_s'] 
+    return passes
+
+
+def test_merge_matches_the_loop(project_dir):
+    synthetic.generate(project_dir, n_days=2, microbursts_per_day=200,
+                       start_date=datetime(2000, 6, 1))
+    passes = Passes(L_range=(4, 8))
+    passes.loop()
+    merge = Merge_Microbursts('passes.csv', 'microburst_catalog.csv', passes=passes.passes)
+    # Add passes that start and end on microburst times, the edges of the
+    # (start_time, end_time] windows.
+    edges = merge.microbursts.index[::50]
+    edge_passes = pd.DataFrame(data={
+        'start_time':edges[:-1], 'end_time':edges[1:],
+        'duration_s':(edges[1:] - edges[:-1]).total_seconds()
+        })
+    merge.passes = pd.concat([merge.passes, edge_passes], ignore_index=True)
+    expected = loop_merge(merge.passes, merge.microbursts)
+    merge.merge()
+
+    assert expected['microburst_count'].sum() > 0
+    pd.testing.assert_frame_equal(merge.passes, expected, check_dtype=False)
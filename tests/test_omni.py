@@ -0,0 +1,129 @@
+import gc
+import weakref
+from datetime import datetime
+
+import numpy as np
+import pandas as pd
+import pytest
+
+import synthetic
+from sampex_microburst_indices.load.omni import Omni
+from sampex_microburst_indices.pipeline.merge_omni import Merge_OMNI
+
+lags = [15, 30, 60, 240]
+
+
+def write_omni_years(project_dir, years):
+    """
+    Write the synthetic 1-minute OMNI files for years. Only the first and last
+    days of each year are written to keep the files small.
+    """
+    rng = np.random.default_rng(0)
+    for year in years:
+        times = pd.date_range(datetime(year, 1, 1), datetime(year+1, 1, 1), freq='1min',
+                              inclusive='left')
+        times = times[(times.dayofyear == 1) | (times.date == datetime(year, 12, 31).date())]
+        synthetic.omni_year(project_dir / 'package' / 'data' / f'omni_min{year}.asc', times, rng)
+    return
+
+def boundary_passes():
+    """
+    A pass at the start of 2000, whose lag windows reach into 1999, and a pass
+    that crosses into 2001.
+    """
+    return pd.DataFrame(data={
+        'start_time':pd.to_datetime(['2000-01-01T01:00', '2000-12-31T23:55']),
+        'end_time':pd.to_datetime(['2000-01-01T01:10', '2001-01-01T00:05']),
+        })
+
+
+def test_time_range_skips_missing_years(project_dir):
+    write_omni_years(project_dir, [2000])
+    omni = Omni(time_range=(datetime(1999, 12, 31, 22), datetime(2000, 1, 1, 2)),
+                columns=['AE']).load()
+    assert omni.index[0] == pd.Timestamp('2000-01-01')
+    assert omni.index[-1] == pd.Timestamp('2000-01-01T02:00')
+    assert omni.shape == (121, 1)
+
+def test_time_range_without_files(project_dir):
+    with pytest.raises(FileNotFoundError):
+        Omni(time_range=(datetime(2000, 1, 1), datetime(2000, 1, 2))).load()
+
+def test_merge_boundary_years(project_dir):
+    write_omni_years(project_dir, [2000])
+    merge = Merge_OMNI('passes.csv', mean_slope_windows_m=lags, passes=boundary_passes())
+    merge.merge()
+    # Only the 240 minute window of the first pass reaches into the missing 1999.
+    assert merge.passes['AE'].notna().all()
+    assert merge.passes[['AE_60_m_lag_mean', 'AE_240_m_lag_mean']].notna().all().all()
+
+def test_merge_neighbour_years_match(project_dir):
+    write_omni_years(project_dir, [1999, 2000, 2001])
+    merged = Merge_OMNI('passes.csv', mean_slope_windows_m=lags, passes=boundary_passes())
+    merged.merge()
+    (project_dir / 'package' / 'data' / 'omni_min2001.asc').unlink()
+    missing = Merge_OMNI('passes.csv', mean_slope_windows_m=lags, passes=boundary_passes())
+    missing.merge()
+    # The pass into 2001 loses its 2001 minutes but keeps its 2000 ones.
+    assert np.isfinite(missing.passes.loc[1, 'AE'])
+    pd.testing.assert_frame_equal(merged.passes.iloc[:1], missing.passes.iloc[:1])
+
+def test_time_range_frees_the_years(project_dir, monkeypatch):
+    write_omni_years(project_dir, [1999, 2000])
+    omni = Omni(time_range=(datetime(1999, 12, 31, 23, 50), datetime(2000, 1, 1, 0, 10)),
+                columns=['AE'])
+    year_buffers = []
+    alive_buffers = []
+    load_year = omni._load_year
+    def recorded_load_year(*args, **kwargs):
+        gc.collect()
+        alive_buffers.append(sum(buffer() is not None for buffer in year_buffers))
+        year_data = load_year(*args, **kwargs)
+        values = year_data['AE'].to_numpy()
+        year_buffers.append(weakref.ref(values if values.base is None else values.base))
+        return year_data
+    monkeypatch.setattr(omni, '_load_year', recorded_load_year)
+
+    data = omni.load()
+    assert data.shape == (21, 1)
+    # The partial year slices are copied, so the earlier years are freed before
+    # the next year is loaded.
+    assert alive_buffers == [0, 0]
+
+def test_merge_lag_features_match_label_slices(project_dir):
+    rng = np.random.default_rng(1)
+    times = pd.date_range(datetime(2000, 6, 1), datetime(2000, 6, 2), freq='1min', inclusive='left')
+    # Drop some minutes so the slopes are over gaps of more than one minute.
+    times = times[rng.uniform(size=times.shape[0]) > 0.2]
+    synthetic.omni_year(project_dir / 'package' / 'data' / 'omni_min2000.asc', times, rng)
+    # Half of the passes start on an OMNI minute, the edge of the lag windows.
+    start_times = pd.Timestamp('2000-06-01T04:00') + pd.to_timedelta(
+        30*np.sort(rng.integers(0, 19*60*2, size=50)), unit='s'
+        )
+    passes = pd.DataFrame(data={
+        'start_time':start_times, 
+        'end_time':start_times + pd.to_timedelta(rng.integers(60, 20*60, size=50), unit='s')
+        })
+    merge = Merge_OMNI('passes.csv', mean_slope_windows_m=lags, passes=passes)
+    merge.merge()
+
+    omni_data = Omni(time_range=(datetime(2000, 6, 1), datetime(2000, 6, 2)), 
+                     columns=merge.omni_columns).load()
+    for i, row in passes.iterrows():
+        np.testing.assert_allclose(
+            merge.passes.loc[i, merge.omni_columns].to_numpy(dtype=float),
+            omni_data.loc[row['start_time']:row['end_time']].mean().to_numpy()
+            )
+        for lag in lags:
+            window = omni_data.loc[row['start_time']-pd.Timedelta(minutes=lag):row['start_time']]
+            window = window[window.index < row['start_time']]
+            minutes = window.index.to_series().diff().dt.total_seconds()/60
+            slopes = window.diff().div(minutes, axis=0).mean()
+            np.testing.assert_allclose(
+                merge.passes.loc[i, [f'{col}_{lag}_m_lag' for col in merge.omni_columns]].to_numpy(dtype=float),
+                slopes.to_numpy(), rtol=1E-9, atol=1E-9
+                )
+            np.testing.assert_allclose(
+                merge.passes.loc[i, [f'{col}_{lag}_m_lag_mean' for col in merge.omni_columns]].to_numpy(dtype=float),
+                window.mean().to_numpy(), rtol=1E-9, atol=1E-9
+                )
@@ -0,0 +1,124 @@
+from datetime import datetime
+
+import numpy as np
+import pandas as pd
+import pytest
+
+import synthetic
+from sampex_microburst_indices.pipeline import checkpoints
+from sampex_microburst_indices.pipeline.merge_microbursts import Merge_Microbursts
+from sampex_microburst_indices.pipeline.passes import Passes
+
+
+@pytest.mark.parametrize('workers', [1, 2])
+def test_incremental_loop_loads_checkpoints_once(project_dir, monkeypatch, workers):
+    synthetic.generate(project_dir, n_days=2, microbursts_per_day=100,
+                       start_date=datetime(2000, 6, 1))
+    passes = Passes(L_range=(4, 8))
+    passes.loop()
+
+    first_run = Passes(L_range=(4, 8), incremental=True)
+    first_run.loop(workers=workers)
+    pd.testing.assert_frame_equal(first_run.passes, passes.passes)
+
+    loaded_dates = []
+    fingerprinted_dates = []
+    load = checkpoints.Pass_Checkpoints.load
+    fingerprint = checkpoints.Pass_Checkpoints._fingerprint
+    def counted_load(self, date):
+        loaded_dates.append(date)
+        return load(self, date)
+    def counted_fingerprint(self, date):
+        fingerprinted_dates.append(date)
+        return fingerprint(self, date)
+    monkeypatch.setattr(checkpoints.Pass_Checkpoints, 'load', counted_load)
+    monkeypatch.setattr(checkpoints.Pass_Checkpoints, '_fingerprint', counted_fingerprint)
+
+    second_run = Passes(L_range=(4, 8), incremental=True)
+    second_run.loop(workers=workers)
+    pd.testing.assert_frame_equal(second_run.passes, passes.passes)
+    assert sorted(loaded_dates) == sorted(second_run.hilt_dates)
+    assert sorted(fingerprinted_dates) == sorted(second_run.hilt_dates)
+
+def loop_pass_values(hilt_df, start_indices, end_indices):
+    """
+    The pass values calculated one pass at a time, like Passes.pass_values did
+    before it was vectorized.
+    """
+    rows = []
+    for start_index, end_index in zip(start_indices, end_indices):
+        start_time = hilt_df.index[start_index]
+        end_time = hilt_df.index[end_index]
+        duration_s = (end_time-start_time).total_seconds()
+        if duration_s < 60:
+            continue
+        rows.append({'start_time':start_time, 'end_time':end_time, 'duration_s':duration_s,
+            'mean_MLT':hilt_df["MLT"].iloc[start_index:end_index].mean(),
+            'min_MLT':hilt_df["MLT"].iloc[start_index:end_index].min(),
+            'max_MLT':hilt_df["MLT"].iloc[start_index:end_index].max(),
+            'max_att_flag':hilt_df["Att_Flag"].iloc[start_index:end_index].max()})
+    return pd.DataFrame(rows)
+
+def test_pass_values_match_the_loop(project_dir, monkeypatch):
+    synthetic.generate(project_dir, n_days=2, microbursts_per_day=100,
+                       start_date=datetime(2000, 6, 1))
+    expected = []
+    pass_values = Passes.pass_values
+    def checked_pass_values(self, hilt_df, start_indices, end_indices, debug=False):
+        # Add a short pass, and NaN MLTs, that the loop handles too.
+        start_indices = np.append(start_indices, 0)
+        end_indices = np.append(end_indices, 2)
+        hilt_df = hilt_df.copy()
+        hilt_df.iloc[start_indices[0]:start_indices[0]+10, hilt_df.columns.get_loc('MLT')] = np.nan
+        expected.append(loop_pass_values(hilt_df, start_indices, end_indices))
+        return pass_values(self, hilt_df, start_indices, end_indices, debug=debug)
+    monkeypatch.setattr(Passes, 'pass_values', checked_pass_values)
+
+    passes = Passes(L_range=(4, 8))
+    passes.loop()
+    expected = pd.concat(expected, ignore_index=True)
+    assert passes.passes.shape[0] == expected.shape[0] > 0
+    pd.testing.assert_frame_equal(passes.passes, expected, check_dtype=False, rtol=1E-12)
+
+sub_pass_bins = {'L_Shell':np.arange(4, 8.1, 0.5), 'MLT':np.arange(0, 25)}
+
+
+@pytest.fixture
+def sub_passes(project_dir):
+    # One attitude file per day, so the parallel loop has a group per day.
+    synthetic.generate(project_dir, n_days=2, attitude_days_per_file=1, microbursts_per_day=200,
+                       start_date=datetime(2000, 6, 1))
+    passes = Passes(L_range=(4, 8), sub_pass_bins=sub_pass_bins)
+    passes.loop()
+    return passes
+
+def test_sub_pass_exposure_is_conserved(sub_passes):
+    passes, segments = sub_passes.passes, sub_passes.sub_passes
+    assert segments['pass_index'].dtype == np.int32
+    # The bins cover the whole L_range, so the segments tile their passes.
+    exposure = segments.groupby('pass_index')['exposure_s'].sum()
+    np.testing.assert_array_equal(exposure.index, np.arange(passes.shape[0]))
+    np.testing.assert_allclose(exposure.to_numpy(), passes['duration_s'].to_numpy(), rtol=1E-5)
+    parents = passes.iloc[segments['pass_index']]
+    assert (segments['start_time'].to_numpy() >= parents['start_time'].to_numpy()).all()
+    assert (segments['end_time'].to_numpy() <= parents['end_time'].to_numpy()).all()
+
+def test_sub_pass_index_in_parallel(sub_passes):
+    parallel = Passes(L_range=(4, 8), sub_pass_bins=sub_pass_bins)
+    parallel.loop(workers=2)
+    pd.testing.assert_frame_equal(parallel.sub_passes, sub_passes.sub_passes)
+
+def test_merge_sub_passes(sub_passes):
+    merge = Merge_Microbursts('passes.csv', 'microburst_catalog.csv', passes=sub_passes.passes)
+    merge.merge()
+    # Shuffle the segments to check that they don't need to be sorted.
+    segments = sub_passes.sub_passes.sample(frac=1, random_state=0)
+    sub_merge = Merge_Microbursts('sub_passes.csv', 'microburst_catalog.csv', passes=segments)
+    sub_merge.merge_sub_passes()
+    merged = sub_merge.passes.sort_index()
+
+    # The segments tile their passes, so their counts add up to the pass counts.
+    counts = merged.groupby('pass_index')['microburst_count'].sum()
+    np.testing.assert_array_equal(counts.to_numpy(), merge.passes['microburst_count'].to_numpy())
+    np.testing.assert_allclose(merged['microburst_prob'],
+                               merged['total_microburst_time']/merged['exposure_s'], rtol=1E-6)
@@ -0,0 +1,43 @@
+import os
+import subprocess
+import sys
+from datetime import datetime
+
+import numpy as np
+
+import synthetic
+from sampex_microburst_indices import config
+from sampex_microburst_indices.pipeline.pipeline import build_pipeline
+from sampex_microburst_indices.pipeline.pipeline import main
+
+
+def test_cli_and_api_share_stage_keys(project_dir):
+    synthetic.generate(project_dir, n_days=1, microbursts_per_day=100,
+                       start_date=datetime(2000, 6, 1))
+    main(['--L_range', '4', '8', '--target', 'microbursts'])
+    pipeline = build_pipeline()
+    pipeline.run(target='microbursts')
+    assert [row['status'] for row in pipeline.report] == ['cached', 'cached']
+
+def test_stage_memory_report(project_dir, monkeypatch):
+    synthetic.generate(project_dir, n_days=1, microbursts_per_day=100,
+                       start_date=datetime(2000, 6, 1))
+    # A new process, so the peak memory of the earlier tests' workers is not counted.
+    script = (
+        'from sampex_microburst_indices.pipeline.pipeline import build_pipeline\n'
+        'pipeline = build_pipeline(workers=2, use_cache=False)\n'
+        'pipeline.run(target="passes")\n'
+        'print(pipeline.report[0]["worker_peak_memory_increase_mb"])\n'
+        )
+    env = {**os.environ, 'SAMPEX_DIR':str(config.SAMPEX_DIR),
+           'SAMPEX_PROJECT_DIR':str(config.PROJECT_DIR)}
+    output = subprocess.run([sys.executable, '-c', script], env=env, capture_output=True,
+                            text=True, check=True).stdout
+    # The passes stage runs in the worker processes.
+    assert float(output.split()[-1]) > 0
+
+    # The resource module is not available on Windows.
+    monkeypatch.setitem(sys.modules, 'resource', None)
+    pipeline = build_pipeline(use_cache=False)
+    pipeline.run(target='passes')
+    assert np.isnan(pipeline.report[0]['peak_memory_increase_mb'])
@@ -0,0 +1,21 @@
+from datetime import datetime
+
+import numpy as np
+
+import synthetic
+from sampex_microburst_indices.load.sampex import Load_Attitude
+from sampex_microburst_indices.load.sampex import attitude_index
+
+
+def test_attitude_index_is_reused_and_finds_new_files(project_dir):
+    synthetic.generate(project_dir, n_days=1, microbursts_per_day=10,
+                       start_date=datetime(2000, 6, 1))
+    Load_Attitude(datetime(2000, 6, 1))
+    index = attitude_index()
+    assert attitude_index() is index
+
+    # An attitude file added while the process runs is found after a miss.
+    new_path = project_dir / 'sampex' / 'attitude' / 'PSSet_6sec_2000154_2000154.txt'
+    synthetic.attitude_file(new_path, [datetime(2000, 6, 2)], np.random.default_rng(0))
+    assert index.find(2000154) == new_path
+    assert Load_Attitude(datetime(2000, 6, 2)).attitude_file == new_path
@@ -0,0 +1,22 @@
+from datetime import datetime
+
+import numpy as np
+
+import synthetic
+from sampex_microburst_indices.load.catalog_io import load_catalog
+from sampex_microburst_indices.model.sweep import Sweep
+
+
+def test_cold_cache_parallel_sweep(project_dir):
+    # The workers share the attitude, OMNI, microburst catalog, and file catalog
+    # caches, which are all written for the first time during the sweep.
+    synthetic.generate(project_dir, n_days=1, microbursts_per_day=100,
+                       start_date=datetime(2000, 6, 1))
+    sweep = Sweep(L_ranges=[(4, 8), (3, 7)], lag_sets=[(15, 60), (30,)],
+                  forest_grid={'n_estimators':[5, 10]}, filters=(), workers=4)
+    results = sweep.run()
+
+    assert results.shape[0] == 8
+    assert np.isfinite(results['score']).all()
+    assert (results['n_train'] > 0).all()
+    assert load_catalog('sweep/sweep_results.csv').shape[0] == 8